@@ -0,0 +1,31 @@
+"""Full-text search over messages
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 'simple' config: no stemming or stop words, so English, Afrikaans and
+    # isiZulu messages are all indexed the same way.
+    op.execute(
+        "ALTER TABLE messages ADD COLUMN body_tsv tsvector "
+        "GENERATED ALWAYS AS (to_tsvector('simple', body)) STORED"
+    )
+    op.create_index("idx_messages_body_tsv", "messages", ["body_tsv"], postgresql_using="gin")
+
+
+def downgrade() -> None:
+    op.drop_index("idx_messages_body_tsv", table_name="messages")
+    op.drop_column("messages", "body_tsv")
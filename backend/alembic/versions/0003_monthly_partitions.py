@@ -0,0 +1,168 @@
+"""Monthly range partitions for messages, notification_log and audit_log
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19
+
+Each table is rebuilt as a partitioned parent (PARTITION BY RANGE on its
+timestamp) with one partition per calendar month (UTC).  Existing rows are
+copied across, partitions are pre-created PREMAKE_MONTHS ahead, and the
+app.tasks.partitions cron job keeps them ahead from then on.  There is
+deliberately no DEFAULT partition: it would make creating and detaching
+monthly partitions scan it.
+
+Partitioned tables need the partition key in every unique constraint, so
+the primary keys become (id, <timestamp>) and message_attachments gains a
+message_created_at column for its foreign key to messages.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PREMAKE_MONTHS = 3
+
+# table → (partition key, columns copied across; generated columns excluded)
+TABLES = {
+    "messages": (
+        "created_at",
+        "id, conversation_id, sender_id, body, is_system, created_at",
+    ),
+    "notification_log": (
+        "sent_at",
+        "id, user_id, channel, title, body, reference_type, reference_id, status, sent_at, delivered_at, error_message",
+    ),
+    "audit_log": (
+        "created_at",
+        "id, school_id, user_id, action, entity_type, entity_id, metadata, ip_address, created_at",
+    ),
+}
+
+# Creates <parent>_pYYYYMM partitions for every month in [from_month, to_month].
+# Idempotent; also called by the maintenance job.
+CREATE_PARTITIONS_FN = """
+CREATE OR REPLACE FUNCTION create_monthly_partitions(parent text, from_month date, to_month date)
+RETURNS integer
+LANGUAGE plpgsql AS $$
+DECLARE
+    m date := date_trunc('month', from_month)::date;
+    part text;
+    created integer := 0;
+BEGIN
+    WHILE m <= to_month LOOP
+        part := format('%s_p%s', parent, to_char(m, 'YYYYMM'));
+        IF to_regclass(part) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                part,
+                parent,
+                m::timestamp AT TIME ZONE 'UTC',
+                (m + interval '1 month')::timestamp AT TIME ZONE 'UTC'
+            );
+            created := created + 1;
+        END IF;
+        m := (m + interval '1 month')::date;
+    END LOOP;
+    RETURN created;
+END
+$$
+"""
+
+
+def _create_indexes_and_constraints(table: str) -> None:
+    if table == "messages":
+        op.execute(
+            "ALTER TABLE messages ADD FOREIGN KEY (conversation_id) "
+            "REFERENCES conversations(id) ON DELETE CASCADE"
+        )
+        op.execute("ALTER TABLE messages ADD FOREIGN KEY (sender_id) REFERENCES users(id)")
+        op.execute("CREATE INDEX idx_messages_conversation ON messages (conversation_id, created_at DESC)")
+        op.execute("CREATE INDEX idx_messages_body_tsv ON messages USING gin (body_tsv)")
+    elif table == "notification_log":
+        op.execute(
+            "ALTER TABLE notification_log ADD FOREIGN KEY (user_id) "
+            "REFERENCES users(id) ON DELETE CASCADE"
+        )
+        op.execute("CREATE INDEX idx_notification_log_user ON notification_log (user_id, sent_at DESC)")
+    elif table == "audit_log":
+        op.execute("ALTER TABLE audit_log ADD FOREIGN KEY (school_id) REFERENCES schools(id)")
+        op.execute("ALTER TABLE audit_log ADD FOREIGN KEY (user_id) REFERENCES users(id)")
+        op.execute("CREATE INDEX idx_audit_log_school ON audit_log (school_id, created_at DESC)")
+        op.execute("ALTER TABLE audit_log ENABLE ROW LEVEL SECURITY")
+        op.execute("ALTER TABLE audit_log FORCE ROW LEVEL SECURITY")
+        op.execute(
+            "CREATE POLICY school_isolation ON audit_log "
+            "USING (school_id IS NULL OR school_id = current_setting('app.current_school_id', true)::UUID)"
+        )
+
+
+def upgrade() -> None:
+    op.execute(CREATE_PARTITIONS_FN)
+
+    # message_attachments → messages needs the partition key for its FK.
+    op.execute("ALTER TABLE message_attachments ADD COLUMN message_created_at TIMESTAMPTZ")
+    op.execute(
+        "UPDATE message_attachments a SET message_created_at = m.created_at "
+        "FROM messages m WHERE m.id = a.message_id"
+    )
+    op.execute("ALTER TABLE message_attachments ALTER COLUMN message_created_at SET NOT NULL")
+    op.execute("ALTER TABLE message_attachments DROP CONSTRAINT message_attachments_message_id_fkey")
+
+    for table, (key, columns) in TABLES.items():
+        legacy = f"{table}_legacy"
+        op.execute(f"ALTER TABLE {table} RENAME TO {legacy}")
+        op.execute(f"ALTER INDEX {table}_pkey RENAME TO {legacy}_pkey")
+        op.execute(
+            f"CREATE TABLE {table} "
+            f"(LIKE {legacy} INCLUDING DEFAULTS INCLUDING GENERATED INCLUDING CONSTRAINTS) "
+            f"PARTITION BY RANGE ({key})"
+        )
+        op.execute(f"ALTER TABLE {table} ADD PRIMARY KEY (id, {key})")
+        op.execute(
+            f"SELECT create_monthly_partitions("
+            f"'{table}', "
+            f"(COALESCE((SELECT min({key}) FROM {legacy}), now()) AT TIME ZONE 'UTC')::date, "
+            f"((now() + interval '{PREMAKE_MONTHS} months') AT TIME ZONE 'UTC')::date)"
+        )
+        # audit_log has FORCE ROW LEVEL SECURITY, which would hide other
+        # schools' rows from the copy when migrating as the table owner.
+        op.execute(f"ALTER TABLE {legacy} NO FORCE ROW LEVEL SECURITY")
+        op.execute(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {legacy}")
+        op.execute(f"DROP TABLE {legacy}")
+        _create_indexes_and_constraints(table)
+
+    op.execute(
+        "ALTER TABLE message_attachments ADD CONSTRAINT message_attachments_message_fkey "
+        "FOREIGN KEY (message_id, message_created_at) REFERENCES messages(id, created_at) ON DELETE CASCADE"
+    )
+    op.execute("CREATE INDEX idx_message_attachments_message ON message_attachments (message_id)")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX idx_message_attachments_message")
+    op.execute("ALTER TABLE message_attachments DROP CONSTRAINT message_attachments_message_fkey")
+
+    for table, (key, columns) in TABLES.items():
+        partitioned = f"{table}_partitioned"
+        op.execute(f"ALTER TABLE {table} RENAME TO {partitioned}")
+        op.execute(f"ALTER INDEX {table}_pkey RENAME TO {partitioned}_pkey")
+        op.execute(
+            f"CREATE TABLE {table} "
+            f"(LIKE {partitioned} INCLUDING DEFAULTS INCLUDING GENERATED INCLUDING CONSTRAINTS)"
+        )
+        op.execute(f"ALTER TABLE {table} ADD PRIMARY KEY (id)")
+        op.execute(f"ALTER TABLE {partitioned} NO FORCE ROW LEVEL SECURITY")
+        op.execute(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {partitioned}")
+        op.execute(f"DROP TABLE {partitioned} CASCADE")  # drops the monthly partitions too
+        _create_indexes_and_constraints(table)
+
+    op.execute(
+        "ALTER TABLE message_attachments ADD CONSTRAINT message_attachments_message_id_fkey "
+        "FOREIGN KEY (message_id) REFERENCES messages(id) ON DELETE CASCADE"
+    )
+    op.execute("ALTER TABLE message_attachments DROP COLUMN message_created_at")
+    op.execute("DROP FUNCTION create_monthly_partitions(text, date, date)")
@@ -0,0 +1,100 @@
+"""Denormalised school_id on child tables; equality-only RLS policies
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19
+
+classes and announcements were protected by policies with a subquery on
+their parent (grades / channels), evaluated on every scan; messages,
+announcement_reads and class_learners had no policy at all.  Each of these
+tables now carries school_id (backfilled from its parent, NOT NULL, indexed)
+and the policy is a plain school_id = current_setting(...) equality that the
+planner can push into an index scan.
+
+The application sets school_id explicitly on insert; the policies' implicit
+WITH CHECK rejects rows whose school_id does not match the current tenant.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# table → (backfill source, index columns), in dependency order
+TABLES = {
+    "classes": (
+        "UPDATE classes c SET school_id = g.school_id FROM grades g WHERE g.id = c.grade_id",
+        "school_id",
+    ),
+    "class_learners": (
+        "UPDATE class_learners cl SET school_id = c.school_id FROM classes c WHERE c.id = cl.class_id",
+        "school_id",
+    ),
+    "announcements": (
+        "UPDATE announcements a SET school_id = ch.school_id FROM channels ch WHERE ch.id = a.channel_id",
+        "school_id, published_at DESC",
+    ),
+    "announcement_reads": (
+        "UPDATE announcement_reads r SET school_id = a.school_id FROM announcements a WHERE a.id = r.announcement_id",
+        "school_id",
+    ),
+    "messages": (
+        "UPDATE messages m SET school_id = c.school_id FROM conversations c WHERE c.id = m.conversation_id",
+        "school_id, created_at DESC",
+    ),
+}
+
+# Parents read during the backfill that already have forced RLS.
+_RLS_PARENTS = ("grades", "channels", "conversations")
+
+_TENANT = "current_setting('app.current_school_id', true)::UUID"
+
+OLD_POLICIES = {
+    "classes": f"grade_id IN (SELECT id FROM grades WHERE school_id = {_TENANT})",
+    "announcements": f"channel_id IN (SELECT id FROM channels WHERE school_id = {_TENANT})",
+}
+
+
+def _set_force(tables: Sequence[str], force: bool) -> None:
+    # FORCE makes RLS apply to the table owner as well; lift it while
+    # backfilling so the owner sees every school's rows.
+    for table in tables:
+        op.execute(f"ALTER TABLE {table} {'' if force else 'NO '}FORCE ROW LEVEL SECURITY")
+
+
+def upgrade() -> None:
+    _set_force(_RLS_PARENTS + tuple(OLD_POLICIES), force=False)
+
+    for table, (backfill, index_columns) in TABLES.items():
+        op.execute(f"ALTER TABLE {table} ADD COLUMN school_id UUID")
+        op.execute(backfill)
+        op.execute(f"ALTER TABLE {table} ALTER COLUMN school_id SET NOT NULL")
+        op.execute(
+            f"ALTER TABLE {table} ADD CONSTRAINT {table}_school_id_fkey "
+            f"FOREIGN KEY (school_id) REFERENCES schools(id) ON DELETE CASCADE"
+        )
+        op.execute(f"CREATE INDEX idx_{table}_school ON {table} ({index_columns})")
+
+    for table in TABLES:
+        if table in OLD_POLICIES:
+            op.execute(f"DROP POLICY school_isolation ON {table}")
+        else:
+            op.execute(f"ALTER TABLE {table} ENABLE ROW LEVEL SECURITY")
+        op.execute(f"CREATE POLICY school_isolation ON {table} USING (school_id = {_TENANT})")
+
+    _set_force(_RLS_PARENTS + tuple(TABLES), force=True)
+
+
+def downgrade() -> None:
+    for table in reversed(TABLES):
+        op.execute(f"DROP POLICY school_isolation ON {table}")
+        if table in OLD_POLICIES:
+            op.execute(f"CREATE POLICY school_isolation ON {table} USING ({OLD_POLICIES[table]})")
+        else:
+            op.execute(f"ALTER TABLE {table} NO FORCE ROW LEVEL SECURITY")
+            op.execute(f"ALTER TABLE {table} DISABLE ROW LEVEL SECURITY")
+        op.execute(f"DROP INDEX idx_{table}_school")
+        op.execute(f"ALTER TABLE {table} DROP COLUMN school_id")
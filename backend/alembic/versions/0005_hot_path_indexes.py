@@ -0,0 +1,46 @@
+"""Indexes for hot API queries
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19
+
+  conversation_participants (user_id, conversation_id)  list_conversations: the
+      unique key leads with conversation_id, so "my conversations" was a seq scan
+  announcement_reads (user_id, announcement_id)         read-state probes for one
+      user across a page of announcements
+  class_teachers (teacher_id)                           list_channels (teacher)
+  channels (school_id, type)                            list_channels
+  users (email)                                         login looks up email
+      across schools; partial, since parents usually have no email
+
+Built CONCURRENTLY so the migration does not block writes on live tables.
+benchmarks/check_query_plans.py guards against regressions.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+revision: str = "0005"
+down_revision: Union[str, None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = {
+    "idx_conversation_participants_user": "conversation_participants (user_id, conversation_id)",
+    "idx_announcement_reads_user": "announcement_reads (user_id, announcement_id)",
+    "idx_class_teachers_teacher": "class_teachers (teacher_id)",
+    "idx_channels_school_type": "channels (school_id, type)",
+    "idx_users_email": "users (email) WHERE email IS NOT NULL",
+}
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, definition in INDEXES.items():
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {definition}")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name in INDEXES:
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
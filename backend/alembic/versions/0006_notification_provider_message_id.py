@@ -0,0 +1,35 @@
+"""Provider message id on notification_log
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19
+
+Delivery-status webhooks (SMS, WhatsApp) identify a message by the id the
+provider returned when it was sent; store it so the batched status updates
+in app.services.notification_log can find the row.  The index is partial:
+push rows and failed sends have no provider id.
+
+notification_log is partitioned, so the index cannot be built CONCURRENTLY;
+CREATE INDEX on the parent builds it on each partition.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+revision: str = "0006"
+down_revision: Union[str, None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE notification_log ADD COLUMN provider_message_id VARCHAR(128)")
+    op.execute(
+        "CREATE INDEX idx_notification_log_provider_message ON notification_log (provider_message_id) "
+        "WHERE provider_message_id IS NOT NULL"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX idx_notification_log_provider_message")
+    op.execute("ALTER TABLE notification_log DROP COLUMN provider_message_id")
@@ -0,0 +1,52 @@
+"""Push device registry: one row per (user, token)
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19
+
+  push_devices (user_id, device_token)        unique; POST /api/devices upserts on it
+  push_devices (user_id) WHERE is_active      the fan-out's per-chunk device lookup
+
+Duplicate (user_id, device_token) rows are collapsed first, keeping the most
+recently updated one.  Indexes are built CONCURRENTLY, as in 0005; the unique
+constraint is then attached to its already-built index.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+revision: str = "0007"
+down_revision: Union[str, None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        DELETE FROM push_devices d
+        USING push_devices newer
+        WHERE newer.user_id = d.user_id
+          AND newer.device_token = d.device_token
+          AND (newer.updated_at, newer.id) > (d.updated_at, d.id)
+        """
+    )
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_push_devices_user_token "
+            "ON push_devices (user_id, device_token)"
+        )
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_push_devices_user_active "
+            "ON push_devices (user_id) WHERE is_active"
+        )
+    op.execute(
+        "ALTER TABLE push_devices ADD CONSTRAINT uq_push_devices_user_token "
+        "UNIQUE USING INDEX uq_push_devices_user_token"
+    )
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE push_devices DROP CONSTRAINT IF EXISTS uq_push_devices_user_token")
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS idx_push_devices_user_active")
@@ -0,0 +1,47 @@
+"""NOTIFY principal_changed when a user's cached authorization fields change
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19
+
+app.services.principal_cache keeps role, school_id and is_active per user in
+Redis.  This trigger NOTIFYs 'principal_changed' with the user id when any of
+them changes, or the user is deleted, however the change was made; the API
+processes' listener (app.services.db_events) then invalidates the entry.
+Notifications are delivered on commit, and duplicates within a transaction
+are coalesced.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+revision: str = "0009"
+down_revision: Union[str, None] = "0008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        CREATE FUNCTION users_principal_changed() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP = 'DELETE'
+               OR NEW.role IS DISTINCT FROM OLD.role
+               OR NEW.school_id IS DISTINCT FROM OLD.school_id
+               OR NEW.is_active IS DISTINCT FROM OLD.is_active THEN
+                PERFORM pg_notify('principal_changed', OLD.id::text);
+            END IF;
+            RETURN NULL;
+        END $$
+        """
+    )
+    op.execute(
+        "CREATE TRIGGER users_principal_changed AFTER UPDATE OF role, school_id, is_active OR DELETE ON users "
+        "FOR EACH ROW EXECUTE FUNCTION users_principal_changed()"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS users_principal_changed ON users")
+    op.execute("DROP FUNCTION IF EXISTS users_principal_changed()")
@@ -0,0 +1,51 @@
+"""NOTIFY school_changed when a school's slug or is_active changes
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-19
+
+app.services.school_resolver caches slug → school_id in each API process and
+in Redis, including "unknown" for slugs that resolved to nothing.  This
+trigger NOTIFYs 'school_changed' with every slug whose answer may have
+changed — the old and new slug on a rename, the slug on an is_active change,
+a new school's slug (it may be cached as unknown) and a deleted school's —
+and the API processes' listener (app.services.db_events) invalidates them.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+revision: str = "0010"
+down_revision: Union[str, None] = "0009"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        CREATE FUNCTION schools_slug_changed() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                IF TG_OP = 'DELETE' OR NEW.slug IS DISTINCT FROM OLD.slug OR NEW.is_active IS DISTINCT FROM OLD.is_active THEN
+                    PERFORM pg_notify('school_changed', OLD.slug);
+                END IF;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                IF TG_OP = 'INSERT' OR NEW.slug IS DISTINCT FROM OLD.slug THEN
+                    PERFORM pg_notify('school_changed', NEW.slug);
+                END IF;
+            END IF;
+            RETURN NULL;
+        END $$
+        """
+    )
+    op.execute(
+        "CREATE TRIGGER schools_slug_changed AFTER INSERT OR UPDATE OF slug, is_active OR DELETE ON schools "
+        "FOR EACH ROW EXECUTE FUNCTION schools_slug_changed()"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS schools_slug_changed ON schools")
+    op.execute("DROP FUNCTION IF EXISTS schools_slug_changed()")
@@ -0,0 +1,38 @@
+"""'unknown' notification_log status
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-19
+
+A send whose request may have reached the provider before it failed (a read
+timeout, a dropped connection) is logged as 'unknown' and not repeated, so
+one outage does not notify a parent twice.  Such rows have no provider
+message id, so delivery-status webhooks never update them.
+
+Replacing the check scans every notification_log partition.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+revision: str = "0011"
+down_revision: Union[str, None] = "0010"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        "ALTER TABLE notification_log DROP CONSTRAINT notification_log_status_check, "
+        "ADD CONSTRAINT notification_log_status_check "
+        "CHECK (status IN ('sent', 'delivered', 'failed', 'read', 'unknown'))"
+    )
+
+
+def downgrade() -> None:
+    op.execute("UPDATE notification_log SET status = 'failed' WHERE status = 'unknown'")
+    op.execute(
+        "ALTER TABLE notification_log DROP CONSTRAINT notification_log_status_check, "
+        "ADD CONSTRAINT notification_log_status_check "
+        "CHECK (status IN ('sent', 'delivered', 'failed', 'read'))"
+    )
@@ -2,15 +2,19 @@
 
 from __future__ import annotations
 
+import time
 import uuid
 from datetime import datetime, timezone
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from redis.asyncio import Redis
 from sqlalchemy import and_, distinct, func, or_, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api.deps import get_current_user, get_db, require_role
+from app.api.deps import get_current_user, get_db, get_read_db, get_redis, require_role
+from app.middleware.rate_limit import enforce_rate_limit
 from app.models.announcement import Announcement, AnnouncementRead, Channel
+from app.models.outbox import OutboxEvent
 from app.models.school import Class, Grade
 from app.models.user import ClassLearner, ClassTeacher, Learner, LearnerGuardian, User
 from app.schemas.announcement import (
@@ -21,7 +25,7 @@ from app.schemas.announcement import (
     ChannelOut,
     ClassBreakdown,
 )
-from app.services.sse_service import manager as sse_manager
+from app.services.principal_cache import Principal
 
 router = APIRouter(prefix="/api", tags=["announcements"])
 
@@ -31,7 +35,7 @@ router = APIRouter(prefix="/api", tags=["announcements"])
 # ---------------------------------------------------------------------------
 
 
-async def _assert_channel_access(channel: Channel, user: User, db: AsyncSession) -> None:
+async def _assert_channel_access(channel: Channel, user: Principal, db: AsyncSession) -> None:
     """Raise 403 if *user* cannot access *channel*."""
     if user.role in ("super_admin", "school_admin"):
         return
@@ -53,35 +57,6 @@ async def _get_announcement_or_404(announcement_id: uuid.UUID, db: AsyncSession)
     return ann
 
 
-async def _recipient_ids(channel: Channel, db: AsyncSession) -> list[str]:
-    """Return the distinct parent user_ids who should receive this channel's announcements."""
-    if channel.type == "school":
-        stmt = (
-            select(distinct(LearnerGuardian.guardian_id))
-            .join(Learner, Learner.id == LearnerGuardian.learner_id)
-            .join(User, User.id == LearnerGuardian.guardian_id)
-            .where(Learner.school_id == channel.school_id, User.is_active == True)  # noqa: E712
-        )
-    elif channel.type == "grade":
-        class_ids = select(Class.id).where(Class.grade_id == channel.grade_id)
-        stmt = (
-            select(distinct(LearnerGuardian.guardian_id))
-            .join(ClassLearner, ClassLearner.learner_id == LearnerGuardian.learner_id)
-            .join(User, User.id == LearnerGuardian.guardian_id)
-            .where(ClassLearner.class_id.in_(class_ids), User.is_active == True)  # noqa: E712
-        )
-    else:  # "class" or "custom"
-        target_class_id = channel.class_id
-        stmt = (
-            select(distinct(LearnerGuardian.guardian_id))
-            .join(ClassLearner, ClassLearner.learner_id == LearnerGuardian.learner_id)
-            .join(User, User.id == LearnerGuardian.guardian_id)
-            .where(ClassLearner.class_id == target_class_id, User.is_active == True)  # noqa: E712
-        )
-    rows = await db.execute(stmt)
-    return [str(row[0]) for row in rows.fetchall()]
-
-
 # ---------------------------------------------------------------------------
 # Channels
 # ---------------------------------------------------------------------------
@@ -89,8 +64,8 @@ async def _recipient_ids(channel: Channel, db: AsyncSession) -> list[str]:
 
 @router.get("/channels", response_model=list[ChannelOut])
 async def list_channels(
-    db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_user),
 ) -> list[Channel]:
     """List channels accessible to the current user."""
     if current_user.role in ("super_admin", "school_admin"):
@@ -154,8 +129,8 @@ async def list_announcements(
     priority: str | None = Query(None, description="Filter by priority: urgent | normal | info"),
     limit: int = Query(20, ge=1, le=100),
     offset: int = Query(0, ge=0),
-    db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_user),
 ) -> list[AnnouncementOut]:
     channel = await _get_channel_or_404(channel_id, db)
     await _assert_channel_access(channel, current_user, db)
@@ -206,9 +181,13 @@ async def list_announcements(
 @router.post("/announcements", response_model=AnnouncementOut, status_code=status.HTTP_201_CREATED)
 async def create_announcement(
     body: AnnouncementCreate,
+    response: Response,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(require_role("school_admin", "teacher")),
+    redis: Redis = Depends(get_redis),
+    current_user: Principal = Depends(require_role("school_admin", "teacher")),
 ) -> AnnouncementOut:
+    await enforce_rate_limit("announcement_create", str(current_user.id), redis, response, role=current_user.role)
+
     channel = await _get_channel_or_404(body.channel_id, db)
     await _assert_channel_access(channel, current_user, db)
 
@@ -216,6 +195,7 @@ async def create_announcement(
 
     ann = Announcement(
         id=uuid.uuid4(),
+        school_id=channel.school_id,
         channel_id=body.channel_id,
         author_id=current_user.id,
         title=body.title,
@@ -228,25 +208,26 @@ async def create_announcement(
         expires_at=body.expires_at,
     )
     db.add(ann)
+    # Recipients, the SSE event and the notification job are handled by the
+    # outbox relay (app.tasks.outbox) once this commits — at publish time for
+    # scheduled announcements.
+    db.add(
+        OutboxEvent(
+            school_id=channel.school_id,
+            topic="announcement.created",
+            payload={
+                "announcement_id": str(ann.id),
+                "channel_id": str(channel.id),
+                "title": ann.title,
+                "priority": ann.priority,
+                "created_at": max(time.time(), published_at.timestamp()),  # start of the first-send SLO
+            },
+            available_at=max(datetime.now(timezone.utc), published_at),
+        )
+    )
     await db.commit()
     await db.refresh(ann)
 
-    # SSE broadcast to all recipients (fire-and-forget)
-    recipient_ids = await _recipient_ids(channel, db)
-    await sse_manager.broadcast(
-        recipient_ids,
-        {
-            "type": "announcement.new",
-            "announcement_id": str(ann.id),
-            "channel_id": str(channel.id),
-            "title": ann.title,
-            "priority": ann.priority,
-        },
-    )
-
-    # TODO (Prompt 6): enqueue ARQ task for FCM / WhatsApp / SMS dispatch
-    # await arq_pool.enqueue_job("send_announcement_notifications", str(ann.id), recipient_ids)
-
     return AnnouncementOut.model_validate(ann)
 
 
@@ -259,7 +240,7 @@ async def create_announcement(
 async def get_announcement(
     announcement_id: uuid.UUID,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ) -> AnnouncementOut:
     ann = await _get_announcement_or_404(announcement_id, db)
     channel = await _get_channel_or_404(ann.channel_id, db)
@@ -287,7 +268,7 @@ async def get_announcement(
 async def mark_read(
     announcement_id: uuid.UUID,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ) -> None:
     ann = await _get_announcement_or_404(announcement_id, db)
     channel = await _get_channel_or_404(ann.channel_id, db)
@@ -302,6 +283,7 @@ async def mark_read(
     if existing.scalar_one_or_none() is None:
         db.add(AnnouncementRead(
             id=uuid.uuid4(),
+            school_id=ann.school_id,
             announcement_id=announcement_id,
             user_id=current_user.id,
         ))
@@ -316,8 +298,8 @@ async def mark_read(
 @router.get("/announcements/{announcement_id}/reads", response_model=list[AnnouncementReadOut])
 async def get_reads(
     announcement_id: uuid.UUID,
-    db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(require_role("school_admin", "teacher")),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(require_role("school_admin", "teacher")),
 ) -> list[AnnouncementReadOut]:
     await _get_announcement_or_404(announcement_id, db)
 
@@ -352,8 +334,8 @@ async def get_reads(
 @router.get("/announcements/{announcement_id}/stats", response_model=AnnouncementStats)
 async def get_stats(
     announcement_id: uuid.UUID,
-    db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(require_role("school_admin", "teacher")),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(require_role("school_admin", "teacher")),
 ) -> AnnouncementStats:
     ann = await _get_announcement_or_404(announcement_id, db)
     channel = await _get_channel_or_404(ann.channel_id, db)
@@ -471,7 +453,7 @@ async def get_stats(
 async def delete_announcement(
     announcement_id: uuid.UUID,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(require_role("school_admin", "teacher")),
+    current_user: Principal = Depends(require_role("school_admin", "teacher")),
 ) -> None:
     ann = await _get_announcement_or_404(announcement_id, db)
 
@@ -2,16 +2,21 @@
 
 from __future__ import annotations
 
+import time
 import uuid
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from arq.connections import ArqRedis
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from jose import JWTError
 from redis.asyncio import Redis
-from sqlalchemy import select, text
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api.deps import get_current_user, get_db, get_redis
+from app.api.deps import get_arq, get_current_user, get_current_user_model, get_db, get_redis
+from app.config import settings
+from app.database import set_tenant
+from app.middleware.rate_limit import enforce_rate_limit
 from app.models.user import User
 from app.schemas.auth import (
     EmailLoginSchema,
@@ -23,18 +28,20 @@ from app.schemas.auth import (
     UserOut,
 )
 from app.services.auth_service import (
+    PasswordHasherBusy,
     create_access_token,
     create_refresh_token,
     decode_token,
     generate_otp,
-    is_refresh_token_valid,
+    revoke_all_refresh_tokens,
     revoke_refresh_token,
-    send_otp_sms,
+    rotate_refresh_token,
     store_otp,
     store_refresh_token,
+    verify_and_update_password,
     verify_otp,
-    verify_password,
 )
+from app.services.principal_cache import Principal
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 _bearer = HTTPBearer()
@@ -55,12 +62,17 @@ def _make_tokens(user: User) -> dict:
 @router.post("/otp/request", status_code=status.HTTP_202_ACCEPTED)
 async def otp_request(
     body: OTPRequestSchema,
+    response: Response,
     redis: Redis = Depends(get_redis),
+    arq: ArqRedis = Depends(get_arq),
 ) -> dict:
-    """Generate a 6-digit OTP and send it via SMS to the given phone number."""
+    """Generate a 6-digit OTP and queue it for SMS delivery to the given phone number."""
+    await enforce_rate_limit("otp_request", body.phone, redis, response)
     otp = generate_otp()
     await store_otp(body.phone, otp, redis)
-    await send_otp_sms(body.phone, otp)
+    # Delivered by the worker (app.tasks.sms) with retries; the request doesn't wait on the provider.
+    # The job reads the code from Redis: arq keeps job arguments, so the code must not be one.
+    await arq.enqueue_job("send_otp_sms", body.phone, time.time(), _queue_name=settings.ARQ_QUEUE_URGENT)
     return {"detail": "OTP sent"}
 
 
@@ -118,7 +130,7 @@ async def register(
     # The school_id comes from the invite link body, not from a JWT.
     # Explicitly set the RLS context so all subsequent queries on this session
     # are scoped to the correct school.
-    await db.execute(text("SET LOCAL app.current_school_id = :sid"), {"sid": str(body.school_id)})
+    await set_tenant(db, body.school_id)
 
     # Guard: phone must not already be registered in this school
     existing = await db.execute(
@@ -152,20 +164,39 @@ async def register(
 @router.post("/login", response_model=TokenResponse)
 async def login(
     body: EmailLoginSchema,
+    response: Response,
     db: AsyncSession = Depends(get_db),
     redis: Redis = Depends(get_redis),
 ) -> TokenResponse:
     """Login with email and password (teachers and school admins)."""
+    await enforce_rate_limit("login", body.email.lower(), redis, response)
+
     result = await db.execute(
         select(User).where(User.email == body.email, User.is_active == True)  # noqa: E712
     )
     user = result.scalar_one_or_none()
+    invalid = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid email or password",
+    )
+    if user is None or user.password_hash is None:
+        raise invalid
 
-    if user is None or user.password_hash is None or not verify_password(body.password, user.password_hash):
+    try:
+        valid, new_hash = await verify_and_update_password(body.password, user.password_hash)
+    except PasswordHasherBusy:
         raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid email or password",
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Login is busy, please try again",
+            headers={"Retry-After": "1"},
         )
+    if not valid:
+        raise invalid
+
+    if new_hash and settings.PASSWORD_REHASH_ON_LOGIN:
+        # Stored hash used an outdated bcrypt cost — upgrade it transparently.
+        user.password_hash = new_hash
+        await db.commit()
 
     tokens = _make_tokens(user)
     await store_refresh_token(str(user.id), tokens["refresh"], redis)
@@ -197,17 +228,14 @@ async def refresh_tokens(
     if not user_id:
         raise exc
 
-    if not await is_refresh_token_valid(user_id, body.refresh_token, redis):
-        raise exc
-
     user = await db.get(User, uuid.UUID(user_id))
     if user is None or not user.is_active:
         raise exc
 
-    # Rotate: revoke old, issue new
-    await revoke_refresh_token(user_id, body.refresh_token, redis)
+    # Rotate: the old token is consumed and the new one stored atomically
     tokens = _make_tokens(user)
-    await store_refresh_token(str(user.id), tokens["refresh"], redis)
+    if not await rotate_refresh_token(user_id, body.refresh_token, tokens["refresh"], redis):
+        raise exc
     return TokenResponse(access_token=tokens["access"], refresh_token=tokens["refresh"])
 
 
@@ -232,11 +260,20 @@ async def logout(
         pass  # treat invalid tokens as already revoked
 
 
+@router.post("/logout/all", status_code=status.HTTP_204_NO_CONTENT)
+async def logout_all(
+    current_user: Principal = Depends(get_current_user),
+    redis: Redis = Depends(get_redis),
+) -> None:
+    """Revoke every refresh token of the current user (log out on all devices)."""
+    await revoke_all_refresh_tokens(str(current_user.id), redis)
+
+
 # ---------------------------------------------------------------------------
 # Current user (convenience)
 # ---------------------------------------------------------------------------
 
 
 @router.get("/me", response_model=UserOut)
-async def me(current_user: User = Depends(get_current_user)) -> User:
+async def me(current_user: User = Depends(get_current_user_model)) -> User:
     return current_user
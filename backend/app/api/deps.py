@@ -2,21 +2,28 @@
 
 from __future__ import annotations
 
+import functools
+import hmac
 import uuid
 from collections.abc import AsyncGenerator
 
+from arq.connections import ArqRedis
 from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from jose import JWTError
 from redis.asyncio import Redis
-from sqlalchemy import text
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database import AsyncSessionLocal
+from app.config import settings
+from app.database import AsyncSessionLocal, ReplicaSessionLocal, current_route
+from app.middleware.read_your_writes import mark_committed, pin_key
 from app.models.user import User
-from app.services.auth_service import decode_token
+from app.services.auth_service import decode_token_cached
+from app.services.principal_cache import Principal, get_principal
 
 _bearer = HTTPBearer()
+_optional_bearer = HTTPBearer(auto_error=False)
 
 # ---------------------------------------------------------------------------
 # Redis
@@ -27,20 +34,50 @@ def get_redis(request: Request) -> Redis:
     return request.app.state.redis
 
 
+def get_arq(request: Request) -> ArqRedis:
+    """ARQ pool for enqueueing background jobs."""
+    return request.app.state.arq
+
+
 # ---------------------------------------------------------------------------
-# Database — sets app.current_school_id for RLS on every connection
+# Database — lazy session scoped to the request's school for RLS
 # ---------------------------------------------------------------------------
 
 
+def _set_route(request: Request) -> None:
+    route = request.scope.get("route")
+    current_route.set(getattr(route, "path", request.url.path))
+
+
 async def get_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
     school_id: str | None = getattr(request.state, "school_id", None)
-    async with AsyncSessionLocal() as session:
-        if school_id:
-            # SET LOCAL is transaction-scoped; safe even with connection pooling.
-            await session.execute(
-                text("SET LOCAL app.current_school_id = :sid"),
-                {"sid": str(school_id)},
-            )
+    _set_route(request)
+
+    # No connection is checked out until the first query; app.database applies
+    # app.current_school_id at the start of each transaction.
+    async with AsyncSessionLocal(info={"school_id": school_id}) as session:
+        # Read-your-writes: once a write request commits, ReadYourWritesMiddleware
+        # pins its user's reads to the primary if the response succeeds.
+        claims = getattr(request.state, "auth_claims", None)
+        if ReplicaSessionLocal is not None and claims and request.method not in ("GET", "HEAD", "OPTIONS"):
+            event.listen(session.sync_session, "after_commit", functools.partial(mark_committed, request.scope, claims["sub"]))
+        yield session
+
+
+async def get_read_db(
+    request: Request,
+    redis: Redis = Depends(get_redis),
+) -> AsyncGenerator[AsyncSession, None]:
+    """Session for read-only routes: the replica, unless the user wrote recently."""
+    school_id: str | None = getattr(request.state, "school_id", None)
+    _set_route(request)
+
+    sessionmaker = ReplicaSessionLocal or AsyncSessionLocal
+    claims = getattr(request.state, "auth_claims", None)
+    if ReplicaSessionLocal is not None and claims and await redis.exists(pin_key(claims["sub"])):
+        sessionmaker = AsyncSessionLocal
+
+    async with sessionmaker(info={"school_id": school_id}) as session:
         yield session
 
 
@@ -50,18 +87,23 @@ async def get_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
 
 
 async def get_current_user(
+    request: Request,
     credentials: HTTPAuthorizationCredentials = Depends(_bearer),
+    redis: Redis = Depends(get_redis),
     db: AsyncSession = Depends(get_db),
-) -> User:
+) -> Principal:
     exc = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = decode_token(credentials.credentials)
-    except JWTError:
-        raise exc
+    # SchoolContextMiddleware has already verified the Bearer token.
+    payload: dict | None = getattr(request.state, "auth_claims", None)
+    if payload is None:
+        try:
+            payload = decode_token_cached(credentials.credentials)
+        except JWTError:
+            raise exc
 
     if payload.get("type") != "access":
         raise exc
@@ -71,13 +113,26 @@ async def get_current_user(
         raise exc
 
     try:
-        user = await db.get(User, uuid.UUID(user_id_str))
+        user_id = uuid.UUID(user_id_str)
     except ValueError:
         raise exc
 
-    if user is None or not user.is_active:
+    # Cached in Redis; the database is only touched on a miss.
+    principal = await get_principal(user_id, redis, db)
+    if principal is None or not principal.is_active:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User inactive or not found")
 
+    return principal
+
+
+async def get_current_user_model(
+    principal: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> User:
+    """The full ORM User, for handlers that need more than id / role / school_id."""
+    user = await db.get(User, principal.id)
+    if user is None or not user.is_active:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User inactive or not found")
     return user
 
 
@@ -87,7 +142,7 @@ async def get_current_user(
 
 
 def require_role(*roles: str):
-    async def _check(current_user: User = Depends(get_current_user)) -> User:
+    async def _check(current_user: Principal = Depends(get_current_user)) -> Principal:
         if current_user.role not in roles:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -96,3 +151,26 @@ def require_role(*roles: str):
         return current_user
 
     return _check
+
+
+# ---------------------------------------------------------------------------
+# Metrics guard — a scraper's METRICS_TOKEN, or a super_admin's access token
+# ---------------------------------------------------------------------------
+
+
+async def require_metrics_access(
+    request: Request,
+    credentials: HTTPAuthorizationCredentials | None = Depends(_optional_bearer),
+    redis: Redis = Depends(get_redis),
+    db: AsyncSession = Depends(get_db),
+) -> None:
+    if credentials is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    if settings.METRICS_TOKEN and hmac.compare_digest(credentials.credentials, settings.METRICS_TOKEN):
+        return
+    principal = await get_current_user(request, credentials, redis, db)
+    await require_role("super_admin")(principal)
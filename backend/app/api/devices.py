@@ -0,0 +1,70 @@
+"""Push device registration endpoints.
+
+The mobile and web apps call POST /api/devices with their FCM token after
+login and whenever FCM rotates it, and DELETE /api/devices/{token} on
+logout.  Registration upserts on (user_id, device_token), so repeated calls
+are cheap and never create duplicates; a token that moves to another account
+(shared phone, re-login) is deactivated for its previous owner.
+"""
+
+from __future__ import annotations
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import func, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.deps import get_current_user, get_db
+from app.models.notification import PushDevice
+from app.schemas.device import DeviceOut, DeviceRegister
+from app.services.principal_cache import Principal
+
+router = APIRouter(prefix="/api/devices", tags=["devices"])
+
+
+@router.post("", response_model=DeviceOut)
+async def register_device(
+    body: DeviceRegister,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+) -> PushDevice:
+    stmt = insert(PushDevice).values(
+        user_id=current_user.id, device_token=body.device_token, device_type=body.device_type
+    )
+    stmt = stmt.on_conflict_do_update(
+        constraint="uq_push_devices_user_token",
+        set_={
+            "is_active": True,
+            "device_type": func.coalesce(stmt.excluded.device_type, PushDevice.device_type),
+            "updated_at": func.now(),
+        },
+    ).returning(PushDevice)
+    device = (await db.execute(stmt)).scalar_one()
+
+    await db.execute(
+        update(PushDevice)
+        .where(
+            PushDevice.device_token == body.device_token,
+            PushDevice.user_id != current_user.id,
+            PushDevice.is_active == True,  # noqa: E712
+        )
+        .values(is_active=False, updated_at=func.now())
+    )
+    await db.commit()
+    return device
+
+
+@router.delete("/{device_token}", status_code=status.HTTP_204_NO_CONTENT)
+async def unregister_device(
+    device_token: str,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+) -> None:
+    result = await db.execute(
+        update(PushDevice)
+        .where(PushDevice.user_id == current_user.id, PushDevice.device_token == device_token)
+        .values(is_active=False, updated_at=func.now())
+    )
+    if result.rowcount == 0:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Device not found")
+    await db.commit()
@@ -16,7 +16,7 @@ from fastapi import APIRouter, HTTPException, Query, Request, status
 from jose import JWTError
 from sse_starlette.sse import EventSourceResponse
 
-from app.services.auth_service import decode_token
+from app.services.auth_service import decode_token_cached
 from app.services.sse_service import manager
 
 logger = logging.getLogger(__name__)
@@ -38,7 +38,7 @@ async def stream(
         {"type": "connected", "user_id": "..."}
     """
     try:
-        payload = decode_token(token)
+        payload = decode_token_cached(token)
     except JWTError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
 
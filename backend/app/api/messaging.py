@@ -5,16 +5,15 @@ from __future__ import annotations
 import uuid
 from datetime import datetime, timezone
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from redis.asyncio import Redis
-from sqlalchemy import func, select, text
+from sqlalchemy import func, select, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
-from app.api.deps import get_current_user, get_db, get_redis
-from app.middleware.rate_limit import check_message_rate_limit
+from app.api.deps import get_current_user, get_db, get_read_db, get_redis, require_role
+from app.middleware.rate_limit import enforce_rate_limit
 from app.models.messaging import Conversation, ConversationParticipant, Message
-from app.models.notification import AuditLog
 from app.models.user import User
 from app.schemas.messaging import (
     BlockRequest,
@@ -22,10 +21,14 @@ from app.schemas.messaging import (
     ConversationOut,
     MessageCreate,
     MessageOut,
+    MessageSearchHit,
+    MessageSearchPage,
     MuteRequest,
     ParticipantOut,
 )
-from app.services.sse_service import manager as sse_manager
+from app.services.audit_service import audit_sink
+from app.services.message_ingest import IngestStopped, message_ingestor
+from app.services.principal_cache import Principal
 
 router = APIRouter(prefix="/api/conversations", tags=["messaging"])
 
@@ -35,13 +38,13 @@ router = APIRouter(prefix="/api/conversations", tags=["messaging"])
 # ---------------------------------------------------------------------------
 
 
-def _is_admin(user: User) -> bool:
+def _is_admin(user: Principal) -> bool:
     return user.role in ("school_admin", "super_admin")
 
 
 async def _get_conversation_or_403(
     conversation_id: uuid.UUID,
-    current_user: User,
+    current_user: Principal,
     db: AsyncSession,
 ) -> Conversation:
     """Fetch a conversation and verify the current user is a participant (admins bypass)."""
@@ -62,13 +65,12 @@ async def _get_conversation_or_403(
 
 
 async def _log_admin_access(
-    db: AsyncSession,
-    user: User,
+    user: Principal,
     conversation_id: uuid.UUID,
     request: Request,
 ) -> None:
     """Log school_admin access to a conversation in audit_log."""
-    entry = AuditLog(
+    await audit_sink.record(
         school_id=user.school_id,
         user_id=user.id,
         action="view_conversation",
@@ -76,8 +78,22 @@ async def _log_admin_access(
         entity_id=conversation_id,
         ip_address=request.client.host if request.client else None,
     )
-    db.add(entry)
-    await db.flush()
+
+
+async def _log_admin_search(
+    user: Principal,
+    filters: dict,
+    request: Request,
+) -> None:
+    """Log a school_admin message search (query text and filters) in audit_log."""
+    await audit_sink.record(
+        school_id=user.school_id,
+        user_id=user.id,
+        action="search_messages",
+        entity_type="message",
+        metadata={k: str(v) for k, v in filters.items() if v is not None},
+        ip_address=request.client.host if request.client else None,
+    )
 
 
 async def _build_participant_list(
@@ -164,8 +180,8 @@ async def _build_conversation_out(
 
 @router.get("", response_model=list[ConversationOut])
 async def list_conversations(
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db),
 ) -> list[ConversationOut]:
     """List all conversations for the current user, newest first."""
     if _is_admin(current_user):
@@ -189,10 +205,91 @@ async def list_conversations(
     return [await _build_conversation_out(c, current_user.id, db) for c in convs]
 
 
+@router.get("/search", response_model=MessageSearchPage)
+async def search_messages(
+    request: Request,
+    q: str | None = Query(None, min_length=2, description="Full-text query (web-search syntax: words, \"phrases\", -exclude)"),
+    learner_id: uuid.UUID | None = Query(None),
+    participant_id: uuid.UUID | None = Query(None, description="Only conversations this user takes part in"),
+    sent_after: datetime | None = Query(None),
+    sent_before: datetime | None = Query(None),
+    is_system: bool | None = Query(None),
+    before: datetime | None = Query(None, description="Cursor: next_before from the previous page"),
+    before_id: uuid.UUID | None = Query(None, description="Cursor: next_before_id from the previous page"),
+    limit: int = Query(50, ge=1, le=100),
+    current_user: Principal = Depends(require_role("school_admin")),
+    db: AsyncSession = Depends(get_db),
+) -> MessageSearchPage:
+    """Safeguarding review: search every message in the admin's school, newest first.
+
+    Only school admins: a super_admin belongs to no school, so there would be
+    nothing to search.  Every search is recorded in audit_log (via the
+    buffered audit sink).
+    """
+    await _log_admin_search(
+        current_user,
+        {
+            "q": q,
+            "learner_id": learner_id,
+            "participant_id": participant_id,
+            "sent_after": sent_after,
+            "sent_before": sent_before,
+            "is_system": is_system,
+        },
+        request,
+    )
+
+    stmt = (
+        select(Message, Conversation.subject, Conversation.learner_id)
+        .join(Conversation, Conversation.id == Message.conversation_id)
+        .where(Message.school_id == current_user.school_id)
+        .order_by(Message.created_at.desc(), Message.id.desc())
+        .limit(limit)
+    )
+    if q:
+        stmt = stmt.where(Message.body_tsv.op("@@")(func.websearch_to_tsquery("simple", q)))
+    if learner_id:
+        stmt = stmt.where(Conversation.learner_id == learner_id)
+    if participant_id:
+        stmt = stmt.where(
+            Message.conversation_id.in_(
+                select(ConversationParticipant.conversation_id).where(
+                    ConversationParticipant.user_id == participant_id
+                )
+            )
+        )
+    if sent_after:
+        stmt = stmt.where(Message.created_at >= sent_after)
+    if sent_before:
+        stmt = stmt.where(Message.created_at < sent_before)
+    if is_system is not None:
+        stmt = stmt.where(Message.is_system.is_(is_system))
+    if before and before_id:
+        stmt = stmt.where(tuple_(Message.created_at, Message.id) < tuple_(before, before_id))
+    elif before:
+        stmt = stmt.where(Message.created_at < before)
+
+    rows = (await db.execute(stmt)).all()
+    items = [
+        MessageSearchHit(
+            **MessageOut.model_validate(msg).model_dump(),
+            subject=subject,
+            learner_id=conv_learner_id,
+        )
+        for msg, subject, conv_learner_id in rows
+    ]
+
+    page = MessageSearchPage(items=items)
+    if len(items) == limit:
+        page.next_before = items[-1].created_at
+        page.next_before_id = items[-1].id
+    return page
+
+
 @router.post("", response_model=ConversationOut, status_code=status.HTTP_201_CREATED)
 async def create_conversation(
     body: ConversationCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ) -> ConversationOut:
     """Start a new conversation about a learner.
@@ -249,8 +346,8 @@ async def list_messages(
     request: Request,
     before: datetime | None = Query(None, description="Cursor: return messages before this timestamp"),
     limit: int = Query(50, ge=1, le=100),
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db),
 ) -> list[MessageOut]:
     """List messages in a conversation, newest first (use `before` cursor for pagination)."""
     conv = await _get_conversation_or_403(conversation_id, current_user, db)
@@ -259,8 +356,7 @@ async def list_messages(
     if _is_admin(current_user):
         participant_ids = {p.user_id for p in conv.participants}
         if current_user.id not in participant_ids:
-            await _log_admin_access(db, current_user, conversation_id, request)
-            await db.commit()
+            await _log_admin_access(current_user, conversation_id, request)
 
     stmt = (
         select(Message)
@@ -284,7 +380,8 @@ async def list_messages(
 async def send_message(
     conversation_id: uuid.UUID,
     body: MessageCreate,
-    current_user: User = Depends(get_current_user),
+    response: Response,
+    current_user: Principal = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
     redis: Redis = Depends(get_redis),
 ) -> MessageOut:
@@ -302,44 +399,23 @@ async def send_message(
         )
 
     # Rate limit
-    within_limit = await check_message_rate_limit(str(current_user.id), redis)
-    if not within_limit:
-        raise HTTPException(
-            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            detail="Rate limit exceeded: 30 messages per hour",
-        )
-
-    msg = Message(
-        conversation_id=conversation_id,
-        sender_id=current_user.id,
-        body=body.body.strip(),
-        is_system=False,
-    )
-    db.add(msg)
-
-    # Bump conversation.updated_at
-    await db.execute(
-        text("UPDATE conversations SET updated_at = now() WHERE id = :cid"),
-        {"cid": str(conversation_id)},
-    )
+    await enforce_rate_limit("messages", str(current_user.id), redis, response, role=current_user.role)
 
+    # Hand the read connection back to the pool before queuing the write.
     await db.commit()
-    await db.refresh(msg)
 
-    # SSE broadcast to all non-blocked participants
-    other_ids = [
-        str(p.user_id)
-        for p in conv.participants
-        if p.user_id != current_user.id and not p.is_blocked
-    ]
-    await sse_manager.broadcast(
-        other_ids,
-        {
-            "type": "message.new",
-            "conversation_id": str(conversation_id),
-            "message_id": str(msg.id),
-        },
-    )
+    # Single-statement insert + conversation bump + outbox row, group-committed
+    # with any concurrent sends for this school (see app.services.message_ingest).
+    # The SSE event to the other participants goes out via the outbox relay.
+    try:
+        msg = await message_ingestor.submit(
+            school_id=conv.school_id,
+            conversation_id=conversation_id,
+            sender_id=current_user.id,
+            body=body.body.strip(),
+        )
+    except IngestStopped:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Server is shutting down")
 
     return MessageOut.model_validate(msg)
 
@@ -347,7 +423,7 @@ async def send_message(
 @router.put("/{conversation_id}/read", status_code=status.HTTP_204_NO_CONTENT)
 async def mark_read(
     conversation_id: uuid.UUID,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ) -> None:
     """Mark all messages in a conversation as read for the current user."""
@@ -365,7 +441,7 @@ async def mark_read(
 async def mute_conversation(
     conversation_id: uuid.UUID,
     body: MuteRequest,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ) -> None:
     """Teacher: mute or unmute a conversation. Inserts a system message when muting."""
@@ -389,6 +465,7 @@ async def mute_conversation(
     if body.muted and not was_muted:
         db.add(
             Message(
+                school_id=conv.school_id,
                 conversation_id=conversation_id,
                 sender_id=current_user.id,
                 body="This conversation has been muted by the teacher.",
@@ -403,7 +480,7 @@ async def mute_conversation(
 async def block_participant(
     conversation_id: uuid.UUID,
     body: BlockRequest,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ) -> None:
     """Teacher/admin: block or unblock a participant. Inserts a system message when blocking."""
@@ -427,6 +504,7 @@ async def block_participant(
     if body.blocked and not was_blocked:
         db.add(
             Message(
+                school_id=conv.school_id,
                 conversation_id=conversation_id,
                 sender_id=current_user.id,
                 body="This conversation has been paused. Contact the school office if you need assistance.",
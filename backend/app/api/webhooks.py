@@ -0,0 +1,106 @@
+"""Provider delivery-status webhooks.
+
+Providers call these with delivery reports for messages the worker sent.
+Each report is handed to the buffered delivery_status writer
+(app.services.notification_log) and applied in batches, so a burst of
+callbacks after a large announcement costs a few UPDATE statements, not one
+per message.  Handlers answer 200 as soon as the report is buffered —
+providers retry slow or failed callbacks.
+
+  SMS (Clickatell)     POST /api/webhooks/sms?token=<SMS_WEBHOOK_TOKEN>
+  WhatsApp (Meta)      GET  /api/webhooks/whatsapp   subscription handshake
+                       POST /api/webhooks/whatsapp   signed with WHATSAPP_APP_SECRET
+
+FCM has no delivery callbacks; push rows stay 'sent'.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import hmac
+from datetime import datetime, timezone
+
+from fastapi import APIRouter, HTTPException, Query, Request, Response, status
+
+from app.config import settings
+from app.services.notification_log import StatusUpdate, delivery_status
+
+router = APIRouter(prefix="/api/webhooks", tags=["webhooks"])
+
+# Clickatell message statuses → notification_log status (others are intermediate)
+_SMS_STATUSES = {
+    "RECEIVED_BY_RECIPIENT": "delivered",
+    "ERROR_DELIVERING_MESSAGE": "failed",
+    "ROUTING_ERROR": "failed",
+    "MESSAGE_EXPIRED": "failed",
+    "MESSAGE_REJECTED": "failed",
+}
+
+_WHATSAPP_STATUSES = {"delivered": "delivered", "read": "read", "failed": "failed"}
+
+
+def _from_epoch(value: str | int | float | None, scale: float = 1.0) -> datetime:
+    if value is None:
+        return datetime.now(timezone.utc)
+    return datetime.fromtimestamp(float(value) / scale, tz=timezone.utc)
+
+
+@router.post("/sms", status_code=status.HTTP_200_OK)
+async def sms_status(request: Request, token: str = Query(...)) -> Response:
+    if not settings.SMS_WEBHOOK_TOKEN or not hmac.compare_digest(token, settings.SMS_WEBHOOK_TOKEN):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid webhook token")
+
+    report = await request.json()
+    new_status = _SMS_STATUSES.get(report.get("status", ""))
+    if new_status and report.get("messageId"):
+        await delivery_status.record(
+            StatusUpdate(
+                provider_message_id=report["messageId"],
+                status=new_status,
+                at=_from_epoch(report.get("timestamp"), scale=1000),  # milliseconds
+                error_message=report.get("statusDescription") if new_status == "failed" else None,
+            )
+        )
+    return Response(status_code=status.HTTP_200_OK)
+
+
+@router.get("/whatsapp")
+async def whatsapp_verify(
+    mode: str = Query(..., alias="hub.mode"),
+    verify_token: str = Query(..., alias="hub.verify_token"),
+    challenge: str = Query(..., alias="hub.challenge"),
+) -> Response:
+    if (
+        mode != "subscribe"
+        or not settings.WHATSAPP_VERIFY_TOKEN
+        or not hmac.compare_digest(verify_token, settings.WHATSAPP_VERIFY_TOKEN)
+    ):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid verify token")
+    return Response(content=challenge, media_type="text/plain")
+
+
+@router.post("/whatsapp", status_code=status.HTTP_200_OK)
+async def whatsapp_status(request: Request) -> Response:
+    body = await request.body()
+    expected = "sha256=" + hmac.new(settings.WHATSAPP_APP_SECRET.encode(), body, hashlib.sha256).hexdigest()
+    signature = request.headers.get("x-hub-signature-256", "")
+    if not settings.WHATSAPP_APP_SECRET or not hmac.compare_digest(signature, expected):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid signature")
+
+    payload = await request.json()
+    for entry in payload.get("entry", []):
+        for change in entry.get("changes", []):
+            for report in change.get("value", {}).get("statuses", []):
+                new_status = _WHATSAPP_STATUSES.get(report.get("status", ""))
+                if not new_status or not report.get("id"):
+                    continue
+                errors = report.get("errors") or [{}]
+                await delivery_status.record(
+                    StatusUpdate(
+                        provider_message_id=report["id"],
+                        status=new_status,
+                        at=_from_epoch(report.get("timestamp")),
+                        error_message=errors[0].get("title") if new_status == "failed" else None,
+                    )
+                )
+    return Response(status_code=status.HTTP_200_OK)
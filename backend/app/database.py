@@ -1,28 +1,151 @@
+import time
+import uuid
 from collections.abc import AsyncGenerator
+from contextvars import ContextVar
 
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
-from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import DeclarativeBase, Session
+from sqlalchemy.pool import NullPool
 
 from app.config import settings
+from app.services import metrics, query_stats
 
 
 class Base(DeclarativeBase):
     pass
 
 
-engine = create_async_engine(
-    settings.DATABASE_URL,
-    echo=settings.ENVIRONMENT == "development",
-    pool_pre_ping=True,
-)
+def make_engine(url: str, pool_mode: str = settings.DATABASE_POOL_MODE) -> AsyncEngine:
+    """Create an engine for *url*.
+
+    pool_mode "direct": SQLAlchemy pools connections to Postgres itself.
+    pool_mode "pgbouncer": PgBouncer in transaction mode does the pooling, so
+    a server connection is only ours for one transaction.  Hence NullPool,
+    no asyncpg statement caches, and uniquely named prepared statements so
+    two clients sharing a server connection never collide.  Session-level
+    state is unsafe here; the tenant GUC is transaction-local (see
+    _apply_tenant), which PgBouncer preserves.
+    """
+    if pool_mode == "pgbouncer":
+        return create_async_engine(
+            url,
+            echo=settings.ENVIRONMENT == "development",
+            poolclass=NullPool,
+            connect_args={
+                "statement_cache_size": 0,
+                "prepared_statement_cache_size": 0,
+                "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+            },
+        )
+    if pool_mode != "direct":
+        raise ValueError(f"Unknown DATABASE_POOL_MODE {pool_mode!r}")
+    return create_async_engine(
+        url,
+        echo=settings.ENVIRONMENT == "development",
+        pool_pre_ping=True,
+        pool_size=settings.DATABASE_POOL_SIZE,
+        max_overflow=settings.DATABASE_MAX_OVERFLOW,
+    )
+
+
+engine = make_engine(settings.DATABASE_URL)
+
+# Streaming replica for read-only routes (deps.get_read_db); None = read from the primary.
+replica_engine = make_engine(settings.DATABASE_REPLICA_URL) if settings.DATABASE_REPLICA_URL else None
+
+
+# ---------------------------------------------------------------------------
+# Tenant-scoped sessions
+# ---------------------------------------------------------------------------
+# Sessions are lazy: nothing is checked out of the pool until the first
+# statement.  The tenant for RLS is carried in session.info["school_id"] and
+# applied by an after_begin hook on the connection the transaction starts on,
+# so every transaction — including those after a commit() — is scoped.
+
+
+class TenantSession(Session):
+    """Sync session behind AsyncSessionLocal; see _apply_tenant."""
+
+
+@event.listens_for(TenantSession, "after_begin")
+def _apply_tenant(session: Session, transaction, connection) -> None:
+    school_id = session.info.get("school_id")
+    if school_id:
+        # is_local=true: the setting ends with the transaction, so pooled
+        # connections never leak a tenant into the next checkout.
+        connection.execute(
+            text("SELECT set_config('app.current_school_id', :sid, true)"),
+            {"sid": str(school_id)},
+        )
+
 
 AsyncSessionLocal = async_sessionmaker(
     engine,
     class_=AsyncSession,
+    sync_session_class=TenantSession,
     expire_on_commit=False,
 )
 
 
+ReplicaSessionLocal = (
+    async_sessionmaker(
+        replica_engine,
+        class_=AsyncSession,
+        sync_session_class=TenantSession,
+        expire_on_commit=False,
+    )
+    if replica_engine is not None
+    else None
+)
+
+
+async def set_tenant(session: AsyncSession, school_id: uuid.UUID | str | None) -> None:
+    """Scope *session* to *school_id* for RLS, including a transaction already in progress."""
+    session.info["school_id"] = str(school_id) if school_id else None
+    if school_id and session.in_transaction():
+        await session.execute(
+            text("SELECT set_config('app.current_school_id', :sid, true)"),
+            {"sid": str(school_id)},
+        )
+
+
+# ---------------------------------------------------------------------------
+# Pool metrics — how long each route holds a connection
+# ---------------------------------------------------------------------------
+
+# Set by deps.get_db; read when a connection is checked out.
+current_route: ContextVar[str] = ContextVar("current_route", default="-")
+
+_HOLD = metrics.histogram("db_connection_hold_seconds", "Time a pooled connection is checked out, per route")
+_CHECKOUTS = metrics.counter("db_pool_checkouts_total", "Pool checkouts, per route")
+_CHECKED_OUT = metrics.gauge("db_pool_checked_out", "Connections currently checked out")
+
+
+def _instrument_pool(target: AsyncEngine, pool: str) -> None:
+    @event.listens_for(target.sync_engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy) -> None:
+        route = current_route.get()
+        connection_record.info["checkout"] = (route, time.perf_counter())
+        _CHECKOUTS.inc(route=route, pool=pool)
+        _CHECKED_OUT.inc(pool=pool)
+
+    @event.listens_for(target.sync_engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record) -> None:
+        checkout = connection_record.info.pop("checkout", None)
+        if checkout is not None:
+            route, started = checkout
+            _HOLD.observe(time.perf_counter() - started, route=route, pool=pool)
+            _CHECKED_OUT.dec(pool=pool)
+
+
+_instrument_pool(engine, "primary")
+query_stats.instrument(engine)
+if replica_engine is not None:
+    _instrument_pool(replica_engine, "replica")
+    query_stats.instrument(replica_engine)
+
+
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
     async with AsyncSessionLocal() as session:
         yield session
@@ -1,35 +1,70 @@
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from arq import create_pool
+from arq.connections import RedisSettings
+from fastapi import Depends, FastAPI
 from redis.asyncio import Redis
 
 from app.api import announcements as announcements_router
 from app.api import auth as auth_router
+from app.api import devices as devices_router
 from app.api import events as events_router
 from app.api import messaging as messaging_router
+from app.api import webhooks as webhooks_router
+from app.api.deps import require_metrics_access
 from app.config import settings
+from app.middleware.read_your_writes import ReadYourWritesMiddleware
 from app.middleware.school_context import SchoolContextMiddleware
+from app.middleware.server_timing import ServerTimingMiddleware
+from app.services.audit_service import audit_sink
+from app.services.db_events import db_events
+from app.services.message_ingest import message_ingestor
+from app.services.metrics_export import metrics_publisher
+from app.services.notification_log import delivery_status
+from app.services.school_resolver import school_resolver
+from app.services.sse_service import manager as sse_manager
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup: create Redis connection pool
     app.state.redis = Redis.from_url(settings.REDIS_URL, decode_responses=False)
+    app.state.arq = await create_pool(RedisSettings.from_dsn(settings.REDIS_URL))
+    audit_sink.start()
+    delivery_status.start()
+    school_resolver.start(app.state.redis)
+    sse_manager.start(app.state.redis)
+    db_events.start(app.state.redis)
+    metrics_publisher.start(app.state.redis, "api")
     yield
-    # Shutdown: close Redis pool
+    # Shutdown: let in-flight message batches commit, flush buffered audit
+    # entries and delivery statuses, then close Redis pools
+    await metrics_publisher.aclose()
+    await db_events.aclose()
+    await school_resolver.aclose()
+    await sse_manager.aclose()
+    await message_ingestor.aclose()
+    await audit_sink.aclose()
+    await delivery_status.aclose()
+    await app.state.arq.aclose()
     await app.state.redis.aclose()
 
 
 app = FastAPI(title="BellBook API", version="0.1.0", lifespan=lifespan)
 
-# Middleware (outermost first — school context must run before route handlers)
+# Middleware (add_middleware wraps, so the last added is outermost — school
+# context must run before route handlers; timing wraps everything)
+app.add_middleware(ReadYourWritesMiddleware)
 app.add_middleware(SchoolContextMiddleware)
+app.add_middleware(ServerTimingMiddleware)
 
 # Routers
 app.include_router(auth_router.router)
 app.include_router(announcements_router.router)
+app.include_router(devices_router.router)
 app.include_router(events_router.router)
 app.include_router(messaging_router.router)
+app.include_router(webhooks_router.router)
 
 
 @app.get("/api/health")
@@ -42,3 +77,17 @@ async def health() -> dict:
         redis_ok = False
 
     return {"status": "ok", "redis": redis_ok}
+
+
+@app.get("/api/metrics", dependencies=[Depends(require_metrics_access)])
+async def get_metrics() -> dict:
+    """Metrics of every live API, worker and relay process.
+
+    Queue waits, pool usage, latencies and provider calls, each series
+    labelled with the job and instance it came from
+    (app.services.metrics_export).
+
+    Route labels and per-school counters are not public: the caller needs
+    METRICS_TOKEN or a super_admin access token.
+    """
+    return await metrics_publisher.collect(app.state.redis)
@@ -1,17 +1,157 @@
-"""Redis fixed-window rate limiter for messaging."""
+"""Redis sliding-window rate limiter with declarative per-route policies.
 
+Every check is one round trip: a Lua script trims the identity's sorted set
+to the window, counts what is left, and records the hit only if it is within
+the limit.  The key's TTL is refreshed in the same script, so a crash can
+never leave a key without expiry, and there is no fixed-window boundary that
+lets a client send twice the limit across two windows.
+
+Usage in a route:
+    await enforce_rate_limit("messages", str(current_user.id), redis, response, role=current_user.role)
+"""
+
+from __future__ import annotations
+
+import uuid
+from dataclasses import dataclass, field
+
+from fastapi import HTTPException, Response, status
 from redis.asyncio import Redis
 
+from app.services.redis_scripts import RedisScript
+
+# KEYS[1] = bucket key
+# ARGV[1] = limit, ARGV[2] = window (ms), ARGV[3] = unique member for this hit
+# Returns {allowed (0/1), remaining, ms until the oldest hit leaves the window}
+_SLIDING_WINDOW = RedisScript("""
+local key = KEYS[1]
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+
+redis.call('ZREMRANGEBYSCORE', key, '-inf', now - window)
+local count = redis.call('ZCARD', key)
+local allowed = 0
+if count < limit then
+    redis.call('ZADD', key, now, ARGV[3])
+    count = count + 1
+    allowed = 1
+end
+redis.call('PEXPIRE', key, window)
+
+local reset = window
+local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+if oldest[2] then
+    reset = tonumber(oldest[2]) + window - now
+end
+return {allowed, limit - count, reset}
+""")
+
+
+# ---------------------------------------------------------------------------
+# Policies
+# ---------------------------------------------------------------------------
+
+
+@dataclass(frozen=True)
+class RateLimitPolicy:
+    label: str             # used in the 429 detail, e.g. "messages"
+    limit: int
+    window_seconds: int
+    role_limits: dict[str, int] = field(default_factory=dict)
+
+    def limit_for(self, role: str | None) -> int:
+        return self.role_limits.get(role, self.limit) if role else self.limit
+
+
+POLICIES: dict[str, RateLimitPolicy] = {
+    # Keyed by user id — messaging safeguard from the spec (30/hour)
+    "messages": RateLimitPolicy("messages", limit=30, window_seconds=3600),
+    # Keyed by phone number — every request costs an SMS
+    "otp_request": RateLimitPolicy("OTP requests", limit=5, window_seconds=900),
+    # Keyed by email address — caps password guessing per account
+    "login": RateLimitPolicy("login attempts", limit=10, window_seconds=900),
+    # Keyed by user id — each announcement fans out to every parent
+    "announcement_create": RateLimitPolicy(
+        "announcements",
+        limit=20,
+        window_seconds=3600,
+        role_limits={"school_admin": 60},
+    ),
+}
+
+
+# ---------------------------------------------------------------------------
+# Limiter
+# ---------------------------------------------------------------------------
+
+
+@dataclass(frozen=True, slots=True)
+class RateLimitResult:
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_seconds: int
+
+    def headers(self) -> dict[str, str]:
+        headers = {
+            "RateLimit-Limit": str(self.limit),
+            "RateLimit-Remaining": str(max(self.remaining, 0)),
+            "RateLimit-Reset": str(self.reset_seconds),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(self.reset_seconds)
+        return headers
+
+
+async def check_rate_limit(
+    policy_name: str,
+    identity: str,
+    redis: Redis,
+    role: str | None = None,
+) -> RateLimitResult:
+    """Record a hit against *policy_name* for *identity* and report the outcome."""
+    policy = POLICIES[policy_name]
+    limit = policy.limit_for(role)
+    allowed, remaining, reset_ms = await _SLIDING_WINDOW(
+        redis,
+        keys=[f"rate:{policy_name}:{identity}"],
+        args=[limit, policy.window_seconds * 1000, uuid.uuid4().hex],
+    )
+    return RateLimitResult(
+        allowed=bool(allowed),
+        limit=limit,
+        remaining=int(remaining),
+        reset_seconds=max(1, -(-int(reset_ms) // 1000)),  # ceil to whole seconds
+    )
+
+
+async def enforce_rate_limit(
+    policy_name: str,
+    identity: str,
+    redis: Redis,
+    response: Response | None = None,
+    role: str | None = None,
+) -> None:
+    """Raise 429 (with Retry-After) if over the limit; otherwise add RateLimit-* headers to *response*."""
+    result = await check_rate_limit(policy_name, identity, redis, role=role)
+    if not result.allowed:
+        policy = POLICIES[policy_name]
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Rate limit exceeded: {result.limit} {policy.label} per {_window_label(policy.window_seconds)}",
+            headers=result.headers(),
+        )
+    if response is not None:
+        response.headers.update(result.headers())
 
-async def check_message_rate_limit(user_id: str, redis: Redis) -> bool:
-    """Fixed-window rate limiter: 30 messages per user per hour.
 
-    Returns True if the request is within limits, False if exceeded.
-    Uses INCR + EXPIRE (atomic on first call; safe for Phase 1 single-process).
-    """
-    key = f"rate:msg:{user_id}"
-    count = await redis.incr(key)
-    if count == 1:
-        # First message in this window — set 1-hour TTL
-        await redis.expire(key, 3600)
-    return count <= 30
+def _window_label(seconds: int) -> str:
+    if seconds == 3600:
+        return "hour"
+    if seconds % 3600 == 0:
+        return f"{seconds // 3600} hours"
+    if seconds % 60 == 0:
+        return f"{seconds // 60} minutes"
+    return f"{seconds} seconds"
@@ -0,0 +1,60 @@
+"""Read-your-writes pin for the read replica.
+
+After a user's write commits, their reads must not reach a replica that has
+not caught up yet.  deps.get_db marks a write request once its session
+commits; when that request's response starts with a status below 400, this
+middleware sets rw:pin:<user id> for READ_YOUR_WRITES_SECONDS, and
+deps.get_read_db sends the user's reads to the primary while it exists.
+
+The pin is set before the response is sent, so the client cannot issue a
+follow-up read ahead of it.  Requests that fail — validation errors, rate
+limits, a rolled-back write — never pin.  Inactive when no replica is
+configured.
+"""
+
+from __future__ import annotations
+
+import logging
+
+from sqlalchemy.orm import Session
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+from app.database import ReplicaSessionLocal
+
+logger = logging.getLogger(__name__)
+
+_STATE_KEY = "rw_pin_user"
+
+
+def pin_key(user_id: str) -> str:
+    return f"rw:pin:{user_id}"
+
+
+def mark_committed(scope: Scope, user_id: str, session: Session) -> None:
+    """after_commit hook registered by deps.get_db on a write request's session."""
+    scope["state"][_STATE_KEY] = user_id
+
+
+class ReadYourWritesMiddleware:
+    """Pure-ASGI middleware; SSE-safe like SchoolContextMiddleware."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or ReplicaSessionLocal is None:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_pin(message: Message) -> None:
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                user_id = scope.get("state", {}).get(_STATE_KEY)
+                if user_id:
+                    try:
+                        await scope["app"].state.redis.set(pin_key(user_id), 1, ex=settings.READ_YOUR_WRITES_SECONDS)
+                    except Exception:
+                        logger.exception("Read-your-writes pin failed user=%s", user_id)
+            await send(message)
+
+        await self.app(scope, receive, send_with_pin)
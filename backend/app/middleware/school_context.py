@@ -1,14 +1,17 @@
 """School context middleware.
 
-Extracts the current school_id from each request and stores it in
-request.state.school_id.  The get_db dependency then issues
-  SET LOCAL app.current_school_id = <id>
-on every database session, enforcing PostgreSQL RLS.
+Verifies the Bearer token once per request and stores its claims in
+request.state.auth_claims (None if absent or invalid), then extracts the
+current school_id into request.state.school_id.  Dependencies such as
+get_current_user read the claims from there instead of decoding the JWT
+again.  Sessions from the get_db dependency then run
+  set_config('app.current_school_id', <id>, true)
+at the start of every transaction, enforcing PostgreSQL RLS.
 
 School ID resolution order:
   1. JWT Bearer token  → "school_id" claim  (primary, for all API calls)
   2. X-School-ID header           (admin tooling fallback)
-  3. Subdomain parsing            (future: requires a DB/cache lookup)
+  3. Subdomain slug               (app.services.school_resolver; cached)
 
 Implemented as a pure ASGI middleware (not BaseHTTPMiddleware) so it
 does not buffer response bodies and is safe for SSE / streaming responses.
@@ -17,34 +20,58 @@ does not buffer response bodies and is safe for SSE / streaming responses.
 from __future__ import annotations
 
 import logging
-from typing import TYPE_CHECKING
+from typing import Any
+from urllib.parse import urlsplit
 
 from jose import JWTError
 from starlette.datastructures import Headers
 from starlette.types import ASGIApp, Receive, Scope, Send
 
-from app.services.auth_service import decode_token
-
-if TYPE_CHECKING:
-    pass
+from app.config import settings
+from app.services.auth_service import decode_token_cached
+from app.services.school_resolver import school_resolver
 
 logger = logging.getLogger(__name__)
 
 
-def _extract_school_id(headers: Headers) -> str | None:
-    """Return the school_id string from the request headers, or None."""
+# "rivonia-primary.bellbook.co.za" → "rivonia-primary"
+_BASE_DOMAIN = (urlsplit(settings.APP_URL).hostname or "").lower()
+_RESERVED_SUBDOMAINS = frozenset({"www", "api", "app", "admin"})
+
+
+def _parse_slug(host: str) -> str | None:
+    host = host.rsplit(":", 1)[0].lower()
+    if not _BASE_DOMAIN or not host.endswith("." + _BASE_DOMAIN):
+        return None
+    slug = host[: -len(_BASE_DOMAIN) - 1]
+    if not slug or "." in slug or slug in _RESERVED_SUBDOMAINS:
+        return None
+    return slug
+
 
-    # 1. Try Bearer token
+def _extract_claims(headers: Headers) -> dict[str, Any] | None:
+    """Return the verified claims of the Bearer token, or None."""
     auth = headers.get("authorization", "")
-    if auth.startswith("Bearer "):
-        token = auth[len("Bearer "):]
-        try:
-            payload = decode_token(token)
-            school_id = payload.get("school_id")
-            if school_id:
-                return str(school_id)
-        except JWTError:
-            pass  # malformed / expired tokens are handled by get_current_user
+    if not auth.startswith("Bearer "):
+        return None
+    try:
+        return decode_token_cached(auth[len("Bearer "):])
+    except JWTError:
+        return None  # malformed / expired tokens are handled by get_current_user
+
+
+async def _extract_school_id(
+    scope: Scope,
+    headers: Headers,
+    claims: dict[str, Any] | None,
+) -> str | None:
+    """Return the school_id string for the request, or None."""
+
+    # 1. Bearer token claims
+    if claims:
+        school_id = claims.get("school_id")
+        if school_id:
+            return str(school_id)
 
     # 2. Explicit header (admin CLI / Postman)
     explicit = headers.get("x-school-id")
@@ -52,11 +79,12 @@ def _extract_school_id(headers: Headers) -> str | None:
         return explicit
 
     # 3. Subdomain  (e.g. rivonia-primary.bellbook.co.za)
-    # Requires a slug→UUID lookup; deferred to Phase 1.5.
-    # host = headers.get("host", "")
-    # slug = _parse_slug(host)
-    # if slug:
-    #     return await resolve_slug(slug)  # would need async; skip for now
+    # Only reached by unauthenticated requests; usually a local cache hit.
+    slug = _parse_slug(headers.get("host", ""))
+    if slug:
+        redis = getattr(scope["app"].state, "redis", None)
+        if redis is not None:
+            return await school_resolver.resolve(slug, redis)
 
     return None
 
@@ -70,11 +98,12 @@ class SchoolContextMiddleware:
     async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         if scope["type"] in ("http", "websocket"):
             headers = Headers(scope=scope)
-            school_id = _extract_school_id(headers)
+            claims = _extract_claims(headers)
 
             # Starlette lazily initialises scope["state"]; ensure it exists.
             if "state" not in scope:
                 scope["state"] = {}
-            scope["state"]["school_id"] = school_id
+            scope["state"]["auth_claims"] = claims
+            scope["state"]["school_id"] = await _extract_school_id(scope, headers, claims)
 
         await self.app(scope, receive, send)
@@ -0,0 +1,62 @@
+"""Per-request database timing.
+
+Tracks every SQL statement a request runs (app.services.query_stats) and
+reports the total as a Server-Timing header, visible in browser devtools:
+
+    Server-Timing: db;dur=12.4;desc="7 queries"
+
+Each request is also logged with its query count and DB time.  Requests
+that repeat one statement shape QUERY_REPEAT_THRESHOLD times or more are
+logged as warnings with the offending statement — the signature of an N+1
+loop.
+
+The header is added when the response starts, so statements a streaming
+response runs afterwards are logged but not in the header.
+"""
+
+from __future__ import annotations
+
+import logging
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.services.query_stats import track_queries
+
+logger = logging.getLogger(__name__)
+
+
+class ServerTimingMiddleware:
+    """Pure-ASGI middleware; SSE-safe like SchoolContextMiddleware."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        with track_queries() as stats:
+
+            async def send_with_timing(message: Message) -> None:
+                nonlocal status_code
+                if message["type"] == "http.response.start":
+                    status_code = message["status"]
+                    headers = MutableHeaders(scope=message)
+                    headers.append("Server-Timing", f'db;dur={stats.seconds * 1000:.1f};desc="{stats.count} queries"')
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_timing)
+            finally:
+                route = getattr(scope.get("route"), "path", scope["path"])
+                logger.info(
+                    "Request queries method=%s route=%s status=%d queries=%d db_ms=%.1f",
+                    scope["method"], route, status_code, stats.count, stats.seconds * 1000,
+                    extra={"route": route, "queries": stats.count, "db_ms": round(stats.seconds * 1000, 1)},
+                )
+                for shape, n in stats.repeated():
+                    logger.warning("Repeated query shape route=%s count=%d sql=%s", route, n, shape)
@@ -8,3 +8,4 @@ from app.models.absence import AbsenceReport  # noqa: F401
 from app.models.consent import ConsentForm, ConsentResponse  # noqa: F401
 from app.models.calendar import CalendarEvent  # noqa: F401
 from app.models.notification import PushDevice, NotificationPreference, NotificationLog, AuditLog  # noqa: F401
+from app.models.outbox import OutboxEvent  # noqa: F401
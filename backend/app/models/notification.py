@@ -21,6 +21,10 @@ class PushDevice(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
+    __table_args__ = (
+        UniqueConstraint("user_id", "device_token", name="uq_push_devices_user_token"),
+    )
+
 
 class NotificationPreference(Base):
     __tablename__ = "notification_preferences"
@@ -42,6 +46,8 @@ class NotificationPreference(Base):
 
 
 class NotificationLog(Base):
+    # Partitioned by month on sent_at (migration 0003); table PK is (id, sent_at).
+    # Write through app.services.notification_log, not an ORM session.
     __tablename__ = "notification_log"
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -57,15 +63,20 @@ class NotificationLog(Base):
     reference_id: Mapped[uuid.UUID | None] = mapped_column(UUID(as_uuid=True), nullable=True)
     status: Mapped[str] = mapped_column(
         String(20),
-        CheckConstraint("status IN ('sent', 'delivered', 'failed', 'read')", name="notification_log_status_check"),
+        CheckConstraint(
+            "status IN ('sent', 'delivered', 'failed', 'read', 'unknown')", name="notification_log_status_check"
+        ),
         default="sent",
     )
     sent_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
     delivered_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
     error_message: Mapped[str | None] = mapped_column(Text, nullable=True)
+    provider_message_id: Mapped[str | None] = mapped_column(String(128), nullable=True)
 
 
 class AuditLog(Base):
+    # Partitioned by month on created_at (migration 0003); table PK is (id, created_at).
+    # Write through app.services.audit_service.audit_sink, not the request session.
     __tablename__ = "audit_log"
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
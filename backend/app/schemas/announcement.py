@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 import uuid
-from datetime import datetime
+from datetime import datetime, timezone
 
 from pydantic import BaseModel, field_validator
 
@@ -49,6 +49,14 @@ class AnnouncementCreate(BaseModel):
             raise ValueError("priority must be 'urgent', 'normal', or 'info'")
         return v
 
+    @field_validator("published_at", "expires_at")
+    @classmethod
+    def validate_utc(cls, v: datetime | None) -> datetime | None:
+        # A time without an offset is taken as UTC, not the server's local time.
+        if v is None:
+            return v
+        return v.replace(tzinfo=timezone.utc) if v.tzinfo is None else v.astimezone(timezone.utc)
+
 
 class AnnouncementOut(BaseModel):
     id: uuid.UUID
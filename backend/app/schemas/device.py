@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+import uuid
+from datetime import datetime
+from typing import Literal
+
+from pydantic import BaseModel, field_validator
+
+
+class DeviceRegister(BaseModel):
+    device_token: str
+    device_type: Literal["android", "ios", "web"] | None = None
+
+    @field_validator("device_token")
+    @classmethod
+    def strip_token(cls, v: str) -> str:
+        v = v.strip()
+        if not v or len(v) > 4096:
+            raise ValueError("device_token must be 1-4096 characters")
+        return v
+
+
+class DeviceOut(BaseModel):
+    id: uuid.UUID
+    device_token: str
+    device_type: str | None
+    is_active: bool
+    updated_at: datetime
+
+    model_config = {"from_attributes": True}
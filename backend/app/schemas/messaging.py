@@ -74,6 +74,23 @@ class MessageCreate(BaseModel):
     body: str
 
 
+# ---------------------------------------------------------------------------
+# Safeguarding search (admin)
+# ---------------------------------------------------------------------------
+
+
+class MessageSearchHit(MessageOut):
+    subject: str | None
+    learner_id: uuid.UUID | None
+
+
+class MessageSearchPage(BaseModel):
+    items: list[MessageSearchHit]
+    # Keyset cursor for the next page: pass back as before / before_id
+    next_before: datetime | None = None
+    next_before_id: uuid.UUID | None = None
+
+
 # ---------------------------------------------------------------------------
 # Teacher / admin actions
 # ---------------------------------------------------------------------------
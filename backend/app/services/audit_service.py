@@ -0,0 +1,181 @@
+"""Buffered, asynchronous audit_log writer.
+
+All AuditLog writes go through the `audit_sink` singleton instead of the
+request's own session:
+
+    await audit_sink.record(school_id=..., user_id=..., action="view_conversation", ...)
+
+record() only appends to an in-process buffer, so the request pays for no
+extra transaction and an audit_log hiccup cannot fail a read.  A background
+task bulk-inserts the buffer every AUDIT_FLUSH_INTERVAL_SECONDS, or sooner
+once AUDIT_BATCH_SIZE entries are waiting.
+
+Delivery is at-least-once:
+  - entries leave the buffer only after their batch has committed; a failed
+    batch stays at the head of the buffer and is retried with backoff;
+  - ids and timestamps are assigned at record() time and inserts use
+    ON CONFLICT DO NOTHING, so a retried batch never duplicates rows;
+  - the buffer is flushed on shutdown (aclose());
+  - the buffer is bounded: once AUDIT_MAX_BUFFER entries are waiting,
+    record() flushes inline instead of dropping entries.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import uuid
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from itertools import groupby
+
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+
+from app.config import settings
+from app.database import current_route, engine
+from app.models.notification import AuditLog
+from app.services.query_stats import stop_tracking
+
+logger = logging.getLogger(__name__)
+
+_MAX_RETRY_DELAY = 30.0  # seconds
+
+
+@dataclass(slots=True)
+class AuditEvent:
+    school_id: uuid.UUID | None
+    user_id: uuid.UUID | None
+    action: str
+    entity_type: str | None = None
+    entity_id: uuid.UUID | None = None
+    metadata: dict | None = None
+    ip_address: str | None = None
+    id: uuid.UUID = field(default_factory=uuid.uuid4)
+    created_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+class AuditSink:
+    def __init__(
+        self,
+        flush_interval: float = settings.AUDIT_FLUSH_INTERVAL_SECONDS,
+        batch_size: int = settings.AUDIT_BATCH_SIZE,
+        max_buffer: int = settings.AUDIT_MAX_BUFFER,
+    ) -> None:
+        self._flush_interval = flush_interval
+        self._batch_size = batch_size
+        self._max_buffer = max_buffer
+        self._buffer: list[AuditEvent] = []
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def aclose(self) -> None:
+        """Stop the background task and flush whatever is still buffered."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+        delay = 0.5
+        for attempt in range(1, 4):
+            try:
+                await self.flush()
+                return
+            except Exception:
+                logger.exception("Audit flush on shutdown failed attempt=%d pending=%d", attempt, len(self._buffer))
+                await asyncio.sleep(delay)
+                delay *= 2
+        logger.error("Audit sink closed with %d unwritten entries", len(self._buffer))
+
+    # ------------------------------------------------------------------
+    # Producer side
+    # ------------------------------------------------------------------
+
+    async def record(
+        self,
+        *,
+        school_id: uuid.UUID | None,
+        user_id: uuid.UUID | None,
+        action: str,
+        entity_type: str | None = None,
+        entity_id: uuid.UUID | None = None,
+        metadata: dict | None = None,
+        ip_address: str | None = None,
+    ) -> None:
+        if len(self._buffer) >= self._max_buffer:
+            # The writer has been failing long enough to fill the buffer;
+            # apply backpressure rather than drop audit entries.
+            await self.flush()
+
+        self._buffer.append(
+            AuditEvent(
+                school_id=school_id,
+                user_id=user_id,
+                action=action,
+                entity_type=entity_type,
+                entity_id=entity_id,
+                metadata=metadata,
+                ip_address=ip_address,
+            )
+        )
+        if len(self._buffer) >= self._batch_size:
+            self._wakeup.set()
+
+    # ------------------------------------------------------------------
+    # Writer side
+    # ------------------------------------------------------------------
+
+    async def flush(self) -> None:
+        """Write everything buffered so far. Raises if a batch fails (it stays buffered)."""
+        async with self._flush_lock:
+            while self._buffer:
+                batch = self._buffer[: self._batch_size]
+                await self._write(batch)
+                del self._buffer[: len(batch)]
+
+    async def _run(self) -> None:
+        current_route.set("audit_sink")  # pool metrics label for this task
+        stop_tracking()  # statements here belong to no request
+        delay = self._flush_interval
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+                delay = self._flush_interval
+            except Exception:
+                delay = min(max(delay * 2, 1.0), _MAX_RETRY_DELAY)
+                logger.exception("Audit flush failed; retrying in %.1fs pending=%d", delay, len(self._buffer))
+
+    async def _write(self, batch: list[AuditEvent]) -> None:
+        # RLS on audit_log checks school_id against app.current_school_id,
+        # so rows are inserted school by school within one transaction.
+        ordered = sorted(batch, key=lambda e: str(e.school_id or ""))
+        async with engine.begin() as conn:
+            for school_id, events in groupby(ordered, key=lambda e: e.school_id):
+                if school_id is not None:
+                    await conn.execute(
+                        text("SELECT set_config('app.current_school_id', :sid, true)"),
+                        {"sid": str(school_id)},
+                    )
+                await conn.execute(
+                    insert(AuditLog.__table__).on_conflict_do_nothing(),
+                    [asdict(e) for e in events],
+                )
+        logger.debug("Audit batch written size=%d", len(batch))
+
+
+# Singleton — started and closed by the app lifespan.
+audit_sink = AuditSink()
@@ -1,36 +1,116 @@
-"""Auth helpers: OTP, JWT, password hashing, SMS dispatch."""
+"""Auth helpers: OTP, JWT, password hashing."""
 
 from __future__ import annotations
 
+import asyncio
 import hashlib
 import logging
 import random
 import string
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Any
+from typing import Any, TypeVar
 
-import httpx
 from jose import jwt
 from passlib.context import CryptContext
 from redis.asyncio import Redis
 
 from app.config import settings
+from app.services import metrics
+from app.services.redis_scripts import RedisScript
 
 logger = logging.getLogger(__name__)
 
-_pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+T = TypeVar("T")
+
+# min/max pinned to the configured cost so needs_update() flags any hash made
+# with a different BCRYPT_ROUNDS; login then rehashes it transparently.
+_pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS,
+)
 
 # ---------------------------------------------------------------------------
 # Password helpers
+#
+# bcrypt takes ~100–250 ms of CPU per call.  Running it on the event loop
+# would stall every other request and SSE stream on the worker, so all
+# hashing goes through a small dedicated thread pool (bcrypt releases the
+# GIL).  The number of calls waiting for a thread is capped; beyond that we
+# fail fast with PasswordHasherBusy (mapped to 503) instead of queueing
+# logins for seconds.
 # ---------------------------------------------------------------------------
 
+_HASH_QUEUE_WAIT = metrics.histogram(
+    "password_hash_queue_wait_seconds", "Time a hash/verify call waited for a bcrypt thread"
+)
+_HASH_DURATION = metrics.histogram("password_hash_duration_seconds", "bcrypt hash/verify time")
+_HASH_PENDING = metrics.gauge("password_hash_pending", "Hash/verify calls queued or running")
+_HASH_REJECTED = metrics.counter("password_hash_rejected_total", "Hash/verify calls rejected because the pool was full")
+
+
+class PasswordHasherBusy(Exception):
+    """The bcrypt pool already has PASSWORD_HASH_MAX_PENDING calls waiting."""
+
+
+class PasswordHasher:
+    def __init__(self, workers: int, max_pending: int) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._max_pending = max_pending
+        self._pending = 0
+
+    async def _run(self, op: str, fn: Callable[..., T], *args: Any) -> T:
+        if self._pending >= self._max_pending:
+            _HASH_REJECTED.inc(op=op)
+            raise PasswordHasherBusy
+        self._pending += 1
+        _HASH_PENDING.set(self._pending)
+        queued_at = time.perf_counter()
+
+        def _job() -> T:
+            started = time.perf_counter()
+            _HASH_QUEUE_WAIT.observe(started - queued_at, op=op)
+            try:
+                return fn(*args)
+            finally:
+                _HASH_DURATION.observe(time.perf_counter() - started, op=op)
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, _job)
+        finally:
+            self._pending -= 1
+            _HASH_PENDING.set(self._pending)
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", _pwd_context.hash, password)
+
+    async def verify(self, plain: str, hashed: str) -> bool:
+        return await self._run("verify", _pwd_context.verify, plain, hashed)
 
-def hash_password(password: str) -> str:
-    return _pwd_context.hash(password)
+    async def verify_and_update(self, plain: str, hashed: str) -> tuple[bool, str | None]:
+        """Verify, and return a replacement hash if *hashed* uses an outdated cost."""
+        return await self._run("verify", _pwd_context.verify_and_update, plain, hashed)
 
 
-def verify_password(plain: str, hashed: str) -> bool:
-    return _pwd_context.verify(plain, hashed)
+_hasher = PasswordHasher(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_MAX_PENDING)
+
+
+async def hash_password(password: str) -> str:
+    return await _hasher.hash(password)
+
+
+async def verify_password(plain: str, hashed: str) -> bool:
+    return await _hasher.verify(plain, hashed)
+
+
+async def verify_and_update_password(plain: str, hashed: str) -> tuple[bool, str | None]:
+    return await _hasher.verify_and_update(plain, hashed)
 
 
 # ---------------------------------------------------------------------------
@@ -42,54 +122,54 @@ def generate_otp() -> str:
     return "".join(random.choices(string.digits, k=settings.OTP_LENGTH))
 
 
+# KEYS[1] = OTP hash {code, attempts}
+# ARGV[1] = submitted code, ARGV[2] = max attempts
+# Returns 1 and deletes the hash on a match; otherwise counts the attempt and
+# deletes the hash once attempts run out.
+_OTP_CONSUME = RedisScript("""
+local code = redis.call('HGET', KEYS[1], 'code')
+if not code then
+    return 0
+end
+if code == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+    return 1
+end
+if redis.call('HINCRBY', KEYS[1], 'attempts', 1) >= tonumber(ARGV[2]) then
+    redis.call('DEL', KEYS[1])
+end
+return 0
+""")
+
+
 def _otp_key(phone: str) -> str:
-    return f"otp:{phone}"
+    return f"otp_state:{phone}"
 
 
 async def store_otp(phone: str, otp: str, redis: Redis) -> None:
+    """Store a fresh code (resetting the attempt counter) in one round trip."""
     ttl = settings.OTP_EXPIRY_MINUTES * 60
-    await redis.setex(_otp_key(phone), ttl, otp)
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.delete(_otp_key(phone))
+        pipe.hset(_otp_key(phone), mapping={"code": otp, "attempts": 0})
+        pipe.expire(_otp_key(phone), ttl)
+        await pipe.execute()
 
 
-async def verify_otp(phone: str, otp: str, redis: Redis) -> bool:
-    stored: bytes | None = await redis.get(_otp_key(phone))
-    if stored is None:
-        return False
-    if stored.decode() != otp:
-        return False
-    await redis.delete(_otp_key(phone))  # one-time use
-    return True
+async def pending_otp(phone: str, redis: Redis) -> str | None:
+    """The code waiting for *phone*, or None once it is consumed, burned or expired."""
+    code = await redis.hget(_otp_key(phone), "code")
+    return code.decode() if isinstance(code, bytes) else code
 
 
-# ---------------------------------------------------------------------------
-# SMS dispatch
-# ---------------------------------------------------------------------------
-
-
-async def send_otp_sms(phone: str, otp: str) -> None:
-    """Dispatch OTP via configured SMS provider.
-
-    Currently a stub that logs to console. Wire up Clickatell / BulkSMS
-    by setting SMS_PROVIDER and SMS_API_KEY in the environment.
-    """
-    if settings.ENVIRONMENT != "development" and settings.SMS_API_KEY:
-        await _send_via_provider(phone, otp)
-    else:
-        logger.info("[SMS stub] OTP %s → %s", otp, phone)
-
-
-async def _send_via_provider(phone: str, otp: str) -> None:
-    message = f"Your BellBook code is {otp}. Valid for {settings.OTP_EXPIRY_MINUTES} minutes."
-    if settings.SMS_PROVIDER == "clickatell":
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(
-                "https://platform.clickatell.com/messages/http/send",
-                params={"apiKey": settings.SMS_API_KEY, "to": phone, "content": message},
-                timeout=10,
-            )
-            resp.raise_for_status()
-    else:
-        logger.warning("Unknown SMS_PROVIDER '%s'; SMS not sent.", settings.SMS_PROVIDER)
+async def verify_otp(phone: str, otp: str, redis: Redis) -> bool:
+    """Atomically consume the OTP. At most OTP_MAX_ATTEMPTS wrong guesses per code."""
+    consumed = await _OTP_CONSUME(
+        redis,
+        keys=[_otp_key(phone)],
+        args=[otp, settings.OTP_MAX_ATTEMPTS],
+    )
+    return bool(consumed)
 
 
 # ---------------------------------------------------------------------------
@@ -125,24 +205,111 @@ def decode_token(token: str) -> dict[str, Any]:
     return jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
 
 
+# Recently verified tokens, keyed by SHA-256 of the token.  A client reuses
+# the same access token for every call until it expires, so most requests
+# skip signature verification entirely.  Entries are dropped once past exp.
+_verified_tokens: OrderedDict[bytes, dict[str, Any]] = OrderedDict()
+
+
+def decode_token_cached(token: str) -> dict[str, Any]:
+    """decode_token() backed by an LRU of recently verified tokens.
+
+    Only successfully verified tokens that carry an exp claim are cached.
+    The returned claims dict is shared — do not mutate it.
+    """
+    key = hashlib.sha256(token.encode()).digest()
+    claims = _verified_tokens.get(key)
+    if claims is not None:
+        if claims["exp"] > time.time():
+            _verified_tokens.move_to_end(key)
+            return claims
+        del _verified_tokens[key]
+
+    claims = decode_token(token)
+    if "exp" in claims:
+        _verified_tokens[key] = claims
+        if len(_verified_tokens) > settings.TOKEN_CACHE_SIZE:
+            _verified_tokens.popitem(last=False)
+    return claims
+
+
 # ---------------------------------------------------------------------------
 # Refresh-token store  (Redis)
 # ---------------------------------------------------------------------------
 
 
-def _refresh_key(user_id: str, token: str) -> str:
-    digest = hashlib.sha256(token.encode()).hexdigest()[:24]
-    return f"refresh:{user_id}:{digest}"
+# Each user's refresh tokens live in one hash, refresh:{user_id}, mapping
+# token digest → expiry (unix seconds).  Expired fields are pruned whenever a
+# token is stored, and "log out everywhere" is a single DEL.
+
+# KEYS[1] = user hash
+# ARGV[1] = digest to add, ARGV[2] = lifetime (s)
+_REFRESH_STORE = RedisScript("""
+local now = tonumber(redis.call('TIME')[1])
+local entries = redis.call('HGETALL', KEYS[1])
+for i = 1, #entries, 2 do
+    if tonumber(entries[i + 1]) <= now then
+        redis.call('HDEL', KEYS[1], entries[i])
+    end
+end
+redis.call('HSET', KEYS[1], ARGV[1], now + tonumber(ARGV[2]))
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 1
+""")
+
+# KEYS[1] = user hash
+# ARGV[1] = digest presented, ARGV[2] = replacement digest, ARGV[3] = lifetime (s)
+# Returns 1 if the presented token was live and has been replaced, else 0.
+_REFRESH_ROTATE = RedisScript("""
+local now = tonumber(redis.call('TIME')[1])
+local expires = redis.call('HGET', KEYS[1], ARGV[1])
+if not expires then
+    return 0
+end
+redis.call('HDEL', KEYS[1], ARGV[1])
+if tonumber(expires) <= now then
+    return 0
+end
+redis.call('HSET', KEYS[1], ARGV[2], now + tonumber(ARGV[3]))
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return 1
+""")
+
+
+def _refresh_key(user_id: str) -> str:
+    return f"refresh:{user_id}"
+
+
+def _refresh_digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()[:24]
 
 
 async def store_refresh_token(user_id: str, token: str, redis: Redis) -> None:
-    ttl = settings.REFRESH_TOKEN_EXPIRE_DAYS * 86_400
-    await redis.setex(_refresh_key(user_id, token), ttl, "1")
+    await _REFRESH_STORE(
+        redis,
+        keys=[_refresh_key(user_id)],
+        args=[_refresh_digest(token), settings.REFRESH_TOKEN_EXPIRE_DAYS * 86_400],
+    )
 
 
-async def is_refresh_token_valid(user_id: str, token: str, redis: Redis) -> bool:
-    return bool(await redis.exists(_refresh_key(user_id, token)))
+async def rotate_refresh_token(user_id: str, old_token: str, new_token: str, redis: Redis) -> bool:
+    """Atomically swap *old_token* for *new_token*. False if *old_token* was not live.
+
+    A token can be rotated at most once, so two concurrent refreshes with the
+    same token cannot both succeed.
+    """
+    rotated = await _REFRESH_ROTATE(
+        redis,
+        keys=[_refresh_key(user_id)],
+        args=[_refresh_digest(old_token), _refresh_digest(new_token), settings.REFRESH_TOKEN_EXPIRE_DAYS * 86_400],
+    )
+    return bool(rotated)
 
 
 async def revoke_refresh_token(user_id: str, token: str, redis: Redis) -> None:
-    await redis.delete(_refresh_key(user_id, token))
+    await redis.hdel(_refresh_key(user_id), _refresh_digest(token))
+
+
+async def revoke_all_refresh_tokens(user_id: str, redis: Redis) -> None:
+    """Log the user out of every device."""
+    await redis.delete(_refresh_key(user_id))
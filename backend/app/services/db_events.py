@@ -0,0 +1,91 @@
+"""Postgres NOTIFY → in-process handlers.
+
+Some rows are cached outside the database (users → app.services.
+principal_cache, schools → app.services.school_resolver).  Triggers on those
+tables NOTIFY a channel when a cached column changes, whoever made the
+change — an endpoint, a script or psql.  Each API process holds one
+connection that LISTENs on every subscribed channel and awaits the handler
+with the notification payload:
+
+    db_events.subscribe("principal_changed", _on_user_changed)
+
+Handlers run one at a time, in notification order.  PgBouncer in transaction
+mode does not deliver notifications, so with DATABASE_POOL_MODE=pgbouncer
+set DATABASE_LISTEN_URL to a direct connection.  Notifications sent while
+the listener is reconnecting are lost; the caches' TTLs bound how stale that
+leaves them.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable
+
+from redis.asyncio import Redis
+
+from app.config import settings
+from app.database import engine, make_engine
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[Redis, str], Awaitable[None]]
+
+_KEEPALIVE_SECONDS = 30.0  # idle time before the connection is probed
+_MAX_RECONNECT_DELAY = 30.0
+
+
+class DatabaseEvents:
+    def __init__(self) -> None:
+        self._handlers: dict[str, Handler] = {}
+        self._listener: asyncio.Task | None = None
+
+    def subscribe(self, channel: str, handler: Handler) -> None:
+        """Route NOTIFYs on *channel* to *handler*; call before start()."""
+        self._handlers[channel] = handler
+
+    # ------------------------------------------------------------------
+    # Lifecycle (started and closed by the app lifespan)
+    # ------------------------------------------------------------------
+
+    def start(self, redis: Redis) -> None:
+        if self._listener is None and self._handlers:
+            self._listener = asyncio.create_task(self._listen(redis))
+
+    async def aclose(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+
+    async def _listen(self, redis: Redis) -> None:
+        listen_engine = make_engine(settings.DATABASE_LISTEN_URL, "direct") if settings.DATABASE_LISTEN_URL else engine
+        delay = 1.0
+        while True:
+            try:
+                async with listen_engine.connect() as conn:
+                    raw = (await conn.get_raw_connection()).driver_connection
+                    queue: asyncio.Queue[tuple[str, str]] = asyncio.Queue()
+                    for channel in self._handlers:
+                        await raw.add_listener(channel, lambda _conn, _pid, ch, payload: queue.put_nowait((ch, payload)))
+                    delay = 1.0
+                    while True:
+                        try:
+                            channel, payload = await asyncio.wait_for(queue.get(), timeout=_KEEPALIVE_SECONDS)
+                        except asyncio.TimeoutError:
+                            await raw.execute("SELECT 1")  # raises if the connection has gone
+                            continue
+                        try:
+                            await self._handlers[channel](redis, payload)
+                        except Exception:
+                            logger.exception("Database event handler failed channel=%s payload=%s", channel, payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Database event listener failed; reconnecting in %.0fs", delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, _MAX_RECONNECT_DELAY)
+
+
+# Singleton — channels subscribed at import by the caching services.
+db_events = DatabaseEvents()
@@ -0,0 +1,240 @@
+"""Notification coalescing (digest mode), with its state in Redis.
+
+Several non-urgent announcements in quick succession should cost a parent
+one notification per channel, not one per post.  Per school, user and
+channel:
+
+  digest:<school>:<user>:<channel>:window   set when a notification goes out;
+                                            expires after NOTIFY_DIGEST_WINDOW_SECONDS
+  digest:<school>:<user>:<channel>          hash announcement_id → item, waiting
+  digest:due                                sorted set <school>:<user>:<channel>
+                                            → when the digest is due (epoch seconds)
+  digest:processing                         sorted set of claimed digests
+                                            → when their lease runs out
+
+admit() lets a notification through when the channel has no open window and
+nothing waiting, and opens the window; otherwise the item waits and the
+digest is due when the window closes.  hold() makes an item wait until a
+given time — the end of the recipient's quiet hours.  claim_due() atomically
+moves due digests to digest:processing with a NOTIFY_DIGEST_LEASE_SECONDS
+lease, so any number of ARQ workers can flush
+(app.tasks.notifications.flush_digests) without sending one twice.  The
+items stay in place until the sender settles the digest: finish() deletes
+the items it sent, release() hands the digest back after hold() has
+requeued it.  A digest whose worker crashed is claimed again when its lease
+runs out and re-sent, so recipients reached before the crash may get it
+twice.  Claims, admits and holds are Lua scripts, one round trip per chunk
+of recipients.
+
+Urgent announcements never come here.
+"""
+
+from __future__ import annotations
+
+import json
+import time
+from collections.abc import Iterable
+from dataclasses import asdict, dataclass
+from datetime import datetime
+
+from redis.asyncio import Redis
+
+from app.config import settings
+from app.services.redis_scripts import RedisScript
+
+_DUE_KEY = "digest:due"
+_PROCESSING_KEY = "digest:processing"
+_PREFIX = "digest:"
+
+
+@dataclass(frozen=True)
+class DigestItem:
+    announcement_id: str
+    channel_id: str
+    priority: str
+    title: str
+    body: str
+
+
+@dataclass
+class PendingDigest:
+    school_id: str
+    user_id: str
+    channel: str
+    items: list[DigestItem]
+
+
+def _member(school_id: str, user_id: str, channel: str) -> str:
+    return f"{school_id}:{user_id}:{channel}"
+
+
+# KEYS: due, then (window, items) per user.  ARGV: now, window seconds, item
+# ttl, announcement id, item, then one due-set member per user.  Returns the
+# 1-based positions of the users admitted.  A window opened by this same
+# announcement admits again, so a retried job re-sends instead of holding.
+_ADMIT = RedisScript("""
+local now, window, ttl = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local admitted = {}
+for i = 1, (#KEYS - 1) / 2 do
+    local window_key, items_key = KEYS[2 * i], KEYS[2 * i + 1]
+    local opened_by = redis.call('GET', window_key)
+    if opened_by == ARGV[4] or (not opened_by and redis.call('EXISTS', items_key) == 0) then
+        if window > 0 and not opened_by then
+            redis.call('SET', window_key, ARGV[4], 'EX', window)
+        end
+        admitted[#admitted + 1] = i
+    else
+        redis.call('HSET', items_key, ARGV[4], ARGV[5])
+        redis.call('EXPIRE', items_key, ttl)
+        local due = now + math.max(redis.call('PTTL', window_key), 0) / 1000
+        redis.call('ZADD', KEYS[1], 'LT', due, ARGV[5 + i])
+    end
+end
+return admitted
+""")
+
+# KEYS: due, then items per user.  ARGV: due at, item ttl, announcement id,
+# item, then one due-set member per user.
+_HOLD = RedisScript("""
+for i = 2, #KEYS do
+    redis.call('HSET', KEYS[i], ARGV[3], ARGV[4])
+    redis.call('EXPIRE', KEYS[i], ARGV[2])
+    redis.call('ZADD', KEYS[1], 'LT', ARGV[1], ARGV[3 + i])
+end
+return #KEYS - 1
+""")
+
+# KEYS: due, processing.  ARGV: now, limit, lease expiry.  Claims digests
+# whose lease ran out, then due ones; a due digest that is still being sent
+# is looked at again when its lease ends.  Returns the claimed members.
+_CLAIM = RedisScript("""
+local now, limit = tonumber(ARGV[1]), tonumber(ARGV[2])
+local claimed = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', now, 'LIMIT', 0, limit)
+for _, member in ipairs(claimed) do
+    redis.call('ZADD', KEYS[2], ARGV[3], member)
+end
+if #claimed < limit then
+    for _, member in ipairs(redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', now, 'LIMIT', 0, limit - #claimed)) do
+        local lease = redis.call('ZSCORE', KEYS[2], member)
+        if lease and tonumber(lease) > now then
+            redis.call('ZADD', KEYS[1], lease, member)
+        else
+            redis.call('ZREM', KEYS[1], member)
+            redis.call('ZADD', KEYS[2], ARGV[3], member)
+            claimed[#claimed + 1] = member
+        end
+    end
+end
+return claimed
+""")
+
+
+def _str(value: bytes | str) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+async def admit(
+    redis: Redis,
+    school_id: str,
+    channel: str,
+    user_ids: list[str],
+    item: DigestItem,
+    window: int = settings.NOTIFY_DIGEST_WINDOW_SECONDS,
+) -> set[str]:
+    """Return the users to notify now; the rest wait for a digest."""
+    if not user_ids:
+        return set()
+    members = [_member(school_id, user_id, channel) for user_id in user_ids]
+    keys = [_DUE_KEY]
+    for member in members:
+        keys += [f"{_PREFIX}{member}:window", f"{_PREFIX}{member}"]
+    admitted = await _ADMIT(
+        redis,
+        keys=keys,
+        args=[time.time(), window, settings.NOTIFY_DIGEST_TTL_SECONDS, item.announcement_id, json.dumps(asdict(item)), *members],
+    )
+    return {user_ids[int(i) - 1] for i in admitted}
+
+
+async def hold(
+    redis: Redis,
+    school_id: str,
+    channel: str,
+    user_ids: Iterable[str],
+    items: Iterable[DigestItem],
+    until: datetime,
+) -> None:
+    """Make *items* wait for *user_ids* until *until* (or an earlier digest already due)."""
+    members = [_member(school_id, user_id, channel) for user_id in user_ids]
+    if not members:
+        return
+    keys = [_DUE_KEY, *(f"{_PREFIX}{member}" for member in members)]
+    for item in items:
+        await _HOLD(
+            redis,
+            keys=keys,
+            args=[until.timestamp(), settings.NOTIFY_DIGEST_TTL_SECONDS, item.announcement_id, json.dumps(asdict(item)), *members],
+        )
+
+
+async def open_windows(redis: Redis, school_id: str, channel: str, user_ids: Iterable[str], opened_by: str) -> None:
+    """Start a coalescing window for users who were just sent a digest."""
+    if not settings.NOTIFY_DIGEST_WINDOW_SECONDS:
+        return
+    async with redis.pipeline(transaction=False) as pipe:
+        for user_id in user_ids:
+            pipe.set(
+                f"{_PREFIX}{_member(school_id, user_id, channel)}:window",
+                opened_by,
+                ex=settings.NOTIFY_DIGEST_WINDOW_SECONDS,
+            )
+        await pipe.execute()
+
+
+async def claim_due(redis: Redis, limit: int = settings.NOTIFY_DIGEST_FLUSH_BATCH) -> list[PendingDigest]:
+    """Lease up to *limit* due digests; they are this caller's to send, then finish() or release()."""
+    now = time.time()
+    claimed = [
+        _str(member)
+        for member in await _CLAIM(
+            redis, keys=[_DUE_KEY, _PROCESSING_KEY], args=[now, limit, now + settings.NOTIFY_DIGEST_LEASE_SECONDS]
+        )
+    ]
+    if not claimed:
+        return []
+    async with redis.pipeline(transaction=False) as pipe:
+        for member in claimed:
+            pipe.hgetall(f"{_PREFIX}{member}")
+        fields = await pipe.execute()
+
+    digests, empty = [], []
+    for member, values in zip(claimed, fields):
+        school_id, user_id, channel = member.split(":")
+        items = [DigestItem(**json.loads(_str(value))) for value in values.values()]
+        if items:
+            digests.append(PendingDigest(school_id, user_id, channel, items))
+        else:
+            empty.append(member)  # items expired or already sent
+    if empty:
+        await redis.zrem(_PROCESSING_KEY, *empty)
+    return digests
+
+
+async def finish(redis: Redis, digests: Iterable[PendingDigest]) -> None:
+    """Settle claimed digests that were sent (or dropped): delete their items.
+
+    Items admitted while the digest was being sent are left waiting.
+    """
+    async with redis.pipeline(transaction=True) as pipe:
+        for d in digests:
+            member = _member(d.school_id, d.user_id, d.channel)
+            pipe.hdel(f"{_PREFIX}{member}", *(item.announcement_id for item in d.items))
+            pipe.zrem(_PROCESSING_KEY, member)
+        await pipe.execute()
+
+
+async def release(redis: Redis, digests: Iterable[PendingDigest]) -> None:
+    """Settle claimed digests that hold() has requeued: keep their items."""
+    members = [_member(d.school_id, d.user_id, d.channel) for d in digests]
+    if members:
+        await redis.zrem(_PROCESSING_KEY, *members)
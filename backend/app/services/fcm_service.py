@@ -0,0 +1,156 @@
+"""Firebase Cloud Messaging client (HTTP v1 API).
+
+Sends go through a ProviderClient (app.services.providers): pooled HTTP/2
+connections, rate limited to FCM_RATE_PER_SECOND, with short retries and a
+circuit breaker.  The v1 API takes one token per request; a multicast of up
+to FCM_MULTICAST_SIZE tokens is sent as that many concurrent requests
+multiplexed over the pool — what firebase-admin's send_each_for_multicast
+does, without its thread pool.
+
+Per-token outcomes are split five ways so callers can act on them:
+  sent      accepted by FCM
+  invalid   the token itself is dead — errorCode UNREGISTERED, or
+            INVALID_ARGUMENT naming message.token; deactivate the device
+  failed    not sent (connect errors and timeouts, 429, 5xx, open circuit);
+            worth retrying later
+  unknown   read timeout or dropped connection: FCM may have delivered it,
+            so it is not retried
+  rejected  any other 4xx, e.g. INVALID_ARGUMENT for an oversized payload:
+            the message can never be sent, but the token is fine
+Authentication or project errors (401 / 403) raise FCMError: retrying the
+other tokens cannot help, so the rest of the multicast is cancelled.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from dataclasses import dataclass, field
+
+import httpx
+from google.auth.credentials import Credentials
+from google.auth.transport.requests import Request as GoogleAuthRequest
+from google.oauth2 import service_account
+
+from app.config import settings
+from app.services.providers import NOT_SENT_ERRORS, ProviderClient
+
+logger = logging.getLogger(__name__)
+
+_SCOPES = ["https://www.googleapis.com/auth/firebase.messaging"]
+
+
+class FCMError(Exception):
+    """FCM rejected the request for a reason that applies to every token."""
+
+
+@dataclass
+class MulticastResult:
+    sent: list[str] = field(default_factory=list)
+    invalid: list[str] = field(default_factory=list)
+    failed: list[str] = field(default_factory=list)
+    unknown: list[str] = field(default_factory=list)
+    rejected: list[str] = field(default_factory=list)
+    message_ids: dict[str, str] = field(default_factory=dict)  # sent token → FCM message name
+    errors: dict[str, str] = field(default_factory=dict)  # unsent token → reason
+
+
+def _error_details(resp: httpx.Response) -> tuple[str, set[str], str]:
+    """(errorCode, fields named in violations, message) of an FCM v1 error body."""
+    try:
+        error = resp.json().get("error", {})
+    except ValueError:
+        return "", set(), resp.text[:200]
+    code, fields = "", set()
+    for detail in error.get("details", []):
+        code = detail.get("errorCode", code)
+        fields.update(v.get("field", "") for v in detail.get("fieldViolations", []))
+    return code or error.get("status", ""), fields, error.get("message", "")
+
+
+class FCMClient:
+    def __init__(self, credentials: Credentials | None = None) -> None:
+        self._provider = ProviderClient(
+            "fcm",
+            rate_per_second=settings.FCM_RATE_PER_SECOND,
+            burst=settings.FCM_BURST,
+            max_connections=settings.FCM_MAX_CONNECTIONS,
+            timeout=settings.FCM_TIMEOUT_SECONDS,
+            # HTTP/2 is negotiated over TLS; plain-http test endpoints get HTTP/1.1.
+            http2=settings.FCM_API_URL.startswith("https://"),
+        )
+        self._credentials = credentials
+        self._refresh_lock = asyncio.Lock()
+
+    async def aclose(self) -> None:
+        await self._provider.aclose()
+
+    async def _access_token(self) -> str:
+        async with self._refresh_lock:
+            if self._credentials is None:
+                self._credentials = service_account.Credentials.from_service_account_file(
+                    settings.FCM_CREDENTIALS_PATH, scopes=_SCOPES
+                )
+            if not self._credentials.valid:
+                # google-auth refreshes with a blocking HTTP call.
+                await asyncio.to_thread(self._credentials.refresh, GoogleAuthRequest())
+            return self._credentials.token
+
+    async def send_multicast(
+        self,
+        tokens: list[str],
+        title: str,
+        body: str,
+        data: dict[str, str] | None = None,
+    ) -> MulticastResult:
+        if len(tokens) > settings.FCM_MULTICAST_SIZE:
+            raise ValueError(f"multicast of {len(tokens)} tokens exceeds {settings.FCM_MULTICAST_SIZE}")
+
+        result = MulticastResult()
+        if settings.ENVIRONMENT == "development" or not settings.FCM_PROJECT_ID:
+            logger.info("[FCM stub] %r → %d devices", title, len(tokens))
+            result.sent.extend(tokens)
+            return result
+
+        headers = {"Authorization": f"Bearer {await self._access_token()}"}
+        url = f"{settings.FCM_API_URL}/v1/projects/{settings.FCM_PROJECT_ID}/messages:send"
+
+        async def send_one(token: str) -> None:
+            message = {"token": token, "notification": {"title": title, "body": body}, "data": data or {}}
+            try:
+                resp = await self._provider.request("POST", url, json={"message": message}, headers=headers)
+            except NOT_SENT_ERRORS as exc:
+                result.failed.append(token)
+                result.errors[token] = type(exc).__name__
+                return
+            except httpx.TransportError as exc:
+                result.unknown.append(token)
+                result.errors[token] = type(exc).__name__
+                return
+            if resp.status_code == 200:
+                result.sent.append(token)
+                result.message_ids[token] = resp.json().get("name", "")
+            elif resp.status_code in (401, 403):
+                raise FCMError(f"FCM returned {resp.status_code}: {resp.text[:200]}")
+            else:
+                code, fields, message = _error_details(resp)
+                if code == "UNREGISTERED" or (code == "INVALID_ARGUMENT" and "message.token" in fields):
+                    result.invalid.append(token)
+                elif resp.status_code == 429 or resp.status_code >= 500:
+                    result.failed.append(token)
+                else:
+                    result.rejected.append(token)
+                result.errors[token] = f"FCM returned {resp.status_code} {code}: {message}"[:500]
+
+        try:
+            async with asyncio.TaskGroup() as tg:
+                for token in tokens:
+                    tg.create_task(send_one(token))
+        except ExceptionGroup as group:
+            # The first error cancelled the sends still in flight; raise it as itself.
+            raise group.exceptions[0]
+        return result
+
+
+# Singleton — closed by the worker's on_shutdown hook.
+fcm_client = FCMClient()
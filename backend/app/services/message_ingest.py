@@ -0,0 +1,204 @@
+"""Group-commit ingest path for direct messages.
+
+Writing a message through the ORM costs an INSERT, a separate
+UPDATE of conversations.updated_at, a COMMIT and a refresh SELECT.  During
+the morning reply burst those transactions serialise on the same
+conversation rows.
+
+MessageIngestor writes messages with a single CTE statement that inserts the
+rows, bumps their conversations, records a message.created outbox event per
+message (relayed to SSE by app.tasks.outbox) and returns the inserted rows,
+so there is no refresh round trip and no side effect outside the commit.
+Sends that arrive while a batch is being written are queued and go out
+together in the next batch (group commit): under load N concurrent sends
+cost one statement and one commit instead of N.  At low load a send is
+written immediately — there is no batching delay.
+
+Batches are kept per school because RLS on conversations needs
+app.current_school_id to be set for the writing transaction.  A batch that
+fails on one bad row (say a conversation deleted mid-burst) is retried one
+message per transaction, so only the offending send fails.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import logging
+import uuid
+from dataclasses import dataclass, field
+
+from sqlalchemy import Row, text
+from sqlalchemy.exc import DBAPIError
+
+from app.config import settings
+from app.database import current_route, engine
+from app.services.query_stats import stop_tracking
+
+logger = logging.getLogger(__name__)
+
+# clock_timestamp() (rather than the column default now()) keeps messages in
+# submission order when several land in the same transaction.
+_INSERT_BATCH = text(
+    """
+    WITH new_messages AS (
+        INSERT INTO messages (id, school_id, conversation_id, sender_id, body, is_system, created_at)
+        SELECT m.id, CAST(:school_id AS uuid), m.conversation_id, m.sender_id, m.body, m.is_system, clock_timestamp()
+        FROM unnest(
+            CAST(:ids AS uuid[]),
+            CAST(:conversation_ids AS uuid[]),
+            CAST(:sender_ids AS uuid[]),
+            CAST(:bodies AS text[]),
+            CAST(:is_system AS boolean[])
+        ) AS m(id, conversation_id, sender_id, body, is_system)
+        RETURNING id, conversation_id, sender_id, body, is_system, created_at
+    ), bumped AS (
+        UPDATE conversations SET updated_at = now()
+        WHERE id IN (SELECT conversation_id FROM new_messages)
+    ), events AS (
+        INSERT INTO outbox (school_id, topic, payload)
+        SELECT CAST(:school_id AS uuid), 'message.created',
+               jsonb_build_object('message_id', id, 'conversation_id', conversation_id, 'sender_id', sender_id)
+        FROM new_messages
+    )
+    SELECT * FROM new_messages
+    """
+)
+
+
+@dataclass(slots=True)
+class _PendingMessage:
+    conversation_id: uuid.UUID
+    sender_id: uuid.UUID
+    body: str
+    is_system: bool
+    future: asyncio.Future
+    id: uuid.UUID = field(default_factory=uuid.uuid4)
+
+
+class IngestStopped(RuntimeError):
+    """The ingestor shut down before the message's batch was written."""
+
+
+class MessageIngestor:
+    def __init__(self, max_batch: int = settings.MESSAGE_INGEST_MAX_BATCH) -> None:
+        self._max_batch = max_batch
+        # school_id → messages waiting for the next batch
+        self._pending: dict[uuid.UUID, list[_PendingMessage]] = {}
+        # school_id → the task currently writing batches for that school
+        self._flushers: dict[uuid.UUID, asyncio.Task] = {}
+
+    async def submit(
+        self,
+        school_id: uuid.UUID,
+        conversation_id: uuid.UUID,
+        sender_id: uuid.UUID,
+        body: str,
+        is_system: bool = False,
+    ) -> Row:
+        """Queue a message and wait until its batch has committed.
+
+        Returns the inserted row (id, conversation_id, sender_id, body,
+        is_system, created_at).  Raises whatever the batch write raised.
+        """
+        item = _PendingMessage(
+            conversation_id=conversation_id,
+            sender_id=sender_id,
+            body=body,
+            is_system=is_system,
+            future=asyncio.get_running_loop().create_future(),
+        )
+        self._pending.setdefault(school_id, []).append(item)
+        if school_id not in self._flushers:
+            task = self._flushers[school_id] = asyncio.create_task(self._flush_school(school_id))
+            task.add_done_callback(functools.partial(self._flusher_done, school_id))
+        return await item.future
+
+    async def aclose(self) -> None:
+        """Wait for in-flight batches to finish (called on shutdown)."""
+        if self._flushers:
+            await asyncio.gather(*self._flushers.values(), return_exceptions=True)
+
+    # ------------------------------------------------------------------
+    # Batch writer
+    # ------------------------------------------------------------------
+
+    async def _flush_school(self, school_id: uuid.UUID) -> None:
+        current_route.set("message_ingest")  # pool metrics label for this task
+        stop_tracking()  # statements here belong to no request
+        batch: list[_PendingMessage] = []
+        try:
+            while pending := self._pending.get(school_id):
+                batch = pending[: self._max_batch]
+                del pending[: self._max_batch]
+                try:
+                    rows = await self._write_batch(school_id, batch)
+                except Exception as exc:
+                    logger.exception("Message batch failed school=%s size=%d", school_id, len(batch))
+                    if len(batch) > 1 and isinstance(exc, DBAPIError) and not exc.connection_invalidated:
+                        await self._write_singly(school_id, batch)
+                    else:
+                        _fail(batch, exc)
+                    continue
+
+                by_id = {row.id: row for row in rows}
+                for item in batch:
+                    if not item.future.done():  # the sender may have disconnected
+                        item.future.set_result(by_id[item.id])
+        finally:
+            # Cancelled mid-batch (shutdown): nobody is left to write these.
+            _fail(batch, IngestStopped("message ingest stopped"))
+            self._stop(school_id)
+
+    def _flusher_done(self, school_id: uuid.UUID, task: asyncio.Task) -> None:
+        # A task cancelled before it first ran never reaches its finally block.
+        if self._flushers.get(school_id) is task:
+            self._stop(school_id)
+
+    def _stop(self, school_id: uuid.UUID) -> None:
+        _fail(self._pending.pop(school_id, []), IngestStopped("message ingest stopped"))
+        del self._flushers[school_id]
+
+    async def _write_singly(self, school_id: uuid.UUID, batch: list[_PendingMessage]) -> None:
+        """Retry a failed batch one message per transaction."""
+        for item in batch:
+            if item.future.done():
+                continue
+            try:
+                (row,) = await self._write_batch(school_id, [item])
+            except Exception as exc:
+                logger.warning("Message rejected school=%s conversation=%s: %s", school_id, item.conversation_id, exc)
+                item.future.set_exception(exc)
+            else:
+                item.future.set_result(row)
+
+    async def _write_batch(self, school_id: uuid.UUID, batch: list[_PendingMessage]) -> list[Row]:
+        async with engine.begin() as conn:
+            await conn.execute(
+                text("SELECT set_config('app.current_school_id', :sid, true)"),
+                {"sid": str(school_id)},
+            )
+            result = await conn.execute(
+                _INSERT_BATCH,
+                {
+                    "school_id": school_id,
+                    "ids": [m.id for m in batch],
+                    "conversation_ids": [m.conversation_id for m in batch],
+                    "sender_ids": [m.sender_id for m in batch],
+                    "bodies": [m.body for m in batch],
+                    "is_system": [m.is_system for m in batch],
+                },
+            )
+            rows = list(result.all())
+        logger.debug("Message batch committed school=%s size=%d", school_id, len(batch))
+        return rows
+
+
+def _fail(items: list[_PendingMessage], exc: BaseException) -> None:
+    for item in items:
+        if not item.future.done():
+            item.future.set_exception(exc)
+
+
+# Singleton — imported by the messaging router.
+message_ingestor = MessageIngestor()
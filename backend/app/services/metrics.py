@@ -0,0 +1,162 @@
+"""In-process metrics registry.
+
+Counters, gauges and histograms with optional labels, kept per process,
+published to Redis by app.services.metrics_export and exposed, merged
+across processes, as JSON at GET /api/metrics.  Intentionally small — enough to see
+queue waits, pool usage and latency SLOs without another dependency.
+
+    _WAIT = metrics.histogram("password_hash_queue_wait_seconds", "Time spent waiting for a hashing thread")
+    _WAIT.observe(0.012)
+    _REJECTED = metrics.counter("password_hash_rejected_total", "Hash requests rejected because the pool was full")
+    _REJECTED.inc(route="/api/auth/login")
+
+Observations may come from worker threads, so updates take a lock.
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Any
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_lock = threading.Lock()
+_registry: dict[str, _Metric] = {}
+
+LabelKey = tuple[tuple[str, str], ...]
+
+
+def _label_key(labels: dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, description: str) -> None:
+        self.name = name
+        self.description = description
+
+    def _series(self) -> list[dict]:
+        raise NotImplementedError
+
+    def snapshot(self) -> dict:
+        with _lock:
+            series = self._series()
+        return {"type": self.kind, "description": self.description, "series": series}
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, description: str) -> None:
+        super().__init__(name, description)
+        self._values: dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = _label_key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _series(self) -> list[dict]:
+        return [{"labels": dict(k), "value": v} for k, v in self._values.items()]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, description: str) -> None:
+        super().__init__(name, description)
+        self._values: dict[LabelKey, float] = {}
+
+    def set(self, value: float, **labels: Any) -> None:
+        with _lock:
+            self._values[_label_key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = _label_key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+    def _series(self) -> list[dict]:
+        return [{"labels": dict(k), "value": v} for k, v in self._values.items()]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, description)
+        self._buckets = buckets
+        # label key → [count, sum, max, per-bucket counts]
+        self._values: dict[LabelKey, list] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = _label_key(labels)
+        with _lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [0, 0.0, 0.0, [0] * len(self._buckets)]
+            entry[0] += 1
+            entry[1] += value
+            entry[2] = max(entry[2], value)
+            for i, bound in enumerate(self._buckets):
+                if value <= bound:
+                    entry[3][i] += 1
+                    break
+
+    def _series(self) -> list[dict]:
+        out = []
+        for key, (count, total, peak, counts) in self._values.items():
+            cumulative, running = {}, 0
+            for bound, n in zip(self._buckets, counts):
+                running += n
+                cumulative[str(bound)] = running
+            out.append(
+                {
+                    "labels": dict(key),
+                    "count": count,
+                    "sum": total,
+                    "max": peak,
+                    "mean": total / count if count else 0.0,
+                    "buckets": cumulative,
+                }
+            )
+        return out
+
+
+# ---------------------------------------------------------------------------
+# Get-or-create helpers (safe to call at import time from several modules)
+# ---------------------------------------------------------------------------
+
+
+def _get_or_create(cls: type[_Metric], name: str, description: str, **kwargs: Any) -> Any:
+    with _lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = _registry[name] = cls(name, description, **kwargs)
+    if not isinstance(metric, cls):
+        raise TypeError(f"Metric {name!r} already registered as {metric.kind}")
+    return metric
+
+
+def counter(name: str, description: str) -> Counter:
+    return _get_or_create(Counter, name, description)
+
+
+def gauge(name: str, description: str) -> Gauge:
+    return _get_or_create(Gauge, name, description)
+
+
+def histogram(name: str, description: str, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+    return _get_or_create(Histogram, name, description, buckets=buckets)
+
+
+def snapshot() -> dict[str, dict]:
+    """Return every registered metric, keyed by name."""
+    with _lock:
+        metrics = list(_registry.values())
+    return {m.name: m.snapshot() for m in metrics}
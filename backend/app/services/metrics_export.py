@@ -0,0 +1,134 @@
+"""Metrics from every process, merged for GET /api/metrics.
+
+app.services.metrics is per process, but notifications are sent by the ARQ
+workers and the outbox relay, which serve no HTTP.  So every process — API,
+workers, relay — runs the publisher, which writes its snapshot to Redis
+every METRICS_PUBLISH_INTERVAL_SECONDS:
+
+  metrics:processes            ZSET  instance → time of its last publish
+  metrics:process:<instance>   {"job": ..., "metrics": <snapshot>}, expiring after three intervals
+
+/api/metrics returns the live snapshots merged (its own taken fresh), with
+every series labelled by the job it came from ("api", "worker:<queue>",
+"outbox_relay") and its instance ("<host>:<pid>").  A process publishes
+once more as it exits; its entry drops out when it expires.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import math
+import os
+import socket
+import time
+from typing import Any
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from app.config import settings
+from app.services import metrics
+
+logger = logging.getLogger(__name__)
+
+INSTANCE = f"{socket.gethostname()}:{os.getpid()}"
+_INDEX_KEY = "metrics:processes"
+
+
+def _entry_key(instance: str) -> str:
+    return f"metrics:process:{instance}"
+
+
+class MetricsPublisher:
+    def __init__(self, interval: float = settings.METRICS_PUBLISH_INTERVAL_SECONDS) -> None:
+        self._interval = interval
+        self._job = ""
+        self._redis: Redis | None = None
+        self._task: asyncio.Task | None = None
+
+    @property
+    def _ttl(self) -> float:
+        return self._interval * 3
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def start(self, redis: Redis, job: str) -> None:
+        if self._task is None:
+            self._redis = redis
+            self._job = job
+            self._task = asyncio.create_task(self._run())
+
+    async def aclose(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        # One last publish, so what happened since the previous one (an SLO
+        # breach just before a deploy, say) is not lost with the process.
+        try:
+            await self.publish()
+        except RedisError:
+            logger.warning("Final metrics publish failed instance=%s", INSTANCE)
+
+    # ------------------------------------------------------------------
+    # Publishing
+    # ------------------------------------------------------------------
+
+    async def publish(self) -> None:
+        now = time.time()
+        entry = json.dumps({"job": self._job, "metrics": metrics.snapshot()})
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.set(_entry_key(INSTANCE), entry, ex=math.ceil(self._ttl))
+            pipe.zadd(_INDEX_KEY, {INSTANCE: now})
+            pipe.zremrangebyscore(_INDEX_KEY, "-inf", now - self._ttl)
+            await pipe.execute()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.publish()
+            except Exception:
+                logger.exception("Metrics publish failed instance=%s", INSTANCE)
+            await asyncio.sleep(self._interval)
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+
+    async def collect(self, redis: Redis) -> dict[str, dict]:
+        """Every live process's metrics, merged, with job and instance labels.
+
+        Falls back to this process alone if Redis is unavailable.
+        """
+        snapshots: list[tuple[str, str, dict[str, Any]]] = [(self._job or "api", INSTANCE, metrics.snapshot())]
+        try:
+            live = await redis.zrangebyscore(_INDEX_KEY, time.time() - self._ttl, "+inf")
+            others = [i.decode() if isinstance(i, bytes) else i for i in live]
+            others = [i for i in others if i != INSTANCE]
+            entries = await redis.mget([_entry_key(i) for i in others]) if others else []
+        except RedisError:
+            logger.warning("Published metrics unavailable; returning this process only")
+            others, entries = [], []
+        for instance, raw in zip(others, entries):
+            if raw is not None:
+                entry = json.loads(raw)
+                snapshots.append((entry["job"], instance, entry["metrics"]))
+
+        merged: dict[str, dict] = {}
+        for job, instance, snapshot in snapshots:
+            for name, metric in snapshot.items():
+                target = merged.setdefault(
+                    name, {"type": metric["type"], "description": metric["description"], "series": []}
+                )
+                for series in metric["series"]:
+                    target["series"].append({**series, "labels": {**series["labels"], "job": job, "instance": instance}})
+        return merged
+
+
+# Singleton — started by the app lifespan, the worker startup and the relay.
+metrics_publisher = MetricsPublisher()
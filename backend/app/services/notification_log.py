@@ -0,0 +1,294 @@
+"""Buffered notification_log writers.
+
+Every push, WhatsApp and SMS send is logged — thousands of rows per
+announcement — so nothing here inserts or updates row by row:
+
+  notification_log    send results, recorded by the fan-out worker.  Rows
+                      are buffered and streamed in with COPY
+                      (asyncpg copy_records_to_table), NOTIFICATION_LOG_BATCH_SIZE
+                      at a time.
+  delivery_status     delivered / read / failed reports from provider
+                      webhooks (app.api.webhooks).  Buffered per provider
+                      message id and applied as one
+                      UPDATE ... FROM (VALUES ...) per batch.
+
+Both flush every NOTIFICATION_LOG_FLUSH_INTERVAL_SECONDS, or sooner once a
+batch is waiting, and on shutdown; a failed batch stays buffered and is
+retried with backoff, like app.services.audit_service.  A COPY is a single
+statement, so a failed batch leaves no partial rows behind.  Status updates
+only ever move a row forward (sent → failed → delivered → read), so
+out-of-order or replayed webhooks are harmless.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from operator import attrgetter
+from typing import Generic, TypeVar
+
+from sqlalchemy import text
+
+from app.config import settings
+from app.database import current_route, engine
+from app.services.query_stats import stop_tracking
+
+logger = logging.getLogger(__name__)
+
+_MAX_RETRY_DELAY = 30.0  # seconds
+
+T = TypeVar("T")
+
+
+@dataclass(slots=True)
+class NotificationLogEntry:
+    user_id: uuid.UUID | str
+    channel: str
+    status: str
+    title: str | None = None
+    body: str | None = None
+    reference_type: str | None = None
+    reference_id: uuid.UUID | str | None = None
+    provider_message_id: str | None = None
+    error_message: str | None = None
+    id: uuid.UUID = field(default_factory=uuid.uuid4)
+    sent_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+_LOG_COLUMNS = [
+    "user_id", "channel", "status", "title", "body", "reference_type", "reference_id",
+    "provider_message_id", "error_message", "id", "sent_at",
+]
+_as_record = attrgetter(*_LOG_COLUMNS)
+
+
+@dataclass(slots=True)
+class StatusUpdate:
+    provider_message_id: str
+    status: str  # 'delivered' | 'read' | 'failed'
+    at: datetime
+    error_message: str | None = None
+
+
+# A status may only replace one ranked below it.
+_STATUS_RANK = {"sent": 0, "failed": 1, "delivered": 2, "read": 3}
+
+
+class _BufferedWriter(Generic[T]):
+    name = ""
+
+    def __init__(self, flush_interval: float, batch_size: int, max_buffer: int) -> None:
+        self._flush_interval = flush_interval
+        self._batch_size = batch_size
+        self._max_buffer = max_buffer
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+
+    # Buffer access, implemented by subclasses
+    def _pending(self) -> int:
+        raise NotImplementedError
+
+    def _peek(self, n: int) -> list[T]:
+        raise NotImplementedError
+
+    def _drop(self, batch: list[T]) -> None:
+        raise NotImplementedError
+
+    async def _write(self, batch: list[T]) -> None:
+        raise NotImplementedError
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def aclose(self) -> None:
+        """Stop the background task and flush whatever is still buffered."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+        delay = 0.5
+        for attempt in range(1, 4):
+            try:
+                await self.flush()
+                return
+            except Exception:
+                logger.exception("%s flush on shutdown failed attempt=%d pending=%d", self.name, attempt, self._pending())
+                await asyncio.sleep(delay)
+                delay *= 2
+        logger.error("%s closed with %d unwritten entries", self.name, self._pending())
+
+    # ------------------------------------------------------------------
+    # Producer side
+    # ------------------------------------------------------------------
+
+    async def _before_append(self) -> None:
+        if self._pending() >= self._max_buffer:
+            # The writer has been failing long enough to fill the buffer;
+            # apply backpressure rather than drop entries.
+            await self.flush()
+
+    def _after_append(self) -> None:
+        if self._pending() >= self._batch_size:
+            self._wakeup.set()
+
+    # ------------------------------------------------------------------
+    # Writer side
+    # ------------------------------------------------------------------
+
+    async def flush(self) -> None:
+        """Write everything buffered so far. Raises if a batch fails (it stays buffered)."""
+        async with self._flush_lock:
+            while self._pending():
+                batch = self._peek(self._batch_size)
+                await self._write(batch)
+                self._drop(batch)
+
+    async def _run(self) -> None:
+        current_route.set(self.name)  # pool metrics label for this task
+        stop_tracking()  # statements here belong to no request
+        delay = self._flush_interval
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+                delay = self._flush_interval
+            except Exception:
+                delay = min(max(delay * 2, 1.0), _MAX_RETRY_DELAY)
+                logger.exception("%s flush failed; retrying in %.1fs pending=%d", self.name, delay, self._pending())
+
+
+# ---------------------------------------------------------------------------
+# Send log — COPY
+# ---------------------------------------------------------------------------
+
+
+class NotificationLogWriter(_BufferedWriter[NotificationLogEntry]):
+    name = "notification_log"
+
+    def __init__(
+        self,
+        flush_interval: float = settings.NOTIFICATION_LOG_FLUSH_INTERVAL_SECONDS,
+        batch_size: int = settings.NOTIFICATION_LOG_BATCH_SIZE,
+        max_buffer: int = settings.NOTIFICATION_LOG_MAX_BUFFER,
+    ) -> None:
+        super().__init__(flush_interval, batch_size, max_buffer)
+        self._buffer: list[NotificationLogEntry] = []
+
+    async def record(self, entry: NotificationLogEntry) -> None:
+        await self._before_append()
+        self._buffer.append(entry)
+        self._after_append()
+
+    def _pending(self) -> int:
+        return len(self._buffer)
+
+    def _peek(self, n: int) -> list[NotificationLogEntry]:
+        return self._buffer[:n]
+
+    def _drop(self, batch: list[NotificationLogEntry]) -> None:
+        del self._buffer[: len(batch)]
+
+    async def _write(self, batch: list[NotificationLogEntry]) -> None:
+        async with engine.connect() as conn:
+            raw = await conn.get_raw_connection()
+            # Straight to asyncpg: COPY runs as one autocommitted statement,
+            # routed to the right monthly partitions by Postgres.
+            await raw.driver_connection.copy_records_to_table(
+                "notification_log",
+                records=[_as_record(e) for e in batch],
+                columns=_LOG_COLUMNS,
+            )
+        logger.debug("Notification log batch written size=%d", len(batch))
+
+
+# ---------------------------------------------------------------------------
+# Delivery status — UPDATE ... FROM (VALUES ...)
+# ---------------------------------------------------------------------------
+
+
+class DeliveryStatusWriter(_BufferedWriter[StatusUpdate]):
+    name = "delivery_status"
+
+    def __init__(
+        self,
+        flush_interval: float = settings.NOTIFICATION_LOG_FLUSH_INTERVAL_SECONDS,
+        batch_size: int = settings.DELIVERY_STATUS_BATCH_SIZE,
+        max_buffer: int = settings.NOTIFICATION_LOG_MAX_BUFFER,
+    ) -> None:
+        super().__init__(flush_interval, batch_size, max_buffer)
+        # Keyed by provider message id: only the furthest status per message is kept.
+        self._buffer: dict[str, StatusUpdate] = {}
+
+    async def record(self, update: StatusUpdate) -> None:
+        current = self._buffer.get(update.provider_message_id)
+        if current is not None and _STATUS_RANK[current.status] >= _STATUS_RANK[update.status]:
+            return
+        await self._before_append()
+        self._buffer[update.provider_message_id] = update
+        self._after_append()
+
+    def _pending(self) -> int:
+        return len(self._buffer)
+
+    def _peek(self, n: int) -> list[StatusUpdate]:
+        return [update for _, update in zip(range(n), self._buffer.values())]
+
+    def _drop(self, batch: list[StatusUpdate]) -> None:
+        for update in batch:
+            # A newer status may have replaced this one while the batch was written.
+            if self._buffer.get(update.provider_message_id) is update:
+                del self._buffer[update.provider_message_id]
+
+    async def _write(self, batch: list[StatusUpdate]) -> None:
+        rows = []
+        params: dict[str, object] = {}
+        for i, u in enumerate(batch):
+            rows.append(
+                f"(CAST(:id{i} AS varchar), CAST(:status{i} AS varchar), CAST(:rank{i} AS int), "
+                f"CAST(:at{i} AS timestamptz), CAST(:error{i} AS text))"
+            )
+            params.update(
+                {
+                    f"id{i}": u.provider_message_id,
+                    f"status{i}": u.status,
+                    f"rank{i}": _STATUS_RANK[u.status],
+                    f"at{i}": u.at,
+                    f"error{i}": u.error_message,
+                }
+            )
+        ranks = ", ".join(f"('{status}', {rank})" for status, rank in _STATUS_RANK.items())
+        sql = f"""
+            UPDATE notification_log n
+            SET status = v.status,
+                delivered_at = CASE WHEN v.status IN ('delivered', 'read')
+                                    THEN COALESCE(n.delivered_at, v.at) ELSE n.delivered_at END,
+                error_message = COALESCE(v.error, n.error_message)
+            FROM (VALUES {", ".join(rows)}) AS v(provider_message_id, status, rank, at, error),
+                 (VALUES {ranks}) AS cur(status, rank)
+            WHERE n.provider_message_id = v.provider_message_id
+              AND cur.status = n.status
+              AND v.rank > cur.rank
+        """
+        async with engine.begin() as conn:
+            await conn.execute(text(sql), params)
+        logger.debug("Delivery status batch applied size=%d", len(batch))
+
+
+# Singletons — the log writer is started and closed by the ARQ worker, the
+# status writer by the app lifespan.
+notification_log = NotificationLogWriter()
+delivery_status = DeliveryStatusWriter()
@@ -0,0 +1,166 @@
+"""Per-recipient channel routing for announcement notifications.
+
+Decides, for a whole chunk of recipients at once, who gets push, WhatsApp
+and SMS, and who is inside their quiet hours and must wait.  Loading is two
+queries per chunk (users + preferences, active devices) instead of a few
+per recipient.
+
+Rules, per recipient:
+  push      unless disabled in preferences, to every active device
+  whatsapp  if the announcement is urgent or marked send_whatsapp, and the
+            parent opted in (no preference row = not opted in)
+  sms       fallback when neither of those is possible, if the announcement
+            is marked send_sms and SMS is not disabled
+  quiet     if any chosen channel has quiet hours covering the school's local
+            time, the recipient is deferred on those channels until the latest
+            of those windows ends.  Urgent announcements ignore quiet hours.
+
+Quiet-hour windows are evaluated once per distinct (start, end) pair in the
+chunk — in practice a handful — rather than once per recipient.
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import text
+
+from app.database import engine
+
+Window = tuple[time, time]
+
+
+@dataclass
+class RoutePlan:
+    push: dict[str, list[str]] = field(default_factory=dict)  # user_id → device tokens
+    whatsapp: dict[str, str] = field(default_factory=dict)  # user_id → phone
+    sms: dict[str, str] = field(default_factory=dict)  # user_id → phone
+    # resume at (UTC) → channel → user_ids
+    deferred: dict[datetime, dict[str, list[str]]] = field(default_factory=dict)
+    unreachable: list[str] = field(default_factory=list)  # no channel to send on
+    held: list[str] = field(default_factory=list)  # waiting for a digest (app.services.digests)
+
+
+@dataclass
+class Recipient:
+    phone: str | None = None
+    # channel → (enabled, quiet window or None)
+    prefs: dict[str, tuple[bool, Window | None]] = field(default_factory=dict)
+
+    def enabled(self, channel: str, default: bool) -> bool:
+        pref = self.prefs.get(channel)
+        return default if pref is None else pref[0]
+
+    def window(self, channel: str) -> Window | None:
+        pref = self.prefs.get(channel)
+        return None if pref is None else pref[1]
+
+
+def quiet_until(local_now: datetime, window: Window) -> datetime | None:
+    """If *local_now* is inside *window*, return when the window ends (same tz)."""
+    start, end = window
+    now = local_now.time()
+    if start == end:
+        return None
+    inside = start <= now < end if start < end else now >= start or now < end
+    if not inside:
+        return None
+    resume = local_now.replace(hour=end.hour, minute=end.minute, second=0, microsecond=0)
+    if resume <= local_now:  # window crosses midnight and ends tomorrow
+        resume += timedelta(days=1)
+    return resume
+
+
+def plan_routes(
+    recipients: dict[str, Recipient],
+    devices: dict[str, list[str]],
+    *,
+    school_timezone: str,
+    priority: str,
+    send_sms: bool,
+    send_whatsapp: bool,
+    now: datetime | None = None,
+) -> RoutePlan:
+    local_now = (now or datetime.now(timezone.utc)).astimezone(ZoneInfo(school_timezone))
+    urgent = priority == "urgent"
+    plan = RoutePlan()
+    resume_by_window: dict[Window, datetime | None] = {}
+    deferred: dict[datetime, dict[str, list[str]]] = defaultdict(lambda: defaultdict(list))
+
+    for user_id, r in recipients.items():
+        channels: list[str] = []
+        if devices.get(user_id) and r.enabled("push", default=True):
+            channels.append("push")
+        if r.phone and (urgent or send_whatsapp) and r.enabled("whatsapp", default=False):
+            channels.append("whatsapp")
+        if r.phone and send_sms and not channels and r.enabled("sms", default=True):
+            channels.append("sms")
+        if not channels:
+            plan.unreachable.append(user_id)
+            continue
+
+        if not urgent:
+            resumes = []
+            for channel in channels:
+                window = r.window(channel)
+                if window is None:
+                    continue
+                if window not in resume_by_window:
+                    resume_by_window[window] = quiet_until(local_now, window)
+                if resume_by_window[window] is not None:
+                    resumes.append(resume_by_window[window])
+            if resumes:
+                resume_at = max(resumes).astimezone(timezone.utc)
+                for channel in channels:
+                    deferred[resume_at][channel].append(user_id)
+                continue
+
+        if "push" in channels:
+            plan.push[user_id] = devices[user_id]
+        if "whatsapp" in channels:
+            plan.whatsapp[user_id] = r.phone
+        if "sms" in channels:
+            plan.sms[user_id] = r.phone
+
+    plan.deferred = {resume_at: dict(by_channel) for resume_at, by_channel in deferred.items()}
+    return plan
+
+
+# ---------------------------------------------------------------------------
+# Bulk loading
+# ---------------------------------------------------------------------------
+
+_RECIPIENTS_SQL = """
+    SELECT u.id, u.phone, p.channel, p.enabled, p.quiet_hours_start, p.quiet_hours_end
+    FROM users u
+    LEFT JOIN notification_preferences p ON p.user_id = u.id
+    WHERE u.id = ANY(CAST(:ids AS uuid[])) AND u.is_active
+"""
+
+_DEVICES_SQL = """
+    SELECT user_id, device_token FROM push_devices
+    WHERE user_id = ANY(CAST(:ids AS uuid[])) AND is_active
+"""
+
+
+async def load_recipients(school_id: str, user_ids: list[str]) -> tuple[dict[str, Recipient], dict[str, list[str]]]:
+    """Preferences and active devices for *user_ids*, in two queries."""
+    async with engine.begin() as conn:
+        await conn.execute(text("SELECT set_config('app.current_school_id', :sid, true)"), {"sid": school_id})
+        pref_rows = (await conn.execute(text(_RECIPIENTS_SQL), {"ids": user_ids})).all()
+        device_rows = (await conn.execute(text(_DEVICES_SQL), {"ids": user_ids})).all()
+
+    recipients: dict[str, Recipient] = {}
+    for user_id, phone, channel, enabled, quiet_start, quiet_end in pref_rows:
+        r = recipients.setdefault(str(user_id), Recipient(phone=phone))
+        if channel is not None:
+            window = (quiet_start, quiet_end) if quiet_start is not None and quiet_end is not None else None
+            r.prefs[channel] = (enabled, window)
+
+    devices: dict[str, list[str]] = {}
+    for user_id, token in device_rows:
+        devices.setdefault(str(user_id), []).append(token)
+    return recipients, devices
@@ -0,0 +1,115 @@
+"""Redis cache of the fields authorization needs about a user.
+
+get_current_user used to load the full User row on every request just to
+check is_active and read role/school_id.  A Principal holds only those
+fields and is cached in Redis for PRINCIPAL_CACHE_TTL_SECONDS.
+
+Keys (the {uid} hash tag keeps both on one cluster slot):
+    principal:{<uid>}:ver    random version token; absent means "0"
+    principal:{<uid>}        JSON principal, tagged with the version it was
+                             loaded under
+
+Reads fetch both keys with one MGET; an entry counts only if its tag matches
+the current version.  invalidate_principal() sets a fresh token, so every
+cached entry for the user is unreachable immediately.  A miss is filled under
+the version observed *before* the database read, so a concurrent
+invalidation can never be overwritten by stale data.  Tokens are random, not
+a counter: when a version key expires and a later invalidation sets a new
+one, no leftover entry can match it.
+
+Invalidation is driven by the database: a trigger on users NOTIFYs
+principal_changed when role, school_id or is_active changes (migration 0009),
+and app.services.db_events calls invalidate_principal() in every API process.
+"""
+
+from __future__ import annotations
+
+import json
+import uuid
+from dataclasses import dataclass
+
+from redis.asyncio import Redis
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.user import User
+from app.services.db_events import db_events
+
+# Outlives any entry filled under the previous version (entry TTL plus a
+# slow database read), so an expired version can never resurrect one.
+_VERSION_TTL_SECONDS = settings.PRINCIPAL_CACHE_TTL_SECONDS * 10
+
+
+@dataclass(frozen=True, slots=True)
+class Principal:
+    """The authenticated caller, as seen by authorization checks."""
+
+    id: uuid.UUID
+    school_id: uuid.UUID | None
+    role: str
+    is_active: bool
+
+    def _dumps(self, version: str) -> str:
+        return json.dumps(
+            {
+                "ver": version,
+                "school_id": str(self.school_id) if self.school_id else None,
+                "role": self.role,
+                "is_active": self.is_active,
+            }
+        )
+
+    @classmethod
+    def _loads(cls, user_id: uuid.UUID, raw: bytes | str) -> Principal:
+        data = json.loads(raw)
+        return cls(
+            id=user_id,
+            school_id=uuid.UUID(data["school_id"]) if data["school_id"] else None,
+            role=data["role"],
+            is_active=data["is_active"],
+        )
+
+
+def _version_key(user_id: uuid.UUID) -> str:
+    return f"principal:{{{user_id}}}:ver"
+
+
+def _entry_key(user_id: uuid.UUID) -> str:
+    return f"principal:{{{user_id}}}"
+
+
+def _str(value: bytes | str) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+async def get_principal(user_id: uuid.UUID, redis: Redis, db: AsyncSession) -> Principal | None:
+    """Return the cached principal, loading it from the database on a miss."""
+    version, cached = await redis.mget(_version_key(user_id), _entry_key(user_id))
+    version = _str(version) if version is not None else "0"
+    if cached is not None and json.loads(cached)["ver"] == version:
+        return Principal._loads(user_id, cached)
+
+    row = (
+        await db.execute(
+            select(User.school_id, User.role, User.is_active).where(User.id == user_id)
+        )
+    ).one_or_none()
+    if row is None:
+        return None
+
+    principal = Principal(id=user_id, school_id=row.school_id, role=row.role, is_active=row.is_active)
+    await redis.set(_entry_key(user_id), principal._dumps(version), ex=settings.PRINCIPAL_CACHE_TTL_SECONDS)
+    return principal
+
+
+async def invalidate_principal(user_id: uuid.UUID, redis: Redis) -> None:
+    """Make every cached principal for *user_id* stale. Call after role / school / is_active changes."""
+    await redis.set(_version_key(user_id), uuid.uuid4().hex, ex=_VERSION_TTL_SECONDS)
+
+
+async def _on_user_changed(redis: Redis, user_id: str) -> None:
+    await invalidate_principal(uuid.UUID(user_id), redis)
+
+
+db_events.subscribe("principal_changed", _on_user_changed)
@@ -0,0 +1,216 @@
+"""Shared outbound layer for notification providers (FCM, WhatsApp, SMS).
+
+Each provider gets one ProviderClient per process, which wraps a pooled
+httpx.AsyncClient with:
+
+  token bucket      <PROVIDER>_RATE_PER_SECOND / <PROVIDER>_BURST; callers
+                    wait for a token instead of tripping the provider's quota
+  retries           failures to connect (the request never left), 429 and
+                    5xx are retried up to PROVIDER_MAX_RETRIES times with
+                    exponential backoff and jitter (or the provider's
+                    Retry-After, if longer).  Other transport errors, such as
+                    a read timeout, are raised at once: the provider may have
+                    acted on the request, and a resend would duplicate it.
+  circuit breaker   after PROVIDER_BREAKER_FAILURES consecutive failed
+                    requests the circuit opens and calls fail immediately with
+                    ProviderUnavailable for PROVIDER_BREAKER_RESET_SECONDS;
+                    then one trial request decides whether it closes again.
+                    429s are quota, not an outage: they count as neither a
+                    failure nor a success.
+
+so a provider that is down costs a worker slot nothing but an exception.
+request() returns the final httpx.Response — provider-specific status
+handling stays in the provider's client (sms_service, whatsapp_service,
+fcm_service) — or raises httpx.TransportError / ProviderUnavailable.  The
+clients treat only NOT_SENT_ERRORS as worth another attempt; after any other
+transport error the outcome is unknown, and the send is not repeated.
+
+Metrics: provider_queue_wait_seconds, provider_in_flight,
+provider_breaker_state (0 closed, 1 half-open, 2 open),
+provider_requests_total.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import time
+from typing import Any
+
+import httpx
+
+from app.config import settings
+from app.services import metrics
+
+logger = logging.getLogger(__name__)
+
+_QUEUE_WAIT = metrics.histogram("provider_queue_wait_seconds", "Time spent waiting for a provider rate-limit token")
+_IN_FLIGHT = metrics.gauge("provider_in_flight", "Provider requests currently in flight")
+_BREAKER_STATE = metrics.gauge("provider_breaker_state", "Circuit breaker state: 0 closed, 1 half-open, 2 open")
+_REQUESTS = metrics.counter("provider_requests_total", "Provider HTTP attempts, per outcome")
+
+
+class ProviderUnavailable(Exception):
+    """The provider's circuit is open; the call was not attempted."""
+
+
+# Raised before the request was sent, so retrying cannot deliver it twice.  Any
+# other transport error may come after the provider acted on the request.
+NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout, ProviderUnavailable)
+
+
+class TokenBucket:
+    """Async token bucket: *rate* tokens per second, holding at most *burst*."""
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self._rate = rate
+        self._burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        # Waiters queue on the lock, so tokens are handed out in arrival order.
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self._rate)
+
+
+class CircuitBreaker:
+    CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float) -> None:
+        self._name = name
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_started: float | None = None
+        self.state = self.CLOSED
+        _BREAKER_STATE.set(self.state, provider=name)
+
+    def _set_state(self, state: int) -> None:
+        if state != self.state:
+            logger.warning("Provider circuit %s provider=%s", ("closed", "half-open", "open")[state], self._name)
+            self.state = state
+            _BREAKER_STATE.set(state, provider=self._name)
+
+    def before_request(self) -> None:
+        """Raise ProviderUnavailable unless a request may go out now."""
+        if self.state == self.OPEN:
+            if time.monotonic() - self._opened_at < self._reset_timeout:
+                raise ProviderUnavailable(f"{self._name} circuit open")
+            self._set_state(self.HALF_OPEN)
+        if self.state == self.HALF_OPEN:
+            # One trial at a time; a trial that never reported back (cancelled)
+            # is given up on after another reset period.
+            now = time.monotonic()
+            if self._trial_started is not None and now - self._trial_started < self._reset_timeout:
+                raise ProviderUnavailable(f"{self._name} circuit half-open")
+            self._trial_started = now
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._trial_started = None
+        self._set_state(self.CLOSED)
+
+    def record_neutral(self) -> None:
+        """The request says nothing about the provider's health (a 429)."""
+        self._trial_started = None
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        self._trial_started = None
+        if self.state == self.HALF_OPEN or self._failures >= self._failure_threshold:
+            self._opened_at = time.monotonic()
+            self._set_state(self.OPEN)
+
+
+def _retry_after(resp: httpx.Response) -> float:
+    try:
+        return float(resp.headers.get("retry-after", 0))
+    except ValueError:  # HTTP-date form; fall back to our own backoff
+        return 0.0
+
+
+class ProviderClient:
+    def __init__(
+        self,
+        name: str,
+        *,
+        rate_per_second: float,
+        burst: int,
+        max_connections: int,
+        timeout: float,
+        http2: bool = False,
+    ) -> None:
+        self.name = name
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=60,
+        )
+        self._timeout = httpx.Timeout(timeout, connect=5.0)
+        self._http2 = http2
+        self._client: httpx.AsyncClient | None = None
+        self.bucket = TokenBucket(rate_per_second, burst)
+        self.breaker = CircuitBreaker(name, settings.PROVIDER_BREAKER_FAILURES, settings.PROVIDER_BREAKER_RESET_SECONDS)
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(http2=self._http2, timeout=self._timeout, limits=self._limits)
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def request(self, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        attempt = 0
+        while True:
+            self.breaker.before_request()
+
+            started = time.perf_counter()
+            await self.bucket.acquire()
+            _QUEUE_WAIT.observe(time.perf_counter() - started, provider=self.name)
+
+            _IN_FLIGHT.inc(provider=self.name)
+            try:
+                resp = await self._get_client().request(method, url, **kwargs)
+            except httpx.TransportError as exc:
+                self.breaker.record_failure()
+                _REQUESTS.inc(provider=self.name, outcome="transport_error")
+                if (
+                    not isinstance(exc, NOT_SENT_ERRORS)
+                    or attempt >= settings.PROVIDER_MAX_RETRIES
+                    or self.breaker.state == CircuitBreaker.OPEN
+                ):
+                    raise
+                delay = 0.0
+            else:
+                if resp.status_code == 429:
+                    # Our quota, not the provider failing.
+                    self.breaker.record_neutral()
+                elif resp.status_code < 500:
+                    self.breaker.record_success()
+                else:
+                    self.breaker.record_failure()
+                _REQUESTS.inc(provider=self.name, outcome=str(resp.status_code))
+                retryable = resp.status_code == 429 or resp.status_code >= 500
+                if not retryable or attempt >= settings.PROVIDER_MAX_RETRIES or self.breaker.state == CircuitBreaker.OPEN:
+                    return resp
+                delay = _retry_after(resp)
+            finally:
+                _IN_FLIGHT.dec(provider=self.name)
+
+            backoff = settings.PROVIDER_RETRY_BASE_SECONDS * 2**attempt
+            await asyncio.sleep(max(delay, backoff * random.uniform(0.5, 1.5)))
+            attempt += 1
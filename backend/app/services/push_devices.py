@@ -0,0 +1,39 @@
+"""Push device registry maintenance.
+
+Devices are registered and unregistered by the app (app.api.devices).  FCM
+reports tokens that are unregistered or malformed on every send; those are
+collected across a fan-out job and deactivated here in one UPDATE, so a
+stale token costs one failed send rather than one on every broadcast.
+"""
+
+from __future__ import annotations
+
+import logging
+from collections.abc import Collection
+
+from sqlalchemy import text
+
+from app.database import engine
+from app.services import metrics
+
+logger = logging.getLogger(__name__)
+
+_DEACTIVATED = metrics.counter("push_devices_deactivated_total", "Push devices deactivated after FCM rejected their token")
+
+# Tokens are unique per app install, so an invalid token is invalid for
+# every user it was registered to.
+_DEACTIVATE_SQL = """
+    UPDATE push_devices SET is_active = false, updated_at = now()
+    WHERE device_token = ANY(CAST(:tokens AS text[])) AND is_active
+"""
+
+
+async def deactivate_tokens(tokens: Collection[str]) -> int:
+    """Deactivate every active device registered with one of *tokens*; returns the row count."""
+    if not tokens:
+        return 0
+    async with engine.begin() as conn:
+        result = await conn.execute(text(_DEACTIVATE_SQL), {"tokens": list(set(tokens))})
+    _DEACTIVATED.inc(result.rowcount)
+    logger.info("Push devices deactivated tokens=%d rows=%d", len(tokens), result.rowcount)
+    return result.rowcount
@@ -0,0 +1,113 @@
+"""Per-request SQL statement counting and N+1 detection.
+
+Cursor events on every engine feed the QueryStats active in the current
+context: the statement count, total database time, and how often each
+statement shape ran.  ServerTimingMiddleware opens one per request; a shape
+that repeats QUERY_REPEAT_THRESHOLD times or more within one request is
+almost always a query inside a loop and is reported as such.
+
+Trackers nest — statements count towards every enclosing tracker — so a test
+can put a budget around a whole request made through the ASGI app:
+
+    with query_budget(4):
+        await client.get("/api/conversations", headers=auth)
+"""
+
+from __future__ import annotations
+
+import re
+import time
+from collections import Counter
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.config import settings
+
+
+class QueryStats:
+    def __init__(self, parent: QueryStats | None = None) -> None:
+        self.parent = parent
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes: Counter[str] = Counter()
+
+    def record(self, statement: str, seconds: float) -> None:
+        shape = _shape(statement)
+        stats: QueryStats | None = self
+        while stats is not None:
+            stats.count += 1
+            stats.seconds += seconds
+            stats.shapes[shape] += 1
+            stats = stats.parent
+
+    def repeated(self, threshold: int = settings.QUERY_REPEAT_THRESHOLD) -> list[tuple[str, int]]:
+        """Statement shapes run at least *threshold* times, most frequent first."""
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= threshold]
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+_current: ContextVar[QueryStats | None] = ContextVar("query_stats", default=None)
+
+# Expanded IN lists and multi-row VALUES differ only in arity; treat them as one shape.
+_IN_LIST = re.compile(r"IN \((?:\$\d+|%\(\w+\)s|\?)(?:, (?:\$\d+|%\(\w+\)s|\?))*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _shape(statement: str) -> str:
+    return _IN_LIST.sub("IN (...)", _WHITESPACE.sub(" ", statement).strip())
+
+
+@contextmanager
+def track_queries() -> Iterator[QueryStats]:
+    """Count statements executed in this context (and its tasks) until exit."""
+    stats = QueryStats(parent=_current.get())
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+def stop_tracking() -> None:
+    """Stop the current task counting towards the trackers it inherited.
+
+    A task copies the context of whoever created it, so a background task
+    first started inside a request would otherwise charge every statement it
+    ever runs to that request.  Long-lived tasks call this first.
+    """
+    _current.set(None)
+
+
+@contextmanager
+def query_budget(limit: int) -> Iterator[QueryStats]:
+    """Fail with QueryBudgetExceeded if more than *limit* statements run inside."""
+    with track_queries() as stats:
+        yield stats
+    if stats.count > limit:
+        shapes = "\n".join(f"  {n}x {shape}" for shape, n in stats.shapes.most_common(5))
+        raise QueryBudgetExceeded(f"{stats.count} queries, budget {limit}:\n{shapes}")
+
+
+# ---------------------------------------------------------------------------
+# Engine instrumentation
+# ---------------------------------------------------------------------------
+
+
+def instrument(target: AsyncEngine) -> None:
+    @event.listens_for(target.sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany) -> None:
+        # Statements on one connection never overlap, so a single slot will do.
+        conn.info["query_started"] = time.perf_counter()
+
+    @event.listens_for(target.sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany) -> None:
+        stats = _current.get()
+        if stats is not None:
+            stats.record(statement, time.perf_counter() - conn.info["query_started"])
@@ -0,0 +1,29 @@
+"""Lua scripts for Redis, one object per script.
+
+    _CONSUME = RedisScript(\"\"\"...\"\"\")
+    consumed = await _CONSUME(redis, keys=[key], args=[otp])
+
+Runs with EVALSHA, falling back to EVAL on a server that has not seen the
+script yet (redis-py's Script).  A script must name every key it touches in
+KEYS, never build one from ARGV, so it stays correct under Redis Cluster
+and key-level ACLs.
+"""
+
+from __future__ import annotations
+
+from typing import Any
+
+from redis.asyncio import Redis
+from redis.commands.core import AsyncScript
+
+
+class RedisScript:
+    def __init__(self, source: str) -> None:
+        self.source = source
+        self._script: AsyncScript | None = None
+
+    async def __call__(self, redis: Redis, keys: list[Any], args: list[Any]) -> Any:
+        if self._script is None:
+            # Only hashes the source; the server loads it on first use.
+            self._script = redis.register_script(self.source)
+        return await self._script(keys=keys, args=args, client=redis)
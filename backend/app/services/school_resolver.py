@@ -0,0 +1,164 @@
+"""Subdomain slug → school_id resolution for SchoolContextMiddleware.
+
+Lookups go through three tiers:
+  1. an in-process LRU (SCHOOL_SLUG_LOCAL_TTL_SECONDS) — a dict lookup, so the
+     common case adds no I/O to the middleware;
+  2. Redis, key school_slug:<slug> (SCHOOL_SLUG_CACHE_TTL_SECONDS);
+  3. the schools table.
+Unknown or inactive slugs are cached too (as "-") for
+SCHOOL_SLUG_NEGATIVE_TTL_SECONDS, so probing random subdomains cannot reach the
+database.  Concurrent misses for the same slug share one lookup.
+
+invalidate_school_slug() deletes the Redis entry and publishes on
+school_slug:invalidate, which every process's listener uses to evict its
+local copy.  It is driven by the database: a trigger on schools NOTIFYs
+school_changed with each slug whose answer may have changed — rename,
+is_active, insert or delete (migration 0010) — and app.services.db_events
+calls invalidate_school_slug() for it.  The TTLs bound staleness if a
+message is missed.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+from redis.asyncio import Redis
+from sqlalchemy import text
+
+from app.config import settings
+from app.database import engine
+from app.services.db_events import db_events
+
+logger = logging.getLogger(__name__)
+
+INVALIDATE_CHANNEL = "school_slug:invalidate"
+_NEGATIVE = "-"
+_LOCAL_MAX_ENTRIES = 10_000
+
+
+def _redis_key(slug: str) -> str:
+    return f"school_slug:{slug}"
+
+
+class SchoolResolver:
+    def __init__(self) -> None:
+        # slug → (school_id or None, monotonic expiry)
+        self._local: OrderedDict[str, tuple[str | None, float]] = OrderedDict()
+        self._inflight: dict[str, asyncio.Future[str | None]] = {}
+        self._listener: asyncio.Task | None = None
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def start(self, redis: Redis) -> None:
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen(redis))
+
+    async def aclose(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+
+    # ------------------------------------------------------------------
+    # Lookup
+    # ------------------------------------------------------------------
+
+    async def resolve(self, slug: str, redis: Redis) -> str | None:
+        """Return the school_id for *slug*, or None if unknown / inactive / lookup failed."""
+        entry = self._local.get(slug)
+        if entry is not None:
+            school_id, expires = entry
+            if expires > time.monotonic():
+                self._local.move_to_end(slug)
+                return school_id
+            del self._local[slug]
+
+        future = self._inflight.get(slug)
+        if future is None:
+            future = asyncio.ensure_future(self._load(slug, redis))
+            self._inflight[slug] = future
+            future.add_done_callback(lambda _: self._inflight.pop(slug, None))
+        try:
+            # shield: one client disconnecting must not cancel the shared lookup
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("School slug lookup failed slug=%s", slug)
+            return None
+
+    async def _load(self, slug: str, redis: Redis) -> str | None:
+        cached = await redis.get(_redis_key(slug))
+        if cached is not None:
+            cached = cached.decode() if isinstance(cached, bytes) else cached
+            school_id = None if cached == _NEGATIVE else cached
+        else:
+            async with engine.connect() as conn:
+                row = (
+                    await conn.execute(
+                        text("SELECT id FROM schools WHERE slug = :slug AND is_active"),
+                        {"slug": slug},
+                    )
+                ).first()
+            school_id = str(row.id) if row else None
+            await redis.set(
+                _redis_key(slug),
+                school_id or _NEGATIVE,
+                ex=settings.SCHOOL_SLUG_CACHE_TTL_SECONDS if school_id else settings.SCHOOL_SLUG_NEGATIVE_TTL_SECONDS,
+            )
+
+        ttl = settings.SCHOOL_SLUG_LOCAL_TTL_SECONDS if school_id else settings.SCHOOL_SLUG_NEGATIVE_TTL_SECONDS
+        self._local[slug] = (school_id, time.monotonic() + ttl)
+        if len(self._local) > _LOCAL_MAX_ENTRIES:
+            self._local.popitem(last=False)
+        return school_id
+
+    # ------------------------------------------------------------------
+    # Invalidation
+    # ------------------------------------------------------------------
+
+    def evict(self, slug: str | None = None) -> None:
+        """Drop one slug (or everything) from the local cache."""
+        if slug is None:
+            self._local.clear()
+        else:
+            self._local.pop(slug, None)
+
+    async def _listen(self, redis: Redis) -> None:
+        while True:
+            try:
+                async with redis.pubsub() as pubsub:
+                    await pubsub.subscribe(INVALIDATE_CHANNEL)
+                    # Anything published while we were disconnected is lost.
+                    self.evict()
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            data = message["data"]
+                            self.evict(data.decode() if isinstance(data, bytes) else data)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("School slug invalidation listener failed; reconnecting")
+                await asyncio.sleep(1)
+
+
+async def invalidate_school_slug(slug: str, redis: Redis) -> None:
+    """Forget *slug* in Redis and in every process. Call after slug / is_active changes."""
+    await redis.delete(_redis_key(slug))
+    await redis.publish(INVALIDATE_CHANNEL, slug)
+
+
+async def _on_school_changed(redis: Redis, slug: str) -> None:
+    await invalidate_school_slug(slug, redis)
+
+
+db_events.subscribe("school_changed", _on_school_changed)
+
+
+# Singleton — listener started and stopped by the app lifespan.
+school_resolver = SchoolResolver()
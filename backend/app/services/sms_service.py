@@ -0,0 +1,87 @@
+"""SMS provider client.
+
+Sends go through a ProviderClient (app.services.providers): one pooled
+keep-alive connection pool per process, rate limited to SMS_RATE_PER_SECOND,
+with short retries and a circuit breaker.  Called from the ARQ worker
+(app.tasks.sms, app.tasks.notifications), never inline on the request path.
+
+Provider errors are split three ways so the task knows whether another
+attempt can help: retryable (the request never left — connect errors and
+timeouts, open circuit — or 429, 5xx → SMSRetryableError), unknown (read
+timeouts, dropped connections: the provider may have sent it →
+SMSOutcomeUnknown, not to be resent) and permanent (other 4xx →
+SMSDeliveryError).
+"""
+
+from __future__ import annotations
+
+import logging
+
+import httpx
+
+from app.config import settings
+from app.services.providers import NOT_SENT_ERRORS, ProviderClient
+
+logger = logging.getLogger(__name__)
+
+
+class SMSDeliveryError(Exception):
+    """The provider rejected the message; retrying will not help."""
+
+
+class SMSRetryableError(SMSDeliveryError):
+    """Transient provider or network failure; the message was not sent."""
+
+
+class SMSOutcomeUnknown(SMSDeliveryError):
+    """The request may have reached the provider; sending again could duplicate it."""
+
+
+class SMSClient:
+    def __init__(self) -> None:
+        self._provider = ProviderClient(
+            "sms",
+            rate_per_second=settings.SMS_RATE_PER_SECOND,
+            burst=settings.SMS_BURST,
+            max_connections=settings.SMS_MAX_CONNECTIONS,
+            timeout=settings.SMS_TIMEOUT_SECONDS,
+        )
+
+    async def aclose(self) -> None:
+        await self._provider.aclose()
+
+    async def send(self, phone: str, message: str) -> str | None:
+        """Send *message*; returns the provider's message id (None when stubbed)."""
+        if settings.ENVIRONMENT == "development" or not settings.SMS_API_KEY:
+            logger.info("[SMS stub] %s → %s", message, phone)
+            return None
+
+        if settings.SMS_PROVIDER != "clickatell":
+            logger.warning("Unknown SMS_PROVIDER '%s'; SMS not sent.", settings.SMS_PROVIDER)
+            return None
+
+        try:
+            resp = await self._provider.request(
+                "POST",
+                settings.SMS_API_URL,
+                params={"apiKey": settings.SMS_API_KEY, "to": phone, "content": message},
+            )
+        except NOT_SENT_ERRORS as exc:  # refused connections, connect timeouts, open circuit
+            raise SMSRetryableError(f"{type(exc).__name__}: {exc}") from exc
+        except httpx.TransportError as exc:  # read timeouts, dropped connections
+            raise SMSOutcomeUnknown(f"{type(exc).__name__}: {exc}") from exc
+
+        if resp.status_code == 429 or resp.status_code >= 500:
+            raise SMSRetryableError(f"provider returned {resp.status_code}")
+        if resp.status_code >= 400:
+            raise SMSDeliveryError(f"provider returned {resp.status_code}: {resp.text[:200]}")
+        messages = resp.json().get("messages") or [{}]
+        return messages[0].get("apiMessageId")
+
+
+def otp_message(otp: str) -> str:
+    return f"Your BellBook code is {otp}. Valid for {settings.OTP_EXPIRY_MINUTES} minutes."
+
+
+# Singleton — closed by the worker's on_shutdown hook.
+sms_client = SMSClient()
@@ -1,10 +1,12 @@
 """Server-Sent Events connection manager.
 
-Phase 1: single-process in-memory queues keyed by user_id.
-
-For multi-process / multi-node deployments (Phase 2+) replace with a
-Redis pub/sub backend so events reach clients regardless of which
-worker process holds the SSE connection.
+Each API process keeps in-memory queues keyed by user_id for the SSE
+connections it holds.  Events are published to the Redis channel
+SSE_CHANNEL (publish(), used by the outbox relay in app.tasks.outbox) and
+every API process relays them to its own connections, so an event reaches
+its users whichever process holds their stream.  Events published while a
+process is reconnecting to Redis are lost to it; SSE is a live hint, and
+clients re-fetch on reconnect.
 """
 
 from __future__ import annotations
@@ -14,15 +16,53 @@ import json
 import logging
 from typing import Any
 
+from redis.asyncio import Redis
+
 logger = logging.getLogger(__name__)
 
 _QUEUE_MAXSIZE = 64  # drop events silently if a slow client falls this far behind
+SSE_CHANNEL = "sse:events"
+_MAX_RECONNECT_DELAY = 30.0  # seconds
 
 
 class SSEManager:
     def __init__(self) -> None:
         # user_id → set of per-connection asyncio queues
         self._connections: dict[str, set[asyncio.Queue]] = {}
+        self._listener: asyncio.Task | None = None
+
+    # ------------------------------------------------------------------
+    # Redis subscription (started and closed by the app lifespan)
+    # ------------------------------------------------------------------
+
+    def start(self, redis: Redis) -> None:
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen(redis))
+
+    async def aclose(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+
+    async def _listen(self, redis: Redis) -> None:
+        delay = 1.0
+        while True:
+            try:
+                async with redis.pubsub() as pubsub:
+                    await pubsub.subscribe(SSE_CHANNEL)
+                    delay = 1.0
+                    async for message in pubsub.listen():
+                        if message["type"] != "message":
+                            continue
+                        envelope = json.loads(message["data"])
+                        await self.broadcast(envelope["user_ids"], envelope["event"])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("SSE subscription failed; reconnecting in %.0fs", delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, _MAX_RECONNECT_DELAY)
 
     # ------------------------------------------------------------------
     # Connection lifecycle
@@ -64,5 +104,11 @@ class SSEManager:
         await asyncio.gather(*(self.send_to_user(uid, event) for uid in user_ids))
 
 
-# Singleton — imported by the events endpoint and the announcements router.
+async def publish(redis: Redis, user_ids: list[str], event: dict[str, Any]) -> None:
+    """Deliver *event* to *user_ids* through whichever API processes hold their streams."""
+    if user_ids:
+        await redis.publish(SSE_CHANNEL, json.dumps({"user_ids": user_ids, "event": event}))
+
+
+# Singleton — imported by the events endpoint; subscribed by the app lifespan.
 manager = SSEManager()
@@ -0,0 +1,73 @@
+"""WhatsApp Business (Cloud API) client.
+
+Same shape as app.services.sms_service: sends go through a rate-limited
+ProviderClient, errors are split into retryable, unknown outcome and
+permanent.  Used by the announcement fan-out for urgent announcements to
+parents who opted in.
+"""
+
+from __future__ import annotations
+
+import logging
+
+import httpx
+
+from app.config import settings
+from app.services.providers import NOT_SENT_ERRORS, ProviderClient
+
+logger = logging.getLogger(__name__)
+
+
+class WhatsAppDeliveryError(Exception):
+    """The API rejected the message; retrying will not help."""
+
+
+class WhatsAppRetryableError(WhatsAppDeliveryError):
+    """Transient API or network failure; the message was not sent."""
+
+
+class WhatsAppOutcomeUnknown(WhatsAppDeliveryError):
+    """The request may have reached the API; sending again could duplicate it."""
+
+
+class WhatsAppClient:
+    def __init__(self) -> None:
+        self._provider = ProviderClient(
+            "whatsapp",
+            rate_per_second=settings.WHATSAPP_RATE_PER_SECOND,
+            burst=settings.WHATSAPP_BURST,
+            max_connections=settings.WHATSAPP_MAX_CONNECTIONS,
+            timeout=settings.WHATSAPP_TIMEOUT_SECONDS,
+        )
+
+    async def aclose(self) -> None:
+        await self._provider.aclose()
+
+    async def send(self, phone: str, message: str) -> str | None:
+        """Send *message*; returns the provider's message id (None when stubbed)."""
+        if settings.ENVIRONMENT == "development" or not settings.WHATSAPP_ACCESS_TOKEN:
+            logger.info("[WhatsApp stub] %s → %s", message, phone)
+            return None
+
+        try:
+            resp = await self._provider.request(
+                "POST",
+                f"{settings.WHATSAPP_API_URL}{settings.WHATSAPP_PHONE_NUMBER_ID}/messages",
+                headers={"Authorization": f"Bearer {settings.WHATSAPP_ACCESS_TOKEN}"},
+                json={"messaging_product": "whatsapp", "to": phone, "type": "text", "text": {"body": message}},
+            )
+        except NOT_SENT_ERRORS as exc:
+            raise WhatsAppRetryableError(f"{type(exc).__name__}: {exc}") from exc
+        except httpx.TransportError as exc:
+            raise WhatsAppOutcomeUnknown(f"{type(exc).__name__}: {exc}") from exc
+
+        if resp.status_code == 429 or resp.status_code >= 500:
+            raise WhatsAppRetryableError(f"API returned {resp.status_code}")
+        if resp.status_code >= 400:
+            raise WhatsAppDeliveryError(f"API returned {resp.status_code}: {resp.text[:200]}")
+        messages = resp.json().get("messages") or [{}]
+        return messages[0].get("id")
+
+
+# Singleton — closed by the worker's on_shutdown hook.
+whatsapp_client = WhatsAppClient()
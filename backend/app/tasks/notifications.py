@@ -1,40 +1,568 @@
-"""ARQ background tasks for push notification dispatch.
+"""ARQ tasks for announcement notifications.
 
-Stub implementation — full FCM / WhatsApp / SMS pipeline in Prompt 6.
+create_announcement enqueues one send_announcement_notifications job per
+announcement.  The job splits the recipients into chunks of
+NOTIFY_CHUNK_SIZE and works on NOTIFY_CONCURRENCY chunks at a time.  Each
+chunk is routed in bulk (app.services.notification_routing: preferences,
+devices and quiet hours in two queries), then sent: push in FCM multicast
+batches of up to FCM_MULTICAST_SIZE tokens, WhatsApp and SMS concurrently
+through their pooled clients.
 
-ARQ tasks receive a `ctx` dict as their first argument (the worker context).
-In Prompt 6, ctx will contain a Redis connection and the firebase-admin app.
+Finished recipients are added to the Redis set notify:<announcement_id>:done
+as each chunk completes, and every send attempt is logged to
+notification_log through the buffered COPY writer.  A recipient counts as
+finished once a channel accepted the notification — or may have: a send
+that timed out after leaving is logged as 'unknown' and never repeated — or
+they have no channel that could.  A retry (after a crash, a failed chunk, or
+for transient provider failures) skips them, so nobody is notified twice and
+a large school never restarts from the beginning.
+
+Tokens FCM reports as unregistered or invalid are collected across the job
+and deactivated in one batched UPDATE (app.services.push_devices), so they
+are not routed to again.
+
+Non-urgent notifications are coalesced per user and channel
+(app.services.digests): the first in NOTIFY_DIGEST_WINDOW_SECONDS goes out,
+later ones wait, and recipients inside their quiet hours wait until those
+end.  Waiting recipients count as finished for the announcement; the
+flush_digests cron job sends each of them one digest when it is due.
+
+Jobs run on the queue for their priority class (app.tasks.queues).  While an
+urgent fan-out is running, normal and info fan-outs pause before each chunk
+— for at most NOTIFY_PREEMPT_MAX_WAIT_SECONDS, so they are slowed, never
+starved — leaving provider quota to the urgent one.  Time from
+create_announcement to the first provider call is recorded per queue against
+NOTIFY_SLO_<PRIORITY>_SECONDS.  These metrics live in the worker process;
+it publishes them with the rest (app.services.metrics_export), so GET
+/api/metrics shows them per worker.
 """
 
 from __future__ import annotations
 
+import asyncio
 import logging
+import time
+from collections.abc import Awaitable, Callable, Sequence
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from operator import attrgetter
+from zoneinfo import ZoneInfo
+
+from arq import Retry
+from redis.asyncio import Redis
+from sqlalchemy import text
+
+from app.config import settings
+from app.database import current_route, engine
+from app.services import digests, metrics
+from app.services.digests import DigestItem, PendingDigest
+from app.services.fcm_service import FCMClient, fcm_client
+from app.services.notification_log import NotificationLogEntry, notification_log
+from app.services.notification_routing import RoutePlan, load_recipients, plan_routes, quiet_until
+from app.services.push_devices import deactivate_tokens
+from app.services.sms_service import SMSDeliveryError, SMSOutcomeUnknown, SMSRetryableError, sms_client
+from app.services.whatsapp_service import (
+    WhatsAppDeliveryError,
+    WhatsAppOutcomeUnknown,
+    WhatsAppRetryableError,
+    whatsapp_client,
+)
+from app.tasks.queues import queue_class
 
 logger = logging.getLogger(__name__)
 
+_DIGEST_RETRY_SECONDS = 60
+_URGENT_ACTIVE_KEY = "notify:urgent:active"
+
+_SENT = metrics.counter("notifications_sent_total", "Notifications handed to a provider, per channel and outcome")
+_FIRST_SEND = metrics.histogram(
+    "notification_first_send_seconds",
+    "create_announcement to the first provider call, per queue",
+    buckets=(0.5, 1, 2, 5, 10, 30, 60, 120, 300, 600, 1800),
+)
+_SLO_BREACHES = metrics.counter("notification_slo_breaches_total", "Announcements whose first send missed the queue's SLO")
+_PREEMPT_WAIT = metrics.histogram("notification_preempt_wait_seconds", "Time lower-class chunks paused for urgent fan-outs")
+
+
+@dataclass(frozen=True)
+class Notification:
+    title: str
+    body: str
+    data: dict[str, str]
+    priority: str = "normal"
+    send_sms: bool = False
+    send_whatsapp: bool = False
+    school_timezone: str = "Africa/Johannesburg"
+
+    @property
+    def text(self) -> str:
+        """Plain-text form for SMS and WhatsApp."""
+        return f"{self.title}: {self.body}"
+
+    async def log(
+        self,
+        user_id: str,
+        channel: str,
+        status: str,
+        provider_message_id: str | None = None,
+        error_message: str | None = None,
+    ) -> None:
+        await notification_log.record(
+            NotificationLogEntry(
+                user_id=user_id,
+                channel=channel,
+                status=status,
+                title=self.title,
+                body=self.body,
+                reference_type="announcement" if "announcement_id" in self.data else "announcement_digest",
+                reference_id=self.data.get("announcement_id"),
+                provider_message_id=provider_message_id,
+                error_message=error_message,
+            )
+        )
+
+
+@dataclass
+class FanOutResult:
+    done: int = 0  # recipients checkpointed
+    sent: dict[str, int] = field(default_factory=lambda: {"push": 0, "whatsapp": 0, "sms": 0})
+    invalid_tokens: list[str] = field(default_factory=list)
+    retry: list[str] = field(default_factory=list)  # recipients with only transient failures
+    held: int = 0  # recipients waiting for a digest
+    first_send_at: float | None = None  # epoch seconds of the first provider call
+
+
+# user_ids → who gets what (app.services.notification_routing)
+Router = Callable[[list[str]], Awaitable[RoutePlan]]
+# Records user_ids as finished
+Checkpoint = Callable[[list[str]], Awaitable[None]]
+
+
+def _batches(items: Sequence[str], size: int) -> list[list[str]]:
+    return [list(items[i : i + size]) for i in range(0, len(items), size)]
+
+
+def _retry_delay(job_try: int) -> float:
+    """5s, 10s, 20s, ... capped at 5 minutes."""
+    return min(5 * 2 ** (job_try - 1), 300)
+
+
+async def _send_push(
+    plan: RoutePlan,
+    notification: Notification,
+    client: FCMClient,
+    delivered: set[str],
+    failed: set[str],
+    result: FanOutResult,
+) -> None:
+    owner = {token: user_id for user_id, tokens in plan.push.items() for token in tokens}
+    for batch in _batches(list(owner), settings.FCM_MULTICAST_SIZE):
+        result.first_send_at = result.first_send_at or time.time()
+        sent = await client.send_multicast(batch, notification.title, notification.body, notification.data)
+        delivered.update(owner[t] for t in sent.sent)
+        delivered.update(owner[t] for t in sent.unknown)  # may have arrived; a resend could duplicate it
+        failed.update(owner[t] for t in sent.failed)
+        result.sent["push"] += len(sent.sent)
+        result.invalid_tokens.extend(sent.invalid)
+        _SENT.inc(len(sent.sent), channel="push", outcome="sent")
+        _SENT.inc(len(sent.invalid), channel="push", outcome="invalid")
+        _SENT.inc(len(sent.failed), channel="push", outcome="failed")
+        _SENT.inc(len(sent.unknown), channel="push", outcome="unknown")
+        _SENT.inc(len(sent.rejected), channel="push", outcome="rejected")
+        for token in sent.sent:
+            await notification.log(owner[token], "push", "sent", provider_message_id=sent.message_ids.get(token))
+        for token in sent.unknown:
+            await notification.log(owner[token], "push", "unknown", error_message=sent.errors.get(token))
+        if sent.rejected:
+            logger.warning("FCM rejected the message tokens=%d error=%s", len(sent.rejected), sent.errors[sent.rejected[0]])
+        for token in sent.invalid + sent.failed + sent.rejected:
+            await notification.log(owner[token], "push", "failed", error_message=sent.errors.get(token))
+
+
+async def _send_text(
+    channel: str,
+    phones: dict[str, str],
+    notification: Notification,
+    delivered: set[str],
+    failed: set[str],
+    result: FanOutResult,
+) -> None:
+    if channel == "sms":
+        send, retryable, unknown, permanent = sms_client.send, SMSRetryableError, SMSOutcomeUnknown, SMSDeliveryError
+    else:
+        send, retryable, unknown, permanent = (
+            whatsapp_client.send, WhatsAppRetryableError, WhatsAppOutcomeUnknown, WhatsAppDeliveryError
+        )
+
+    async def send_one(user_id: str, phone: str) -> None:
+        result.first_send_at = result.first_send_at or time.time()
+        try:
+            message_id = await send(phone, notification.text)
+        except retryable as exc:
+            failed.add(user_id)
+            _SENT.inc(channel=channel, outcome="failed")
+            await notification.log(user_id, channel, "failed", error_message=str(exc))
+        except unknown as exc:
+            # May have been sent; a resend could duplicate it.
+            delivered.add(user_id)
+            logger.warning("%s outcome unknown user=%s error=%s", channel, user_id, exc)
+            _SENT.inc(channel=channel, outcome="unknown")
+            await notification.log(user_id, channel, "unknown", error_message=str(exc))
+        except permanent as exc:
+            logger.warning("%s rejected user=%s error=%s", channel, user_id, exc)
+            _SENT.inc(channel=channel, outcome="invalid")
+            await notification.log(user_id, channel, "failed", error_message=str(exc))
+        else:
+            delivered.add(user_id)
+            result.sent[channel] += 1
+            _SENT.inc(channel=channel, outcome="sent")
+            await notification.log(user_id, channel, "sent", provider_message_id=message_id)
+
+    await asyncio.gather(*(send_one(user_id, phone) for user_id, phone in phones.items()))
+
+
+async def fan_out(
+    recipient_ids: Sequence[str],
+    notification: Notification,
+    route: Router,
+    checkpoint: Checkpoint,
+    client: FCMClient = fcm_client,
+) -> FanOutResult:
+    """Send *notification* to *recipient_ids* on their routed channels, chunk by chunk.
+
+    A chunk that fails (a database, Redis or provider error) stops its other
+    sends; its recipients not yet notified go to result.retry, the rest are
+    checkpointed as usual.  Only a failing checkpoint raises, after
+    cancelling the other chunks.
+    """
+    result = FanOutResult()
+    sem = asyncio.Semaphore(settings.NOTIFY_CONCURRENCY)
+
+    async def run_chunk(chunk: list[str]) -> None:
+        async with sem:
+            plan: RoutePlan | None = None
+            delivered: set[str] = set()
+            failed: set[str] = set()
+            try:
+                plan = await route(chunk)
+                result.held += len(plan.held)
+                async with asyncio.TaskGroup() as tg:
+                    tg.create_task(_send_push(plan, notification, client, delivered, failed, result))
+                    tg.create_task(_send_text("whatsapp", plan.whatsapp, notification, delivered, failed, result))
+                    tg.create_task(_send_text("sms", plan.sms, notification, delivered, failed, result))
+            except Exception:
+                logger.exception("Notification chunk failed recipients=%d", len(chunk))
+                # Until the chunk is routed, anyone in it may still be owed a notification.
+                failed = set(chunk) if plan is None else {*plan.push, *plan.whatsapp, *plan.sms}
+
+            retry = failed - delivered
+            done = [user_id for user_id in chunk if user_id not in retry]
+            await checkpoint(done)
+            result.done += len(done)
+            result.retry.extend(retry)
+
+    async with asyncio.TaskGroup() as tg:
+        for chunk in _batches(recipient_ids, settings.NOTIFY_CHUNK_SIZE):
+            tg.create_task(run_chunk(chunk))
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Database lookups (raw SQL on the engine; the worker has no request session)
+# ---------------------------------------------------------------------------
+
+_ANNOUNCEMENT_SQL = """
+    SELECT a.title, a.body, a.priority, a.channel_id, a.send_sms, a.send_whatsapp, s.timezone
+    FROM announcements a JOIN schools s ON s.id = a.school_id
+    WHERE a.id = :id
+"""
+
+
+async def _load_notification(announcement_id: str, school_id: str) -> Notification | None:
+    async with engine.begin() as conn:
+        await conn.execute(text("SELECT set_config('app.current_school_id', :sid, true)"), {"sid": school_id})
+        row = (await conn.execute(text(_ANNOUNCEMENT_SQL), {"id": announcement_id})).first()
+    if row is None:
+        return None
+    return Notification(
+        title=row.title,
+        body=row.body[:200],
+        data={
+            "type": "announcement.new",
+            "announcement_id": announcement_id,
+            "channel_id": str(row.channel_id),
+            "priority": row.priority,
+        },
+        priority=row.priority,
+        send_sms=row.send_sms,
+        send_whatsapp=row.send_whatsapp,
+        school_timezone=row.timezone,
+    )
+
+
+async def _coalesce(redis: Redis, school_id: str, notification: Notification, plan: RoutePlan) -> None:
+    """Move recipients in quiet hours or an open window from *plan* to their digests."""
+    item = DigestItem(
+        announcement_id=notification.data["announcement_id"],
+        channel_id=notification.data["channel_id"],
+        priority=notification.priority,
+        title=notification.title,
+        body=notification.body,
+    )
+    held: set[str] = set()
+    for resume_at, by_channel in plan.deferred.items():
+        for channel, user_ids in by_channel.items():
+            await digests.hold(redis, school_id, channel, user_ids, [item], resume_at)
+            held.update(user_ids)
+    plan.deferred = {}
+
+    if notification.priority != "urgent":
+        for channel, targets in (("push", plan.push), ("whatsapp", plan.whatsapp), ("sms", plan.sms)):
+            admitted = await digests.admit(redis, school_id, channel, list(targets), item)
+            for user_id in list(targets):
+                if user_id not in admitted:
+                    del targets[user_id]
+                    held.add(user_id)
+
+    # Held on one channel but still sent on another is not waiting.
+    plan.held = [u for u in held if u not in plan.push and u not in plan.whatsapp and u not in plan.sms]
+
+
+async def _yield_to_urgent(redis: Redis, priority: str) -> None:
+    """Pause while an urgent fan-out is running, up to NOTIFY_PREEMPT_MAX_WAIT_SECONDS."""
+    started = time.monotonic()
+    while await redis.exists(_URGENT_ACTIVE_KEY):
+        if time.monotonic() - started >= settings.NOTIFY_PREEMPT_MAX_WAIT_SECONDS:
+            break
+        await asyncio.sleep(0.5)
+    waited = time.monotonic() - started
+    if waited >= 0.5:
+        _PREEMPT_WAIT.observe(waited, priority=priority)
+
+
+def _router(redis: Redis, school_id: str, notification: Notification) -> Router:
+    async def route(user_ids: list[str]) -> RoutePlan:
+        if notification.priority == "urgent":
+            await redis.set(_URGENT_ACTIVE_KEY, 1, ex=settings.NOTIFY_PREEMPT_TTL_SECONDS)
+        else:
+            await _yield_to_urgent(redis, notification.priority)
+        recipients, devices = await load_recipients(school_id, user_ids)
+        plan = plan_routes(
+            recipients,
+            devices,
+            school_timezone=notification.school_timezone,
+            priority=notification.priority,
+            send_sms=notification.send_sms,
+            send_whatsapp=notification.send_whatsapp,
+        )
+        await _coalesce(redis, school_id, notification, plan)
+        return plan
+
+    return route
+
+
+# ---------------------------------------------------------------------------
+# Task
+# ---------------------------------------------------------------------------
+
+
+def _record_first_send(announcement_id: str, priority: str, latency: float) -> None:
+    queue = queue_class(priority)
+    _FIRST_SEND.observe(latency, queue=queue)
+    slo = {
+        "urgent": settings.NOTIFY_SLO_URGENT_SECONDS,
+        "info": settings.NOTIFY_SLO_INFO_SECONDS,
+    }.get(priority, settings.NOTIFY_SLO_NORMAL_SECONDS)
+    if latency > slo:
+        _SLO_BREACHES.inc(queue=queue)
+        logger.warning(
+            "Notification SLO missed announcement=%s queue=%s first_send=%.1fs slo=%.0fs",
+            announcement_id, queue, latency, slo,
+        )
+
 
 async def send_announcement_notifications(
     ctx: dict,
     announcement_id: str,
+    school_id: str,
     recipient_ids: list[str],
+    created_at: float | None = None,
 ) -> None:
-    """Dispatch push notifications for a newly published announcement.
+    """Notify every recipient of a newly published announcement.
+
+    *created_at* (epoch seconds) is when the announcement was committed; the
+    first try measures first-send latency from it.
 
-    Priority:
-      1. FCM push (primary)
-      2. WhatsApp Business API (if priority == 'urgent' and user opted in)
-      3. SMS fallback (if no registered push device)
+    arq fails a job for good on anything but Retry, and the outbox event is
+    gone by now, so an unexpected error is retried too: the checkpoint keeps
+    the next try to the recipients not yet notified.
     """
+    current_route.set("task:send_announcement_notifications")
+    redis = ctx["redis"]
+    job_try: int = ctx.get("job_try", 1)
+    done_key = f"notify:{announcement_id}:done"
+
+    async def checkpoint(user_ids: list[str]) -> None:
+        if user_ids:
+            async with redis.pipeline(transaction=True) as pipe:
+                pipe.sadd(done_key, *user_ids)
+                pipe.expire(done_key, settings.NOTIFY_CHECKPOINT_TTL_SECONDS)
+                await pipe.execute()
+
+    try:
+        already = {member.decode() for member in await redis.smembers(done_key)}
+        pending = [user_id for user_id in recipient_ids if user_id not in already]
+        if not pending:
+            return
+
+        notification = await _load_notification(announcement_id, school_id)
+        if notification is None:
+            logger.warning("Announcement %s not found; notifications skipped", announcement_id)
+            return
+
+        result = await fan_out(pending, notification, _router(redis, school_id, notification), checkpoint)
+        await deactivate_tokens(result.invalid_tokens)
+    except Exception:
+        if job_try >= settings.NOTIFY_MAX_TRIES:
+            raise
+        logger.exception("Announcement notifications failed announcement=%s try=%d; retrying", announcement_id, job_try)
+        raise Retry(defer=_retry_delay(job_try))
+
+    if created_at is not None and job_try == 1 and result.first_send_at is not None:
+        _record_first_send(announcement_id, notification.priority, result.first_send_at - created_at)
+
     logger.info(
-        "[ARQ stub] send_announcement_notifications announcement=%s recipients=%d",
-        announcement_id,
-        len(recipient_ids),
+        "Announcement notifications announcement=%s try=%d recipients=%d skipped=%d "
+        "push=%d whatsapp=%d sms=%d invalid_tokens=%d held=%d retry=%d",
+        announcement_id, job_try, len(recipient_ids), len(recipient_ids) - len(pending),
+        result.sent["push"], result.sent["whatsapp"], result.sent["sms"], len(result.invalid_tokens),
+        result.held, len(result.retry),
+    )
+
+    if result.retry:
+        if job_try >= settings.NOTIFY_MAX_TRIES:
+            logger.error(
+                "Announcement notifications abandoned announcement=%s recipients=%d", announcement_id, len(result.retry)
+            )
+            return
+        raise Retry(defer=_retry_delay(job_try))
+
+
+# ---------------------------------------------------------------------------
+# Digests
+# ---------------------------------------------------------------------------
+
+_SCHOOL_TIMEZONE_SQL = "SELECT timezone FROM schools WHERE id = :id"
+
+
+def _digest_notification(items: list[DigestItem]) -> Notification:
+    if len(items) == 1:
+        item = items[0]
+        return Notification(
+            title=item.title,
+            body=item.body,
+            data={
+                "type": "announcement.new",
+                "announcement_id": item.announcement_id,
+                "channel_id": item.channel_id,
+                "priority": item.priority,
+            },
+            priority=item.priority,
+        )
+    return Notification(
+        title=f"{len(items)} new announcements",
+        body="; ".join(item.title for item in items)[:200],
+        data={"type": "announcement.digest", "announcement_ids": ",".join(item.announcement_id for item in items)},
     )
-    # TODO (Prompt 6): implement FCM + WhatsApp + SMS dispatch with retries
 
 
-class WorkerSettings:
-    """ARQ worker settings — wired up in Prompt 6."""
+def _plan_router(plan: RoutePlan) -> Router:
+    async def route(user_ids: list[str]) -> RoutePlan:
+        chunk = set(user_ids)
+        return RoutePlan(
+            push={u: tokens for u, tokens in plan.push.items() if u in chunk},
+            whatsapp={u: phone for u, phone in plan.whatsapp.items() if u in chunk},
+            sms={u: phone for u, phone in plan.sms.items() if u in chunk},
+        )
+
+    return route
+
+
+async def _no_checkpoint(user_ids: list[str]) -> None:
+    pass
+
+
+async def _send_digests(redis: Redis, school_id: str, pending: list[PendingDigest]) -> int:
+    """Send claimed digests and settle every one of them; returns recipients sent.
+
+    If this raises, the digests stay claimed until their lease runs out.
+    """
+    async with engine.connect() as conn:
+        school_timezone = (await conn.execute(text(_SCHOOL_TIMEZONE_SQL), {"id": school_id})).scalar()
+    if school_timezone is None:
+        await digests.finish(redis, pending)
+        return 0
+    recipients, devices = await load_recipients(school_id, list({d.user_id for d in pending}))
+    now = datetime.now(timezone.utc)
+    local_now = now.astimezone(ZoneInfo(school_timezone))
+    requeued: list[PendingDigest] = []  # held again; everything else is finished
+
+    # Recipients with the same items on the same channel share one notification.
+    groups: dict[tuple[str, tuple[str, ...]], tuple[list[DigestItem], RoutePlan, list[PendingDigest]]] = {}
+    for d in pending:
+        r = recipients.get(d.user_id)
+        if r is None or not r.enabled(d.channel, default=d.channel != "whatsapp"):
+            continue  # deactivated, or the channel was switched off since
+        window = r.window(d.channel)
+        resume = quiet_until(local_now, window) if window is not None else None
+        if resume is not None:
+            await digests.hold(redis, school_id, d.channel, [d.user_id], d.items, resume.astimezone(timezone.utc))
+            requeued.append(d)
+            continue
+
+        items = sorted(d.items, key=attrgetter("announcement_id"))
+        key = (d.channel, tuple(item.announcement_id for item in items))
+        _, plan, members = groups.setdefault(key, (items, RoutePlan(), []))
+        members.append(d)
+        if d.channel == "push" and devices.get(d.user_id):
+            plan.push[d.user_id] = devices[d.user_id]
+        elif d.channel == "whatsapp" and r.phone:
+            plan.whatsapp[d.user_id] = r.phone
+        elif d.channel == "sms" and r.phone:
+            plan.sms[d.user_id] = r.phone
+
+    sent = 0
+    for (channel, _), (items, plan, members) in groups.items():
+        user_ids = [*plan.push, *plan.whatsapp, *plan.sms]
+        result = await fan_out(user_ids, _digest_notification(items), _plan_router(plan), _no_checkpoint)
+        await deactivate_tokens(result.invalid_tokens)
+        retry = set(result.retry)
+        await digests.open_windows(redis, school_id, channel, [u for u in user_ids if u not in retry], "digest")
+        if retry:
+            await digests.hold(redis, school_id, channel, retry, items, now + timedelta(seconds=_DIGEST_RETRY_SECONDS))
+            requeued.extend(d for d in members if d.user_id in retry)
+        sent += len(user_ids) - len(retry)
+
+    await digests.release(redis, requeued)
+    requeued_ids = {id(d) for d in requeued}
+    await digests.finish(redis, [d for d in pending if id(d) not in requeued_ids])
+    return sent
+
 
-    functions = [send_announcement_notifications]
-    # redis_settings will be added in Prompt 6
+async def flush_digests(ctx: dict) -> None:
+    """Send every digest that has come due (cron)."""
+    current_route.set("task:flush_digests")
+    redis = ctx["redis"]
+    claimed = sent = 0
+    while True:
+        pending = await digests.claim_due(redis, limit=settings.NOTIFY_DIGEST_FLUSH_BATCH)
+        by_school: dict[str, list[PendingDigest]] = {}
+        for d in pending:
+            by_school.setdefault(d.school_id, []).append(d)
+        for school_id, batch in by_school.items():
+            sent += await _send_digests(redis, school_id, batch)
+        claimed += len(pending)
+        if len(pending) < settings.NOTIFY_DIGEST_FLUSH_BATCH:
+            break
+    if claimed:
+        logger.info("Digests flushed claimed=%d sent=%d", claimed, sent)
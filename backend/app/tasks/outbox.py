@@ -0,0 +1,286 @@
+"""Transactional outbox relay.
+
+create_announcement and the message ingest path write an outbox row in the
+same transaction as the announcement or message, so a side effect is
+recorded if and only if the write committed, and the request returns as
+soon as it has.  This process drains the outbox:
+
+  announcement.created   resolve the channel's recipients, publish the SSE
+                         event to them and enqueue
+                         send_announcement_notifications on the queue for
+                         the announcement's priority (app.tasks.queues)
+  message.created        publish the SSE event to the conversation's other,
+                         non-blocked participants
+
+Rows are claimed in id order with FOR UPDATE SKIP LOCKED, OUTBOX_BATCH_SIZE
+per transaction, and deleted in that transaction once handled, so several
+relays can run side by side.  Delivery is at-least-once: the notification
+job id makes a repeated enqueue a no-op, and a repeated SSE event is
+harmless.  A row whose handler fails is retried with backoff; after
+OUTBOX_MAX_ATTEMPTS it stays in the table with its last error.
+
+An insert trigger NOTIFYs 'outbox' on commit (migration 0008), so the relay
+wakes as soon as there is work; it also polls every
+OUTBOX_POLL_INTERVAL_SECONDS in case a notification is missed.
+
+Run with:
+    python -m app.tasks.outbox
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import signal
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from arq import create_pool
+from arq.connections import ArqRedis, RedisSettings
+from redis.asyncio import Redis
+from sqlalchemy import Row, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.config import settings
+from app.database import current_route, engine
+from app.services import metrics
+from app.services.metrics_export import metrics_publisher
+from app.services.sse_service import publish
+from app.tasks.queues import notification_queue
+
+logger = logging.getLogger(__name__)
+
+_MAX_RETRY_DELAY = 300  # seconds
+
+_RELAYED = metrics.counter("outbox_relayed_total", "Outbox rows handled, per topic and outcome")
+_LAG = metrics.histogram("outbox_lag_seconds", "Outbox row commit to relay")
+
+# ---------------------------------------------------------------------------
+# SQL
+# ---------------------------------------------------------------------------
+
+_CLAIM_SQL = text(
+    """
+    SELECT id, school_id, topic, payload, attempts, extract(epoch FROM created_at) AS created_at
+    FROM outbox
+    WHERE available_at <= now() AND attempts < :max_attempts
+    ORDER BY id
+    LIMIT :limit
+    FOR UPDATE SKIP LOCKED
+    """
+)
+
+_DELETE_SQL = text("DELETE FROM outbox WHERE id = ANY(CAST(:ids AS bigint[]))")
+
+_FAILED_SQL = text(
+    """
+    UPDATE outbox
+    SET attempts = attempts + 1,
+        last_error = :error,
+        available_at = now() + make_interval(secs => CAST(:delay AS double precision))
+    WHERE id = :id
+    """
+)
+
+_CHANNEL_SQL = text("SELECT type, grade_id, class_id FROM channels WHERE id = :id")
+
+# Parents of learners in the channel's audience (cf. get_stats in app.api.announcements)
+_RECIPIENTS_SQL = {
+    "school": """
+        SELECT DISTINCT lg.guardian_id
+        FROM learner_guardians lg
+        JOIN learners l ON l.id = lg.learner_id
+        JOIN users u ON u.id = lg.guardian_id
+        WHERE l.school_id = :school_id AND u.is_active
+    """,
+    "grade": """
+        SELECT DISTINCT lg.guardian_id
+        FROM learner_guardians lg
+        JOIN class_learners cl ON cl.learner_id = lg.learner_id
+        JOIN users u ON u.id = lg.guardian_id
+        WHERE cl.class_id IN (SELECT id FROM classes WHERE grade_id = :grade_id) AND u.is_active
+    """,
+    "class": """
+        SELECT DISTINCT lg.guardian_id
+        FROM learner_guardians lg
+        JOIN class_learners cl ON cl.learner_id = lg.learner_id
+        JOIN users u ON u.id = lg.guardian_id
+        WHERE cl.class_id = :class_id AND u.is_active
+    """,
+}
+
+_PARTICIPANTS_SQL = text(
+    """
+    SELECT user_id FROM conversation_participants
+    WHERE conversation_id = :conversation_id AND user_id <> :sender_id AND NOT is_blocked
+    """
+)
+
+
+# ---------------------------------------------------------------------------
+# Handlers
+# ---------------------------------------------------------------------------
+
+Handler = Callable[[AsyncConnection, Row], Awaitable[None]]
+
+
+class OutboxRelay:
+    def __init__(self, redis: Redis, arq: ArqRedis) -> None:
+        self._redis = redis
+        self._arq = arq
+        self._handlers: dict[str, Handler] = {
+            "announcement.created": self._announcement_created,
+            "message.created": self._message_created,
+        }
+
+    async def _announcement_created(self, conn: AsyncConnection, row: Row) -> None:
+        payload: dict[str, Any] = row.payload
+        channel = (await conn.execute(_CHANNEL_SQL, {"id": payload["channel_id"]})).first()
+        if channel is None:
+            logger.warning("Outbox: channel gone announcement=%s", payload["announcement_id"])
+            return
+        sql = _RECIPIENTS_SQL.get(channel.type, _RECIPIENTS_SQL["class"])  # "custom" channels target a class
+        params = {"school_id": row.school_id, "grade_id": channel.grade_id, "class_id": channel.class_id}
+        used = {k: v for k, v in params.items() if f":{k}" in sql}
+        recipient_ids = [str(user_id) for user_id in (await conn.execute(text(sql), used)).scalars()]
+
+        await publish(
+            self._redis,
+            recipient_ids,
+            {
+                "type": "announcement.new",
+                "announcement_id": payload["announcement_id"],
+                "channel_id": payload["channel_id"],
+                "title": payload["title"],
+                "priority": payload["priority"],
+            },
+        )
+        # The job id makes a repeated enqueue (relay crash before delete) a no-op.
+        await self._arq.enqueue_job(
+            "send_announcement_notifications",
+            payload["announcement_id"],
+            str(row.school_id),
+            recipient_ids,
+            payload["created_at"],
+            _job_id=f"notify:{payload['announcement_id']}",
+            _queue_name=notification_queue(payload["priority"]),
+        )
+
+    async def _message_created(self, conn: AsyncConnection, row: Row) -> None:
+        payload: dict[str, Any] = row.payload
+        result = await conn.execute(
+            _PARTICIPANTS_SQL,
+            {"conversation_id": payload["conversation_id"], "sender_id": payload["sender_id"]},
+        )
+        await publish(
+            self._redis,
+            [str(user_id) for user_id in result.scalars()],
+            {
+                "type": "message.new",
+                "conversation_id": payload["conversation_id"],
+                "message_id": payload["message_id"],
+            },
+        )
+
+    # ------------------------------------------------------------------
+    # Draining
+    # ------------------------------------------------------------------
+
+    async def drain_once(self) -> int:
+        """Claim and handle one batch; returns the number of rows claimed."""
+        async with engine.begin() as conn:
+            rows = (
+                await conn.execute(
+                    _CLAIM_SQL, {"max_attempts": settings.OUTBOX_MAX_ATTEMPTS, "limit": settings.OUTBOX_BATCH_SIZE}
+                )
+            ).all()
+            handled: list[int] = []
+            for row in rows:
+                handler = self._handlers.get(row.topic)
+                try:
+                    if handler is None:
+                        raise ValueError(f"unknown outbox topic {row.topic!r}")
+                    # A savepoint per row: a failed lookup must not abort the batch.
+                    async with conn.begin_nested():
+                        await conn.execute(
+                            text("SELECT set_config('app.current_school_id', :sid, true)"), {"sid": str(row.school_id)}
+                        )
+                        await handler(conn, row)
+                except Exception as exc:
+                    delay = float(min(2**row.attempts, _MAX_RETRY_DELAY))
+                    _RELAYED.inc(topic=row.topic, outcome="failed")
+                    logger.exception("Outbox row failed id=%d topic=%s attempt=%d", row.id, row.topic, row.attempts + 1)
+                    await conn.execute(_FAILED_SQL, {"id": row.id, "error": f"{type(exc).__name__}: {exc}"[:1000], "delay": delay})
+                    if row.attempts + 1 >= settings.OUTBOX_MAX_ATTEMPTS:
+                        logger.error("Outbox row abandoned id=%d topic=%s", row.id, row.topic)
+                else:
+                    handled.append(row.id)
+                    _RELAYED.inc(topic=row.topic, outcome="relayed")
+                    _LAG.observe(max(time.time() - float(row.created_at), 0.0), topic=row.topic)
+            if handled:
+                await conn.execute(_DELETE_SQL, {"ids": handled})
+        return len(rows)
+
+
+# ---------------------------------------------------------------------------
+# Process
+# ---------------------------------------------------------------------------
+
+
+async def run(stop: asyncio.Event) -> None:
+    current_route.set("outbox_relay")  # pool metrics label
+    redis = Redis.from_url(settings.REDIS_URL, decode_responses=False)
+    arq = await create_pool(RedisSettings.from_dsn(settings.REDIS_URL))
+    relay = OutboxRelay(redis, arq)
+    metrics_publisher.start(redis, "outbox_relay")
+    wakeup = asyncio.Event()
+    stop_waiter = asyncio.create_task(stop.wait())
+    stop_waiter.add_done_callback(lambda _: wakeup.set())
+
+    try:
+        async with engine.connect() as listen_conn:
+            raw = await listen_conn.get_raw_connection()
+            await raw.driver_connection.add_listener("outbox", lambda *_: wakeup.set())
+            logger.info("Outbox relay started")
+
+            delay = settings.OUTBOX_POLL_INTERVAL_SECONDS
+            while not stop.is_set():
+                wakeup.clear()
+                try:
+                    claimed = await relay.drain_once()
+                    delay = settings.OUTBOX_POLL_INTERVAL_SECONDS
+                except Exception:
+                    claimed = 0
+                    delay = min(max(delay * 2, 1.0), 30.0)
+                    logger.exception("Outbox drain failed; retrying in %.1fs", delay)
+                if claimed == settings.OUTBOX_BATCH_SIZE:
+                    continue  # more waiting
+                try:
+                    await asyncio.wait_for(wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+    finally:
+        stop_waiter.cancel()
+        await metrics_publisher.aclose()
+        await arq.aclose()
+        await redis.aclose()
+        await engine.dispose()
+        logger.info("Outbox relay stopped")
+
+
+def main() -> None:
+    logging.basicConfig(level=settings.LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+
+    async def _main() -> None:
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        await run(stop)
+
+    asyncio.run(_main())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""ARQ cron job: monthly partition maintenance.
+
+messages, notification_log and audit_log are range-partitioned by month
+(migration 0003).  This job:
+
+  1. pre-creates partitions PARTITION_PREMAKE_MONTHS ahead, so inserts never
+     hit a month with no partition;
+  2. detaches partitions older than the table's retention setting.
+
+Detaching uses DETACH PARTITION ... CONCURRENTLY, which only takes a
+SHARE UPDATE EXCLUSIVE lock on the parent, so reads and writes keep going.
+Detached partitions are left as ordinary tables (<table>_pYYYYMM) for
+archiving; dropping them is an operator decision.
+"""
+
+from __future__ import annotations
+
+import logging
+from datetime import date, datetime, timezone
+
+from sqlalchemy import text
+
+from app.config import settings
+from app.database import engine
+
+logger = logging.getLogger(__name__)
+
+# table → retention in months (0 = keep forever)
+PARTITIONED_TABLES: dict[str, int] = {
+    "messages": settings.MESSAGES_RETENTION_MONTHS,
+    "notification_log": settings.NOTIFICATION_LOG_RETENTION_MONTHS,
+    "audit_log": settings.AUDIT_LOG_RETENTION_MONTHS,
+}
+
+
+def _month_start(months_ago: int) -> date:
+    today = datetime.now(timezone.utc).date()
+    index = today.year * 12 + today.month - 1 - months_ago
+    return date(index // 12, index % 12 + 1, 1)
+
+
+async def ensure_partitions() -> int:
+    """Create any missing partitions up to PARTITION_PREMAKE_MONTHS ahead. Returns how many were created."""
+    created = 0
+    async with engine.begin() as conn:
+        for table in PARTITIONED_TABLES:
+            created += await conn.scalar(
+                text("SELECT create_monthly_partitions(:table, :from_month, :to_month)"),
+                {
+                    "table": table,
+                    "from_month": _month_start(0),
+                    "to_month": _month_start(-settings.PARTITION_PREMAKE_MONTHS),
+                },
+            )
+    return created
+
+
+async def detach_expired_partitions() -> list[str]:
+    """Detach partitions whose month is entirely older than the table's retention."""
+    detached: list[str] = []
+    # DETACH ... CONCURRENTLY cannot run inside a transaction block.
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        for table, retention in PARTITIONED_TABLES.items():
+            if retention <= 0:
+                continue
+            cutoff = _month_start(retention).strftime("%Y%m")
+            rows = await conn.execute(
+                text(
+                    "SELECT c.relname FROM pg_inherits i "
+                    "JOIN pg_class c ON c.oid = i.inhrelid "
+                    "WHERE i.inhparent = CAST(:table AS regclass)"
+                ),
+                {"table": table},
+            )
+            for (name,) in rows.all():
+                month = name.rsplit("_p", 1)[-1]
+                if month.isdigit() and month < cutoff:
+                    await conn.execute(text(f'ALTER TABLE {table} DETACH PARTITION "{name}" CONCURRENTLY'))
+                    detached.append(name)
+    return detached
+
+
+async def maintain_partitions(ctx: dict) -> None:
+    created = await ensure_partitions()
+    detached = await detach_expired_partitions()
+    logger.info("Partition maintenance created=%d detached=%s", created, detached or "none")
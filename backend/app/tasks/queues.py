@@ -0,0 +1,28 @@
+"""ARQ queue selection.
+
+Work is split across three queues, each consumed by its own worker class in
+app.tasks.worker with its own max_jobs, so a large info fan-out can never sit
+in front of a school closure or an OTP:
+
+  urgent    ARQ_QUEUE_URGENT    urgent announcements, OTP SMS
+  default   ARQ_QUEUE_DEFAULT   normal announcements, digests, maintenance crons
+  bulk      ARQ_QUEUE_BULK      info announcements
+"""
+
+from __future__ import annotations
+
+from app.config import settings
+
+
+def queue_class(priority: str) -> str:
+    """Queue class ('urgent' | 'default' | 'bulk') for an announcement priority."""
+    return {"urgent": "urgent", "info": "bulk"}.get(priority, "default")
+
+
+def notification_queue(priority: str) -> str:
+    """ARQ queue name for an announcement's notification job."""
+    return {
+        "urgent": settings.ARQ_QUEUE_URGENT,
+        "default": settings.ARQ_QUEUE_DEFAULT,
+        "bulk": settings.ARQ_QUEUE_BULK,
+    }[queue_class(priority)]
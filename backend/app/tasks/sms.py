@@ -0,0 +1,53 @@
+"""ARQ tasks for SMS delivery.
+
+/api/auth/otp/request stores the code and enqueues send_otp_sms, so the
+endpoint returns as soon as the job is queued.  The job carries only the
+phone number: arq stores job arguments in Redis and keeps them with the
+result, so the code is read from otp_state:<phone> when the SMS goes out,
+and nothing is sent once it has been consumed, burned or has expired.
+Provider failures before the SMS left are retried with exponential backoff
+(one that may have been sent is not, so the code never arrives twice); an
+OTP is only valid for OTP_EXPIRY_MINUTES, so retries stop once the code
+would have expired.
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+
+from arq import Retry
+
+from app.config import settings
+from app.services.auth_service import pending_otp
+from app.services.sms_service import SMSDeliveryError, SMSOutcomeUnknown, SMSRetryableError, otp_message, sms_client
+
+logger = logging.getLogger(__name__)
+
+
+def _backoff(job_try: int) -> float:
+    """1s, 2s, 4s, ... capped at 30s."""
+    return min(2 ** (job_try - 1), 30)
+
+
+async def send_otp_sms(ctx: dict, phone: str, issued_at: float) -> None:
+    job_try: int = ctx.get("job_try", 1)
+    otp = await pending_otp(phone, ctx["redis"])
+    if otp is None:
+        logger.info("OTP SMS skipped phone=%s: code already used or expired", phone)
+        return
+    try:
+        await sms_client.send(phone, otp_message(otp))
+    except SMSRetryableError as exc:
+        delay = _backoff(job_try)
+        expires_at = issued_at + settings.OTP_EXPIRY_MINUTES * 60
+        if job_try >= settings.SMS_MAX_TRIES or time.time() + delay >= expires_at:
+            logger.error("OTP SMS abandoned phone=%s tries=%d error=%s", phone, job_try, exc)
+            return
+        logger.warning("OTP SMS failed phone=%s try=%d error=%s; retrying in %ss", phone, job_try, exc, delay)
+        raise Retry(defer=delay) from exc
+    except SMSOutcomeUnknown as exc:
+        # May have been sent; the user can ask for another code if it never arrives.
+        logger.warning("OTP SMS outcome unknown phone=%s error=%s; not resent", phone, exc)
+    except SMSDeliveryError as exc:
+        logger.error("OTP SMS rejected phone=%s error=%s", phone, exc)
@@ -0,0 +1,85 @@
+"""ARQ worker entrypoints, one per queue (app.tasks.queues).
+
+Run one or more processes of each:
+    arq app.tasks.worker.UrgentWorkerSettings    urgent announcements, OTP SMS
+    arq app.tasks.worker.WorkerSettings          normal announcements, digests, crons
+    arq app.tasks.worker.BulkWorkerSettings      info announcements
+
+Every class registers every function, so a job retried or re-enqueued on its
+own queue always finds a worker; max_jobs sets each queue's concurrency.
+arq reads settings from the class's own __dict__, so the shared attributes
+are repeated rather than inherited.  Each process publishes its metrics
+under the job "worker:<queue>" (app.services.metrics_export).
+"""
+
+from __future__ import annotations
+
+from collections.abc import Awaitable, Callable
+
+from arq import cron, func
+from arq.connections import RedisSettings
+
+from app.config import settings
+from app.services.fcm_service import fcm_client
+from app.services.metrics_export import metrics_publisher
+from app.services.notification_log import notification_log
+from app.services.sms_service import sms_client
+from app.services.whatsapp_service import whatsapp_client
+from app.tasks.notifications import flush_digests, send_announcement_notifications
+from app.tasks.partitions import maintain_partitions
+from app.tasks.sms import send_otp_sms
+
+
+def _startup(queue: str) -> Callable[[dict], Awaitable[None]]:
+    async def startup(ctx: dict) -> None:
+        notification_log.start()
+        metrics_publisher.start(ctx["redis"], f"worker:{queue}")
+
+    return startup
+
+
+async def shutdown(ctx: dict) -> None:
+    await metrics_publisher.aclose()
+    await notification_log.aclose()
+    await sms_client.aclose()
+    await fcm_client.aclose()
+    await whatsapp_client.aclose()
+
+
+FUNCTIONS = [
+    func(send_announcement_notifications, max_tries=settings.NOTIFY_MAX_TRIES),
+    func(send_otp_sms, max_tries=settings.SMS_MAX_TRIES),
+]
+REDIS_SETTINGS = RedisSettings.from_dsn(settings.REDIS_URL)
+
+
+class UrgentWorkerSettings:
+    queue_name = settings.ARQ_QUEUE_URGENT
+    max_jobs = settings.ARQ_URGENT_MAX_JOBS
+    functions = FUNCTIONS
+    on_startup = _startup("urgent")
+    on_shutdown = shutdown
+    redis_settings = REDIS_SETTINGS
+
+
+class WorkerSettings:
+    queue_name = settings.ARQ_QUEUE_DEFAULT
+    max_jobs = settings.ARQ_DEFAULT_MAX_JOBS
+    functions = FUNCTIONS
+    cron_jobs = [
+        # Nightly, and once at startup so a fresh deployment never runs out of partitions
+        cron(maintain_partitions, hour=2, minute=15, run_at_startup=True),
+        cron(flush_digests, second={0, 30}),
+    ]
+    on_startup = _startup("default")
+    on_shutdown = shutdown
+    redis_settings = REDIS_SETTINGS
+
+
+class BulkWorkerSettings:
+    queue_name = settings.ARQ_QUEUE_BULK
+    max_jobs = settings.ARQ_BULK_MAX_JOBS
+    functions = FUNCTIONS
+    on_startup = _startup("bulk")
+    on_shutdown = shutdown
+    redis_settings = REDIS_SETTINGS
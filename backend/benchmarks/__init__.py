@@ -0,0 +1 @@
+"""Standalone benchmarks and checks — run with ``python -m benchmarks.<name>`` from backend/."""
@@ -0,0 +1,72 @@
+"""Per-request JWT handling overhead.
+
+Compares decoding the access token twice per request (middleware, then
+get_current_user — the old path) with decoding it once in the middleware
+through the verified-token cache and reading the claims from request state.
+A pool of --users tokens is cycled so the cache sees realistic reuse.
+
+Usage (from backend/):
+    python -m benchmarks.bench_auth_overhead --iterations 20000 --users 500
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import time
+import uuid
+
+from starlette.datastructures import Headers
+
+from app.middleware.school_context import _extract_claims
+from app.services.auth_service import create_access_token, decode_token
+
+
+def _report(label: str, samples: list[float]) -> None:
+    samples.sort()
+    p99 = samples[int(len(samples) * 0.99) - 1]
+    print(
+        f"{label:<16} mean {statistics.fmean(samples):7.1f}µs  "
+        f"p50 {statistics.median(samples):7.1f}µs  p99 {p99:7.1f}µs"
+    )
+
+
+def _decode_twice(headers: Headers) -> None:
+    token = headers["authorization"][len("Bearer "):]
+    decode_token(token)["school_id"]  # middleware
+    decode_token(token)["sub"]        # get_current_user
+
+
+def _decode_once(headers: Headers) -> None:
+    state = {"auth_claims": _extract_claims(headers)}
+    state["school_id"] = state["auth_claims"]["school_id"]
+    state["auth_claims"]["sub"]       # get_current_user reads request.state
+
+
+def _measure(call, headers: list[Headers], iterations: int) -> list[float]:
+    samples = []
+    for i in range(iterations):
+        h = headers[i % len(headers)]
+        started = time.perf_counter()
+        call(h)
+        samples.append((time.perf_counter() - started) * 1e6)
+    return samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--users", type=int, default=500)
+    args = parser.parse_args()
+
+    headers = []
+    for _ in range(args.users):
+        token = create_access_token(str(uuid.uuid4()), str(uuid.uuid4()), "parent")
+        headers.append(Headers({"authorization": f"Bearer {token}"}))
+
+    _report("decode x2", _measure(_decode_twice, headers, args.iterations))
+    _report("decode once+lru", _measure(_decode_once, headers, args.iterations))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Messages/sec per worker: ORM send path vs. group-commit ingest.
+
+Seeds a throwaway school with a handful of conversations, then has
+``--clients`` concurrent senders each post ``--messages`` messages, first
+through the old ORM path (INSERT, UPDATE conversations, COMMIT, refresh)
+and then through MessageIngestor.  The school is deleted afterwards.
+
+Usage (from backend/, against a migrated database):
+    python -m benchmarks.bench_message_ingest --clients 50 --messages 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+import uuid
+
+from sqlalchemy import text
+
+from app.database import AsyncSessionLocal, engine
+from app.models.messaging import Message
+from app.services.message_ingest import MessageIngestor
+
+
+async def _seed(conversations: int) -> tuple[uuid.UUID, uuid.UUID, list[uuid.UUID]]:
+    school_id, user_id = uuid.uuid4(), uuid.uuid4()
+    conv_ids = [uuid.uuid4() for _ in range(conversations)]
+    async with engine.begin() as conn:
+        await conn.execute(text("SELECT set_config('app.current_school_id', :sid, true)"), {"sid": str(school_id)})
+        await conn.execute(
+            text("INSERT INTO schools (id, name, slug) VALUES (:id, 'Bench', :slug)"),
+            {"id": school_id, "slug": f"bench-{school_id.hex[:12]}"},
+        )
+        await conn.execute(
+            text("INSERT INTO users (id, school_id, first_name, last_name, role) VALUES (:id, :sid, 'B', 'T', 'teacher')"),
+            {"id": user_id, "sid": school_id},
+        )
+        for cid in conv_ids:
+            await conn.execute(
+                text("INSERT INTO conversations (id, school_id) VALUES (:id, :sid)"),
+                {"id": cid, "sid": school_id},
+            )
+    return school_id, user_id, conv_ids
+
+
+async def _cleanup(school_id: uuid.UUID) -> None:
+    async with engine.begin() as conn:
+        await conn.execute(text("SELECT set_config('app.current_school_id', :sid, true)"), {"sid": str(school_id)})
+        await conn.execute(text("DELETE FROM schools WHERE id = :id"), {"id": school_id})
+
+
+async def _orm_send(school_id: uuid.UUID, user_id: uuid.UUID, conv_id: uuid.UUID) -> None:
+    # info["school_id"] scopes every transaction, including the refresh after commit.
+    async with AsyncSessionLocal(info={"school_id": school_id}) as db:
+        msg = Message(school_id=school_id, conversation_id=conv_id, sender_id=user_id, body="bench", is_system=False)
+        db.add(msg)
+        await db.execute(text("UPDATE conversations SET updated_at = now() WHERE id = :cid"), {"cid": conv_id})
+        await db.commit()
+        await db.refresh(msg)
+
+
+async def _run(label: str, send, clients: int, messages: int, conv_ids: list[uuid.UUID]) -> None:
+    async def client(n: int) -> None:
+        conv_id = conv_ids[n % len(conv_ids)]
+        for _ in range(messages):
+            await send(conv_id)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(n) for n in range(clients)))
+    elapsed = time.perf_counter() - started
+    total = clients * messages
+    print(f"{label:<14} {total:>7} msgs  {elapsed:7.2f}s  {total / elapsed:9.1f} msgs/sec")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--conversations", type=int, default=5)
+    args = parser.parse_args()
+
+    school_id, user_id, conv_ids = await _seed(args.conversations)
+    ingestor = MessageIngestor()
+    try:
+        await _run(
+            "orm",
+            lambda cid: _orm_send(school_id, user_id, cid),
+            args.clients, args.messages, conv_ids,
+        )
+        await _run(
+            "group-commit",
+            lambda cid: ingestor.submit(school_id, cid, user_id, "bench"),
+            args.clients, args.messages, conv_ids,
+        )
+    finally:
+        await ingestor.aclose()
+        await _cleanup(school_id)
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,97 @@
+"""Announcement push fan-out throughput: one recipient at a time vs chunked.
+
+Runs app.tasks.notifications.fan_out against the fake FCM endpoint, with
+recipient loading and checkpoints kept in memory (plus a simulated query
+latency; routing itself is the real plan_routes) so only the fan-out
+strategy differs between the two runs:
+
+  sequential   chunks of 1 recipient, 1 in flight
+  chunked      NOTIFY_CHUNK_SIZE recipients per chunk, NOTIFY_CONCURRENCY in
+               flight, FCM multicast batches of FCM_MULTICAST_SIZE
+
+Every tenth recipient has a second device and 2% of tokens are invalid.
+
+Usage (from backend/, with the fake provider running):
+    python -m benchmarks.fake_providers --port 9100 --latency-ms 20 &
+    python -m benchmarks.bench_notification_fanout --recipients 2500
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+import uuid
+
+from google.oauth2.credentials import Credentials
+
+from app.config import settings
+from app.services.fcm_service import FCMClient
+from app.services.notification_routing import Recipient, RoutePlan, plan_routes
+from app.tasks.notifications import Notification, fan_out
+
+
+def _devices(recipients: int) -> dict[str, list[str]]:
+    devices: dict[str, list[str]] = {}
+    for i in range(recipients):
+        tokens = [f"{'invalid' if i % 50 == 0 else 'token'}-{i}-a"]
+        if i % 10 == 0:
+            tokens.append(f"token-{i}-b")
+        devices[str(uuid.uuid4())] = tokens
+    return devices
+
+
+async def _run(label: str, devices: dict[str, list[str]], lookup_ms: float, client: FCMClient) -> None:
+    done: set[str] = set()
+
+    async def route(user_ids: list[str]) -> RoutePlan:
+        await asyncio.sleep(lookup_ms / 1000)
+        return plan_routes(
+            {user_id: Recipient() for user_id in user_ids},
+            {user_id: devices[user_id] for user_id in user_ids},
+            school_timezone="Africa/Johannesburg",
+            priority="normal",
+            send_sms=False,
+            send_whatsapp=False,
+        )
+
+    async def checkpoint(user_ids: list[str]) -> None:
+        done.update(user_ids)
+
+    notification = Notification(title="Sports day moved", body="Now on Friday.", data={"type": "announcement.new"})
+    started = time.perf_counter()
+    result = await fan_out(list(devices), notification, route, checkpoint, client=client)
+    elapsed = time.perf_counter() - started
+    print(
+        f"{label:<12} {result.sent['push']} sent, {len(result.invalid_tokens)} invalid, {len(done)} recipients done "
+        f"in {elapsed:6.2f}s  ({result.sent['push'] / elapsed:8.1f} notifications/s)"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:9100")
+    parser.add_argument("--recipients", type=int, default=2500)
+    parser.add_argument("--lookup-ms", type=float, default=2.0, help="Simulated recipient loading time per chunk")
+    parser.add_argument("--skip-sequential", action="store_true")
+    args = parser.parse_args()
+
+    settings.FCM_API_URL = args.url
+    settings.FCM_PROJECT_ID = "bench"
+    settings.ENVIRONMENT = "bench"
+    devices = _devices(args.recipients)
+    client = FCMClient(credentials=Credentials(token="bench"))
+
+    try:
+        if not args.skip_sequential:
+            chunk_size, concurrency = settings.NOTIFY_CHUNK_SIZE, settings.NOTIFY_CONCURRENCY
+            settings.NOTIFY_CHUNK_SIZE, settings.NOTIFY_CONCURRENCY = 1, 1
+            await _run("sequential", devices, args.lookup_ms, client)
+            settings.NOTIFY_CHUNK_SIZE, settings.NOTIFY_CONCURRENCY = chunk_size, concurrency
+        await _run("chunked", devices, args.lookup_ms, client)
+    finally:
+        await client.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
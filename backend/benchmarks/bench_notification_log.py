@@ -0,0 +1,133 @@
+"""notification_log write throughput: per-row statements vs COPY and batched UPDATE.
+
+  insert   one INSERT per row (what per-send ORM inserts amount to), run on
+           a --rowwise-rows sample and reported as rows/s
+  copy     NotificationLogWriter: copy_records_to_table, NOTIFICATION_LOG_BATCH_SIZE rows per COPY
+  update   one UPDATE per delivery report, sampled the same way
+  values   DeliveryStatusWriter: UPDATE ... FROM (VALUES ...), DELIVERY_STATUS_BATCH_SIZE per statement
+
+Needs users to attach rows to (e.g. seeded by benchmarks.check_query_plans
+--seed); they are taken from the oldest school.  Rows are written with reference_type='bench' and deleted afterwards.
+
+Usage (from backend/, schema at head):
+    python -m benchmarks.bench_notification_log --rows 100000
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+import uuid
+from datetime import datetime, timezone
+
+from sqlalchemy import text
+
+from app.database import engine
+from app.services.notification_log import (
+    DeliveryStatusWriter,
+    NotificationLogEntry,
+    NotificationLogWriter,
+    StatusUpdate,
+)
+
+
+def _report(label: str, rows: int, elapsed: float) -> None:
+    print(f"{label:<8} {rows:>7} rows in {elapsed:7.2f}s  ({rows / elapsed:9.0f} rows/s)")
+
+
+def _entries(user_ids: list[uuid.UUID], n: int) -> list[NotificationLogEntry]:
+    return [
+        NotificationLogEntry(
+            user_id=user_ids[i % len(user_ids)],
+            channel="sms",
+            status="sent",
+            title="Bench",
+            body="Benchmark notification",
+            reference_type="bench",
+            provider_message_id=f"bench-{uuid.uuid4().hex}",
+        )
+        for i in range(n)
+    ]
+
+
+async def _rowwise_insert(entries: list[NotificationLogEntry]) -> None:
+    sql = text(
+        "INSERT INTO notification_log (id, user_id, channel, status, title, body, reference_type, "
+        "provider_message_id, sent_at) VALUES (:id, :user_id, :channel, :status, :title, :body, "
+        ":reference_type, :provider_message_id, :sent_at)"
+    )
+    for e in entries:
+        async with engine.begin() as conn:
+            await conn.execute(
+                sql,
+                {
+                    "id": e.id, "user_id": e.user_id, "channel": e.channel, "status": e.status,
+                    "title": e.title, "body": e.body, "reference_type": e.reference_type,
+                    "provider_message_id": e.provider_message_id, "sent_at": e.sent_at,
+                },
+            )
+
+
+async def _rowwise_update(updates: list[StatusUpdate]) -> None:
+    sql = text(
+        "UPDATE notification_log SET status = :status, delivered_at = :at "
+        "WHERE provider_message_id = :id AND status = 'sent'"
+    )
+    for u in updates:
+        async with engine.begin() as conn:
+            await conn.execute(sql, {"status": u.status, "at": u.at, "id": u.provider_message_id})
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--rowwise-rows", type=int, default=5_000, help="Sample size for the per-row runs")
+    args = parser.parse_args()
+
+    try:
+        async with engine.begin() as conn:
+            # users is under RLS; notification_log is not, so one school's users will do
+            school_id = (await conn.execute(text("SELECT id FROM schools ORDER BY created_at LIMIT 1"))).scalar()
+            user_ids = []
+            if school_id is not None:
+                await conn.execute(
+                    text("SELECT set_config('app.current_school_id', :sid, true)"), {"sid": str(school_id)}
+                )
+                user_ids = list((await conn.execute(text("SELECT id FROM users LIMIT 1000"))).scalars())
+        if not user_ids:
+            raise SystemExit("No users found; seed first (python -m benchmarks.check_query_plans --seed)")
+
+        sample = _entries(user_ids, args.rowwise_rows)
+        started = time.perf_counter()
+        await _rowwise_insert(sample)
+        _report("insert", len(sample), time.perf_counter() - started)
+
+        entries = _entries(user_ids, args.rows)
+        writer = NotificationLogWriter(max_buffer=args.rows + 1)
+        for e in entries:
+            await writer.record(e)
+        started = time.perf_counter()
+        await writer.flush()
+        _report("copy", len(entries), time.perf_counter() - started)
+
+        now = datetime.now(timezone.utc)
+        sample_updates = [StatusUpdate(e.provider_message_id, "delivered", now) for e in sample]
+        started = time.perf_counter()
+        await _rowwise_update(sample_updates)
+        _report("update", len(sample_updates), time.perf_counter() - started)
+
+        statuses = DeliveryStatusWriter(max_buffer=args.rows + 1)
+        for e in entries:
+            await statuses.record(StatusUpdate(e.provider_message_id, "delivered", now))
+        started = time.perf_counter()
+        await statuses.flush()
+        _report("values", len(entries), time.perf_counter() - started)
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(text("DELETE FROM notification_log WHERE reference_type = 'bench'"))
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,68 @@
+"""Per-request overhead of the message rate limiter.
+
+Compares the old fixed-window limiter (INCR, then EXPIRE on the first hit)
+with the Lua sliding-window limiter in app.middleware.rate_limit.  Each
+iteration uses a fresh identity so every call is under the limit, which
+is the common case on the request path.
+
+Usage (from backend/, with Redis running):
+    python -m benchmarks.bench_rate_limit --iterations 5000
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+from redis.asyncio import Redis
+
+from app.config import settings
+from app.middleware.rate_limit import check_rate_limit
+
+
+async def _fixed_window(identity: str, redis: Redis) -> bool:
+    key = f"bench:rate:msg:{identity}"
+    count = await redis.incr(key)
+    if count == 1:
+        await redis.expire(key, 3600)
+    return count <= 30
+
+
+def _report(label: str, samples: list[float]) -> None:
+    samples.sort()
+    p99 = samples[int(len(samples) * 0.99) - 1]
+    print(
+        f"{label:<16} mean {statistics.fmean(samples):7.1f}µs  "
+        f"p50 {statistics.median(samples):7.1f}µs  p99 {p99:7.1f}µs"
+    )
+
+
+async def _measure(call, iterations: int) -> list[float]:
+    samples = []
+    for _ in range(iterations):
+        identity = uuid.uuid4().hex
+        started = time.perf_counter()
+        await call(identity)
+        samples.append((time.perf_counter() - started) * 1e6)
+    return samples
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=5000)
+    args = parser.parse_args()
+
+    redis = Redis.from_url(settings.REDIS_URL, decode_responses=False)
+    try:
+        await check_rate_limit("messages", "warmup", redis)  # load the script
+        _report("incr+expire", await _measure(lambda i: _fixed_window(i, redis), args.iterations))
+        _report("sliding-window", await _measure(lambda i: check_rate_limit("messages", i, redis), args.iterations))
+    finally:
+        await redis.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,68 @@
+"""SMS send throughput: client per message vs the pooled SMSClient.
+
+The old path opened a new httpx.AsyncClient (new TCP connection, and TLS
+against the real provider) for every message; app.services.sms_service keeps
+one keep-alive pool per process.
+
+Usage (from backend/, with the fake provider running):
+    python -m benchmarks.fake_providers --port 9100 --latency-ms 20 &
+    python -m benchmarks.bench_sms_throughput --messages 2000 --concurrency 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from app.config import settings
+from app.services.sms_service import SMSClient
+
+
+async def _client_per_message(phone: str, message: str) -> None:
+    async with httpx.AsyncClient() as client:
+        resp = await client.post(
+            settings.SMS_API_URL,
+            params={"apiKey": settings.SMS_API_KEY, "to": phone, "content": message},
+            timeout=10,
+        )
+        resp.raise_for_status()
+
+
+async def _run(label: str, send, messages: int, concurrency: int) -> None:
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i: int) -> None:
+        async with sem:
+            await send(f"+2782{i:07d}", "Your BellBook code is 123456.")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(messages)))
+    elapsed = time.perf_counter() - started
+    print(f"{label:<20} {messages} messages in {elapsed:6.2f}s  ({messages / elapsed:7.1f} msg/s)")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:9100/messages/http/send")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+
+    settings.SMS_API_URL = args.url
+    settings.SMS_API_KEY = "bench"
+    settings.ENVIRONMENT = "bench"
+
+    await _run("client per message", _client_per_message, args.messages, args.concurrency)
+
+    pooled = SMSClient()
+    try:
+        await _run("pooled client", pooled.send, args.messages, args.concurrency)
+    finally:
+        await pooled.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
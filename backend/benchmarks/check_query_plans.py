@@ -0,0 +1,464 @@
+"""Query-plan regression check for the hot endpoints in app/api.
+
+Calls each endpoint below through the ASGI app, as a seeded user of the
+first seed school, records every statement the handler issues (with its
+bound parameters) and EXPLAINs it under that school's RLS context.  Exits 1
+if an endpoint fails, runs more statements than its QUERY_BUDGETS entry, or
+has a plan that sequentially scans a table holding more than --min-rows
+rows.  Small lookup tables are allowed to be seq-scanned; the
+planner is right to do so.  The relay's fan-out queries (app.tasks.outbox)
+and the notification recipient lookup are checked the same way.
+
+The tables must be seeded to a realistic size first, otherwise every plan is
+a seq scan.  --seed generates synthetic schools (grades, classes, staff,
+parents, learners, channels, announcements, reads, conversations, messages)
+and ANALYZEs them.  The seed writes across schools, which the forced RLS
+policies reject, so pass a superuser URL as --seed-url; the check itself
+runs as DATABASE_URL.  Redis must be reachable: the app starts its
+lifespan, and the OTP and rate-limit checks use it.
+
+Usage (from backend/, schema at head):
+    python -m benchmarks.check_query_plans --seed --seed-url postgresql+asyncpg://postgres@localhost/bellbook
+    python -m benchmarks.check_query_plans            # re-check without reseeding
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import sys
+import uuid
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any
+
+import httpx
+from sqlalchemy import event, text
+
+from app.config import settings
+from app.database import AsyncSessionLocal, engine, make_engine, replica_engine
+from app.main import app
+from app.services.auth_service import create_access_token, hash_password, store_otp
+from app.services.notification_routing import load_recipients
+from app.services.principal_cache import get_principal
+from app.services.query_stats import QueryBudgetExceeded, query_budget
+from app.tasks.outbox import _PARTICIPANTS_SQL, _RECIPIENTS_SQL
+
+# ---------------------------------------------------------------------------
+# Hot endpoints — (role, method, path, JSON body); "{name}" is filled from
+# the sample row.  A role of None sends no token (the login endpoints).
+# ---------------------------------------------------------------------------
+
+_PASSWORD = "check-query-plans"
+_OTP = "123456"
+
+HOT_ENDPOINTS: dict[str, tuple[str | None, str, str, dict[str, Any] | None]] = {
+    "auth.login": (None, "POST", "/api/auth/login", {"email": "{teacher_email}", "password": _PASSWORD}),
+    "auth.otp_verify": (None, "POST", "/api/auth/otp/verify", {"phone": "{parent_phone}", "otp": _OTP}),
+    "announcements.list_channels[teacher]": ("teacher", "GET", "/api/channels", None),
+    "announcements.list_channels[parent]": ("parent", "GET", "/api/channels", None),
+    "announcements.list_announcements": ("parent", "GET", "/api/channels/{channel_id}/announcements", None),
+    "announcements.mark_read": ("parent", "POST", "/api/announcements/{announcement_id}/read", None),
+    "announcements.get_reads": ("teacher", "GET", "/api/announcements/{announcement_id}/reads", None),
+    "announcements.get_stats[grade]": ("teacher", "GET", "/api/announcements/{grade_announcement_id}/stats", None),
+    "messaging.list_conversations": ("parent", "GET", "/api/conversations", None),
+    "messaging.list_messages": ("parent", "GET", "/api/conversations/{conversation_id}/messages", None),
+    "messaging.create_conversation": (
+        "teacher", "POST", "/api/conversations", {"learner_id": "{learner_id}", "participant_id": "{parent_id}"},
+    ),
+    "messaging.search_messages": ("school_admin", "GET", "/api/conversations/search", None),
+}
+
+# Statements per request for the sample at the default seed sizes (a parent
+# with two conversations, a grade of four classes) with the principal cache
+# warm, counting each transaction's set_config.  A handler that starts
+# issuing more fails the check — raise a budget only alongside the change
+# that needs it.  get_stats (two per class) and list_conversations (three
+# per conversation) still grow with the data.
+QUERY_BUDGETS: dict[str, int] = {
+    "auth.login": 2,
+    "auth.otp_verify": 2,
+    "announcements.list_channels[teacher]": 2,
+    "announcements.list_channels[parent]": 2,
+    "announcements.list_announcements": 4,
+    "announcements.mark_read": 4,
+    "announcements.get_reads": 3,
+    "announcements.get_stats[grade]": 14,
+    "messaging.list_conversations": 8,
+    "messaging.list_messages": 4,
+    "messaging.create_conversation": 6,
+    "messaging.search_messages": 2,
+}
+
+# One conversation of the first seed school, and the ids around it.  Run with
+# the school's RLS context set.
+_SAMPLE_SQL = """
+    WITH c AS (
+        SELECT id, learner_id FROM conversations
+        WHERE learner_id IS NOT NULL ORDER BY created_at, id LIMIT 1
+    ), ids AS (
+        SELECT
+            c.id AS conversation_id,
+            c.learner_id,
+            (SELECT p.user_id FROM conversation_participants p JOIN users u ON u.id = p.user_id
+              WHERE p.conversation_id = c.id AND u.role = 'parent' LIMIT 1) AS parent_id,
+            (SELECT p.user_id FROM conversation_participants p JOIN users u ON u.id = p.user_id
+              WHERE p.conversation_id = c.id AND u.role = 'teacher' LIMIT 1) AS teacher_id,
+            (SELECT id FROM users WHERE role = 'school_admin' AND is_active LIMIT 1) AS school_admin_id,
+            (SELECT ch.id FROM channels ch JOIN class_learners cl ON cl.class_id = ch.class_id
+              WHERE cl.learner_id = c.learner_id AND ch.type = 'class' LIMIT 1) AS channel_id
+        FROM c
+    )
+    SELECT
+        ids.*,
+        (SELECT email FROM users WHERE id = ids.teacher_id) AS teacher_email,
+        (SELECT phone FROM users WHERE id = ids.parent_id) AS parent_phone,
+        (SELECT id FROM announcements WHERE channel_id = ids.channel_id
+          ORDER BY published_at DESC LIMIT 1) AS announcement_id,
+        (SELECT a.id FROM announcements a JOIN channels ch ON ch.id = a.channel_id
+          WHERE ch.type = 'grade' ORDER BY a.published_at DESC LIMIT 1) AS grade_announcement_id
+    FROM ids
+"""
+
+# ---------------------------------------------------------------------------
+# Seed data
+# ---------------------------------------------------------------------------
+
+_SEED = """
+INSERT INTO schools (name, slug)
+SELECT 'Seed School ' || s, 'seed-' || lpad(s::text, 4, '0') FROM generate_series(1, :schools) s;
+
+INSERT INTO academic_years (school_id, name, start_date, end_date, is_current)
+SELECT id, '2026', DATE '2026-01-01', DATE '2026-12-31', true FROM schools WHERE slug LIKE 'seed-%';
+
+INSERT INTO grades (school_id, academic_year_id, name, sort_order)
+SELECT ay.school_id, ay.id, 'Grade ' || g, g
+FROM academic_years ay JOIN schools s ON s.id = ay.school_id, generate_series(1, 7) g
+WHERE s.slug LIKE 'seed-%';
+
+INSERT INTO classes (school_id, grade_id, name)
+SELECT g.school_id, g.id, chr(64 + c)
+FROM grades g JOIN schools s ON s.id = g.school_id, generate_series(1, 4) c
+WHERE s.slug LIKE 'seed-%';
+
+INSERT INTO users (school_id, email, password_hash, first_name, last_name, role)
+SELECT s.id, 'teacher' || t || '@' || s.slug || '.test', 'x', 'Teacher', t::text, 'teacher'
+FROM schools s, generate_series(1, 40) t WHERE s.slug LIKE 'seed-%';
+
+INSERT INTO users (school_id, email, password_hash, first_name, last_name, role)
+SELECT id, 'admin@' || slug || '.test', 'x', 'Admin', 'Seed', 'school_admin' FROM schools WHERE slug LIKE 'seed-%';
+
+INSERT INTO users (school_id, phone, first_name, last_name, role)
+SELECT s.id, '+2760' || lpad(p::text, 7, '0'), 'Parent', p::text, 'parent'
+FROM schools s, generate_series(1, :learners * 3 / 2) p WHERE s.slug LIKE 'seed-%';
+
+INSERT INTO learners (school_id, first_name, last_name)
+SELECT s.id, 'Learner', l::text FROM schools s, generate_series(1, :learners) l WHERE s.slug LIKE 'seed-%';
+
+CREATE TEMP TABLE seed_learners AS
+SELECT l.id, l.school_id, row_number() OVER (PARTITION BY l.school_id ORDER BY l.id) - 1 AS n
+FROM learners l JOIN schools s ON s.id = l.school_id WHERE s.slug LIKE 'seed-%';
+
+CREATE TEMP TABLE seed_parents AS
+SELECT u.id, u.school_id, row_number() OVER (PARTITION BY u.school_id ORDER BY u.id) - 1 AS n
+FROM users u JOIN schools s ON s.id = u.school_id WHERE s.slug LIKE 'seed-%' AND u.role = 'parent';
+
+CREATE TEMP TABLE seed_classes AS
+SELECT c.id, c.school_id, c.grade_id,
+       row_number() OVER (PARTITION BY c.school_id ORDER BY c.id) - 1 AS n,
+       count(*) OVER (PARTITION BY c.school_id) AS k
+FROM classes c JOIN schools s ON s.id = c.school_id WHERE s.slug LIKE 'seed-%';
+
+INSERT INTO class_learners (school_id, class_id, learner_id)
+SELECT l.school_id, c.id, l.id
+FROM seed_learners l JOIN seed_classes c ON c.school_id = l.school_id AND c.n = l.n % c.k;
+
+INSERT INTO class_teachers (class_id, teacher_id, is_primary)
+SELECT c.id, t.id, true
+FROM seed_classes c
+JOIN (
+    SELECT id, school_id, row_number() OVER (PARTITION BY school_id ORDER BY id) - 1 AS n
+    FROM users WHERE role = 'teacher'
+) t ON t.school_id = c.school_id AND t.n = c.n;
+
+-- One guardian per learner, a second for every other learner
+INSERT INTO learner_guardians (learner_id, guardian_id)
+SELECT l.id, p.id FROM seed_learners l JOIN seed_parents p ON p.school_id = l.school_id AND p.n = l.n;
+INSERT INTO learner_guardians (learner_id, guardian_id)
+SELECT l.id, p.id FROM seed_learners l
+JOIN seed_parents p ON p.school_id = l.school_id AND p.n = :learners + l.n / 2
+WHERE l.n % 2 = 0;
+
+INSERT INTO channels (school_id, name, type)
+SELECT id, 'Whole school', 'school' FROM schools WHERE slug LIKE 'seed-%';
+INSERT INTO channels (school_id, name, type, grade_id)
+SELECT g.school_id, g.name, 'grade', g.id FROM grades g JOIN schools s ON s.id = g.school_id WHERE s.slug LIKE 'seed-%';
+INSERT INTO channels (school_id, name, type, class_id)
+SELECT c.school_id, 'Class ' || c.n, 'class', c.id FROM seed_classes c;
+
+INSERT INTO announcements (school_id, channel_id, author_id, title, body, priority, published_at)
+SELECT ch.school_id, ch.id,
+       (SELECT id FROM users WHERE school_id = ch.school_id AND role = 'teacher' LIMIT 1),
+       'Announcement ' || a, 'Body of announcement ' || a,
+       (ARRAY['urgent', 'normal', 'info'])[1 + a % 3],
+       now() - (a || ' minutes')::interval
+FROM (
+    SELECT id, school_id, row_number() OVER (PARTITION BY school_id ORDER BY id) - 1 AS n,
+           count(*) OVER (PARTITION BY school_id) AS k
+    FROM channels WHERE school_id IN (SELECT id FROM schools WHERE slug LIKE 'seed-%')
+) ch
+JOIN generate_series(0, :announcements - 1) a ON a % ch.k = ch.n;
+
+-- ~4% of parents read each announcement
+INSERT INTO announcement_reads (school_id, announcement_id, user_id, read_at)
+SELECT a.school_id, a.id, p.id, a.published_at + interval '1 hour'
+FROM (
+    SELECT id, school_id, published_at, row_number() OVER (PARTITION BY school_id ORDER BY id) AS n
+    FROM announcements WHERE school_id IN (SELECT id FROM schools WHERE slug LIKE 'seed-%')
+) a
+JOIN seed_parents p ON p.school_id = a.school_id AND (p.n + a.n) % 25 = 0;
+
+-- Each conversation is about a learner, between its first guardian and a teacher
+INSERT INTO conversations (school_id, learner_id, subject)
+SELECT l.school_id, l.id, 'Conversation ' || c
+FROM generate_series(0, :conversations - 1) c JOIN seed_learners l ON l.n = c % :learners;
+
+CREATE TEMP TABLE seed_conversations AS
+SELECT c.id, c.school_id, l.n FROM conversations c JOIN seed_learners l ON l.id = c.learner_id;
+
+INSERT INTO conversation_participants (conversation_id, user_id)
+SELECT c.id, p.id FROM seed_conversations c
+JOIN seed_parents p ON p.school_id = c.school_id AND p.n = c.n;
+INSERT INTO conversation_participants (conversation_id, user_id)
+SELECT c.id, t.id FROM seed_conversations c
+JOIN (
+    SELECT id, school_id, row_number() OVER (PARTITION BY school_id ORDER BY id) - 1 AS n
+    FROM users WHERE role = 'teacher'
+) t ON t.school_id = c.school_id AND t.n = c.n % 40;
+
+SELECT create_monthly_partitions('messages', (now() - interval '1 month')::date, now()::date);
+
+INSERT INTO messages (school_id, conversation_id, sender_id, body, created_at)
+SELECT c.school_id, c.id, p.user_id, 'Message ' || m, now() - ((m * 7 + c.n) || ' minutes')::interval
+FROM seed_conversations c
+JOIN conversation_participants p ON p.conversation_id = c.id, generate_series(1, 10) m;
+"""
+
+_ANALYZE_TABLES = (
+    "schools users learners grades classes class_learners class_teachers learner_guardians "
+    "channels announcements announcement_reads conversations conversation_participants messages"
+).split()
+
+
+async def _seed(conn, args: argparse.Namespace) -> None:
+    params = {
+        "schools": args.schools,
+        "learners": args.learners,
+        "announcements": args.announcements,
+        "conversations": args.conversations,
+    }
+    for statement in filter(None, (s.strip() for s in _SEED.split(";\n"))):
+        used = {k: v for k, v in params.items() if f":{k}" in statement}
+        await conn.execute(text(statement), used)
+    for table in _ANALYZE_TABLES:
+        await conn.execute(text(f"ANALYZE {table}"))
+
+
+# ---------------------------------------------------------------------------
+# Statement capture
+# ---------------------------------------------------------------------------
+
+_captured: ContextVar[list[tuple[str, Any]] | None] = ContextVar("captured_statements", default=None)
+
+
+def _capture(conn, cursor, statement, parameters, context, executemany) -> None:
+    statements = _captured.get()
+    if statements is not None and not statement.lstrip().startswith("SELECT set_config"):
+        statements.append((statement, parameters[0] if executemany else parameters))
+
+
+@contextmanager
+def _capturing() -> Iterator[list[tuple[str, Any]]]:
+    """Record the statements (and driver parameters) executed in this context."""
+    statements: list[tuple[str, Any]] = []
+    token = _captured.set(statements)
+    try:
+        yield statements
+    finally:
+        _captured.reset(token)
+
+
+def _fill(value: Any, sample: dict[str, str]) -> Any:
+    if isinstance(value, str):
+        return value.format(**sample)
+    if isinstance(value, dict):
+        return {k: _fill(v, sample) for k, v in value.items()}
+    return value
+
+
+# ---------------------------------------------------------------------------
+# Plan inspection
+# ---------------------------------------------------------------------------
+
+
+def _seq_scans(node: dict) -> list[str]:
+    found = []
+    if node.get("Node Type") == "Seq Scan":
+        found.append(node["Relation Name"])
+    for child in node.get("Plans", []):
+        found.extend(_seq_scans(child))
+    return found
+
+
+async def _check(
+    name: str,
+    statements: list[tuple[str, Any]],
+    school_id: str,
+    row_counts: dict[str, int],
+    args: argparse.Namespace,
+) -> bool:
+    """EXPLAIN each distinct statement; print the verdict and return True if all pass."""
+    distinct: dict[str, Any] = {}
+    for statement, parameters in statements:
+        distinct.setdefault(statement, parameters)
+
+    failed: list[tuple[str, list[str], list[str]]] = []
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT set_config('app.current_school_id', :sid, true)"), {"sid": school_id})
+        for statement, parameters in distinct.items():
+            parameters = tuple(parameters or ())
+            plan_json = (await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters)).scalar()
+            plan = (json.loads(plan_json) if isinstance(plan_json, str) else plan_json)[0]["Plan"]
+            offenders = [t for t in _seq_scans(plan) if row_counts.get(t, 0) > args.min_rows]
+            if offenders or args.verbose:
+                lines = [line for (line,) in await conn.exec_driver_sql(f"EXPLAIN {statement}", parameters)]
+                failed.append((statement, offenders, lines))
+        await conn.rollback()
+
+    offenders = sorted({t for _, tables, _ in failed for t in tables})
+    status = "FAIL" if offenders else "ok"
+    print(
+        f"{status:<4} {name}  {len(statements)} statements, {len(distinct)} distinct"
+        + (f"  seq scan on {', '.join(offenders)}" if offenders else "")
+    )
+    for statement, tables, lines in failed:
+        print("       " + " ".join(statement.split()))
+        for line in lines:
+            print("         " + line)
+    return not offenders
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seed", action="store_true", help="Generate synthetic data first")
+    parser.add_argument("--seed-url", default=settings.DATABASE_URL, help="Superuser URL for --seed")
+    parser.add_argument("--schools", type=int, default=5)
+    parser.add_argument("--learners", type=int, default=800, help="per school")
+    parser.add_argument("--announcements", type=int, default=2000, help="per school")
+    parser.add_argument("--conversations", type=int, default=1000, help="per school")
+    parser.add_argument("--min-rows", type=int, default=10_000, help="Seq scans of smaller tables are allowed")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Print every plan")
+    args = parser.parse_args()
+
+    if args.seed:
+        seed_engine = make_engine(args.seed_url)
+        try:
+            async with seed_engine.begin() as conn:
+                await _seed(conn, args)
+        finally:
+            await seed_engine.dispose()
+
+    for target in filter(None, (engine, replica_engine)):
+        event.listen(target.sync_engine, "before_cursor_execute", _capture)
+
+    failures: list[str] = []
+    async with engine.begin() as conn:
+        school_id = (
+            await conn.execute(text("SELECT id FROM schools WHERE slug LIKE 'seed-%' ORDER BY slug LIMIT 1"))
+        ).scalar()
+        if school_id is None:
+            raise SystemExit("No seed data found; run with --seed")
+        school_id = str(school_id)
+        await conn.execute(text("SELECT set_config('app.current_school_id', :sid, true)"), {"sid": school_id})
+        row = (await conn.execute(text(_SAMPLE_SQL))).mappings().first()
+        if row is None or None in row.values():
+            raise SystemExit("Seed data is incomplete; reseed with --seed")
+        sample = {k: str(v) for k, v in row.items()}
+        # Credentials for the login endpoints
+        await conn.execute(
+            text("UPDATE users SET password_hash = :hash WHERE id = :id"),
+            {"hash": await hash_password(_PASSWORD), "id": row["teacher_id"]},
+        )
+        row_counts = dict(
+            (await conn.execute(text("SELECT relname, reltuples::bigint FROM pg_class WHERE relkind = 'r'"))).all()
+        )
+
+    async with app.router.lifespan_context(app):
+        await store_otp(sample["parent_phone"], _OTP, app.state.redis)
+        # Budgets assume a warm principal cache, as for any active user
+        async with AsyncSessionLocal(info={"school_id": school_id}) as db:
+            for role in ("teacher", "parent", "school_admin"):
+                await get_principal(uuid.UUID(sample[f"{role}_id"]), app.state.redis, db)
+        tokens = {
+            role: create_access_token(sample[f"{role}_id"], school_id, role)
+            for role in ("teacher", "parent", "school_admin")
+        }
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bellbook.test") as client:
+            for name, (role, method, path, body) in HOT_ENDPOINTS.items():
+                headers = {"X-School-ID": school_id}
+                if role is not None:
+                    headers["Authorization"] = f"Bearer {tokens[role]}"
+                try:
+                    with query_budget(QUERY_BUDGETS[name]), _capturing() as statements:
+                        response = await client.request(
+                            method, _fill(path, sample), json=_fill(body, sample), headers=headers
+                        )
+                except QueryBudgetExceeded as exc:
+                    print(f"FAIL {name}  {exc}")
+                    failures.append(name)
+                    continue
+                if response.status_code >= 400:
+                    print(f"FAIL {name}  HTTP {response.status_code} {response.text[:200]}")
+                    failures.append(name)
+                elif not await _check(name, statements, school_id, row_counts, args):
+                    failures.append(name)
+
+    # Fan-out lookups outside the request path: the relay's SQL, run as the
+    # relay does, and the notification task's recipient load.
+    relay_params = {
+        "school_id": school_id,
+        "grade_id": None,
+        "class_id": None,
+        "conversation_id": sample["conversation_id"],
+        "sender_id": sample["teacher_id"],
+    }
+    async with engine.begin() as conn:
+        await conn.execute(text("SELECT set_config('app.current_school_id', :sid, true)"), {"sid": school_id})
+        relay_params["grade_id"], relay_params["class_id"] = (
+            await conn.execute(
+                text("SELECT c.grade_id, c.id FROM classes c JOIN channels ch ON ch.class_id = c.id WHERE ch.id = :id"),
+                {"id": sample["channel_id"]},
+            )
+        ).one()
+        background = {f"outbox.recipients[{kind}]": text(sql) for kind, sql in _RECIPIENTS_SQL.items()}
+        background["outbox.participants"] = _PARTICIPANTS_SQL
+        for name, stmt in background.items():
+            used = {k: v for k, v in relay_params.items() if f":{k}" in str(stmt)}
+            with _capturing() as statements:
+                await conn.execute(stmt, used)
+            if not await _check(name, statements, school_id, row_counts, args):
+                failures.append(name)
+    with _capturing() as statements:
+        await load_recipients(school_id, [sample["parent_id"], sample["teacher_id"]])
+    if not await _check("notifications.load_recipients", statements, school_id, row_counts, args):
+        failures.append("notifications.load_recipients")
+
+    await engine.dispose()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,90 @@
+"""EXPLAIN ANALYZE of the announcement list and stats queries under RLS.
+
+Prints the plans the API's queries get once row-level security policies
+are applied, for one school.  Run it at revision 0003 (subquery policies)
+and at 0004 (denormalised school_id, equality policies) and compare:
+
+    alembic downgrade 0003 && python -m benchmarks.explain_rls > before.txt
+    alembic upgrade head   && python -m benchmarks.explain_rls > after.txt
+
+Connect as the application role, not a superuser — superusers bypass RLS
+and every plan would look the same.
+
+Usage (from backend/):
+    python -m benchmarks.explain_rls [--school-id UUID]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+
+from sqlalchemy import text
+
+from app.config import settings
+from app.database import make_engine
+
+# Written as SQL rather than ORM statements so the script runs at either revision.
+QUERIES = {
+    "list_announcements": """
+        SELECT * FROM announcements
+        WHERE channel_id = :channel_id
+          AND published_at IS NOT NULL AND published_at <= now()
+          AND (expires_at IS NULL OR expires_at > now())
+        ORDER BY is_pinned DESC, published_at DESC
+        LIMIT 20
+    """,
+    "stats_read_count": """
+        SELECT count(id), max(read_at) FROM announcement_reads
+        WHERE announcement_id = :announcement_id
+    """,
+    "stats_class_reads": """
+        SELECT c.id, count(DISTINCT r.user_id)
+        FROM classes c
+        JOIN class_learners cl ON cl.class_id = c.id
+        JOIN learner_guardians lg ON lg.learner_id = cl.learner_id
+        JOIN announcement_reads r ON r.user_id = lg.guardian_id AND r.announcement_id = :announcement_id
+        GROUP BY c.id
+    """,
+}
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--school-id", help="Defaults to the oldest school")
+    args = parser.parse_args()
+
+    engine = make_engine(settings.DATABASE_URL)
+    try:
+        async with engine.begin() as conn:
+            school_id = args.school_id or (
+                await conn.execute(text("SELECT id FROM schools ORDER BY created_at LIMIT 1"))
+            ).scalar()
+            await conn.execute(
+                text("SELECT set_config('app.current_school_id', :sid, true)"), {"sid": str(school_id)}
+            )
+            row = (
+                await conn.execute(
+                    text(
+                        "SELECT a.channel_id, a.id FROM announcements a "
+                        "JOIN channels ch ON ch.id = a.channel_id "
+                        "ORDER BY a.published_at DESC NULLS LAST LIMIT 1"
+                    )
+                )
+            ).first()
+            if row is None:
+                raise SystemExit(f"No announcements visible for school {school_id}")
+            params = {"channel_id": row.channel_id, "announcement_id": row.id}
+
+            print(f"school_id={school_id}")
+            for name, sql in QUERIES.items():
+                plan = await conn.execute(text(f"EXPLAIN (ANALYZE, BUFFERS) {sql}"), params)
+                print(f"\n=== {name} ===")
+                for (line,) in plan:
+                    print(line)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
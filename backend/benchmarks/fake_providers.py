@@ -0,0 +1,139 @@
+"""Local stand-in for the external notification providers.
+
+Serves the Clickatell HTTP send endpoint, the FCM v1 messages:send endpoint
+and the WhatsApp Cloud API messages endpoint with a configurable response
+delay, so the provider clients and the worker can be exercised and
+benchmarked without sending real messages.  Point the app at it with
+    SMS_API_URL=http://127.0.0.1:9100/messages/http/send SMS_API_KEY=test
+    FCM_API_URL=http://127.0.0.1:9100 FCM_PROJECT_ID=test
+    WHATSAPP_API_URL=http://127.0.0.1:9100/whatsapp/ WHATSAPP_PHONE_NUMBER_ID=test WHATSAPP_ACCESS_TOKEN=test
+
+FCM tokens starting with "invalid-" are answered as unregistered (404).
+
+Faults, for exercising app.services.providers: --rate-limit-fraction answers
+that share of sends with 429 + Retry-After, --error-fraction with 503, and
+--hang-fraction holds the response for --hang-seconds (longer than the
+client timeouts).
+
+Usage (from backend/):
+    python -m benchmarks.fake_providers --port 9100 --latency-ms 80
+    python -m benchmarks.fake_providers --rate-limit-fraction 0.1 --error-fraction 0.05
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+import uuid
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+_counts = {"sms_sent": 0, "push_sent": 0, "push_invalid": 0, "whatsapp_sent": 0, "faults": 0}
+
+
+def build_app(
+    latency_ms: float,
+    rate_limit_fraction: float = 0.0,
+    error_fraction: float = 0.0,
+    hang_fraction: float = 0.0,
+    hang_seconds: float = 30.0,
+) -> Starlette:
+    async def fault() -> JSONResponse | None:
+        """Maybe answer with an injected failure instead of the real response."""
+        roll = random.random()
+        if roll < rate_limit_fraction:
+            _counts["faults"] += 1
+            return JSONResponse({"error": "rate limited"}, status_code=429, headers={"Retry-After": "1"})
+        roll -= rate_limit_fraction
+        if roll < error_fraction:
+            _counts["faults"] += 1
+            return JSONResponse({"error": "unavailable"}, status_code=503)
+        roll -= error_fraction
+        if roll < hang_fraction:
+            _counts["faults"] += 1
+            await asyncio.sleep(hang_seconds)
+        return None
+
+    async def clickatell_send(request: Request) -> JSONResponse:
+        params = request.query_params
+        if not params.get("apiKey") or not params.get("to"):
+            return JSONResponse({"error": "missing apiKey or to"}, status_code=400)
+        if (resp := await fault()) is not None:
+            return resp
+        await asyncio.sleep(latency_ms / 1000)
+        _counts["sms_sent"] += 1
+        return JSONResponse(
+            {"messages": [{"apiMessageId": uuid.uuid4().hex, "accepted": True, "to": params["to"]}]},
+            status_code=202,
+        )
+
+    async def fcm_send(request: Request) -> JSONResponse:
+        if not request.headers.get("authorization", "").startswith("Bearer "):
+            return JSONResponse({"error": {"code": 401, "status": "UNAUTHENTICATED"}}, status_code=401)
+        token = (await request.json())["message"]["token"]
+        if (resp := await fault()) is not None:
+            return resp
+        await asyncio.sleep(latency_ms / 1000)
+        if token.startswith("invalid-"):
+            _counts["push_invalid"] += 1
+            return JSONResponse(
+                {"error": {"code": 404, "status": "NOT_FOUND", "details": [{"errorCode": "UNREGISTERED"}]}},
+                status_code=404,
+            )
+        _counts["push_sent"] += 1
+        project = request.path_params["project"]
+        return JSONResponse({"name": f"projects/{project}/messages/{uuid.uuid4().hex}"})
+
+    async def whatsapp_send(request: Request) -> JSONResponse:
+        if not request.headers.get("authorization", "").startswith("Bearer "):
+            return JSONResponse({"error": {"code": 190, "message": "Invalid OAuth access token"}}, status_code=401)
+        to = (await request.json())["to"]
+        if (resp := await fault()) is not None:
+            return resp
+        await asyncio.sleep(latency_ms / 1000)
+        _counts["whatsapp_sent"] += 1
+        return JSONResponse(
+            {"messaging_product": "whatsapp", "contacts": [{"wa_id": to}], "messages": [{"id": f"wamid.{uuid.uuid4().hex}"}]}
+        )
+
+    async def stats(request: Request) -> JSONResponse:
+        return JSONResponse(_counts)
+
+    return Starlette(
+        routes=[
+            Route("/messages/http/send", clickatell_send, methods=["GET", "POST"]),
+            Route("/v1/projects/{project}/messages:send", fcm_send, methods=["POST"]),
+            Route("/whatsapp/{phone_number_id}/messages", whatsapp_send, methods=["POST"]),
+            Route("/stats", stats),
+        ]
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=80.0)
+    parser.add_argument("--rate-limit-fraction", type=float, default=0.0, help="Share of sends answered 429")
+    parser.add_argument("--error-fraction", type=float, default=0.0, help="Share of sends answered 503")
+    parser.add_argument("--hang-fraction", type=float, default=0.0, help="Share of sends held for --hang-seconds")
+    parser.add_argument("--hang-seconds", type=float, default=30.0)
+    args = parser.parse_args()
+
+    app = build_app(
+        args.latency_ms,
+        rate_limit_fraction=args.rate_limit_fraction,
+        error_fraction=args.error_fraction,
+        hang_fraction=args.hang_fraction,
+        hang_seconds=args.hang_seconds,
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()